@@ -0,0 +1,59 @@
+"""
+Measure CPU time and allocations per GB when reading through GDriveFileReader from a fake server
+
+usage: python bench_stream.py [--size-mb 256] [--chunk-kb 1024 4096] [--read-kb 64]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from fake_drive import FakeDriveServer  # noqa: E402
+from pydrivebrowser.io_stream import GDriveFileReader  # noqa: E402
+
+
+def read_all(reader, read_size: int) -> int:
+    buffer = bytearray(read_size)
+    total = 0
+    while True:
+        size = reader.readinto(buffer)
+        if not size:
+            return total
+        total += size
+
+
+def measure(server: FakeDriveServer, chunk_size: int, read_size: int, **kwargs) -> None:
+    reader = GDriveFileReader(server.media_request('data'), chunk_size, **kwargs)
+    tracemalloc.start()
+    start_cpu, start = time.process_time(), time.perf_counter()
+    total = read_all(reader, read_size)
+    cpu, duration = time.process_time() - start_cpu, time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    reader.close()
+    gigabytes = total / 1024 ** 3
+    options = ' '.join(f'{key}={value}' for key, value in kwargs.items())
+    print(f'chunk {chunk_size // 1024:>6} KiB  read {read_size // 1024:>5} KiB {options:<12} '
+          f'{cpu / gigabytes:7.2f} CPU s/GB  {total / duration / 1024 ** 2:8.1f} MiB/s  '
+          f'peak alloc {peak / 1024 ** 2:7.1f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--chunk-kb', type=int, nargs='+', default=[1024, 4096, 16384])
+    parser.add_argument('--read-kb', type=int, default=64)
+    args = parser.parse_args()
+
+    with FakeDriveServer() as server:
+        server.add_file('data', content=os.urandom(args.size_mb * 1024 * 1024))
+        for chunk_kb in args.chunk_kb:
+            measure(server, chunk_kb * 1024, args.read_kb * 1024)
+            measure(server, chunk_kb * 1024, chunk_kb * 1024 // 4)  # chunks larger than the caller's buffer
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+Run the benchmark scenarios against a fake server and compare them with the tracked baselines
+
+Scenarios: import time and first call, listdir of a large folder, GDriveFileReader throughput at several chunk sizes,
+reading many small files, CliBrowser navigation latency, first paint of a large folder and search index lookups.
+Each scenario reports metrics whose name ends with their unit; request and module counts must not grow,
+throughputs (mib_per_s) must not drop and durations (s) must not grow by more than the tolerance.
+
+usage: python bench_suite.py [--scenario listdir_large ...] [--tolerance 0.3] [--update-baselines]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from fake_drive import FakeDriveServer  # noqa: E402
+from pick import Picker  # noqa: E402
+from pydrivebrowser.cli_browser import CliBrowser  # noqa: E402
+from pydrivebrowser.io_stream import GDriveFileReader  # noqa: E402
+from pydrivebrowser.scheduler import RequestScheduler  # noqa: E402
+from pydrivebrowser.search_index import SearchIndex  # noqa: E402
+
+from bench_stream import read_all  # noqa: E402
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_TOLERANCE = 0.3
+DURATION_SLACK = 0.01  # seconds, on top of the tolerance, so that millisecond timings do not flap
+LATENCY = 0.002  # per request, makes request counts show in the durations
+BANDWIDTH = 200 * 1024 * 1024
+MIB = 1024 * 1024
+
+
+def unlimited_file_system(server: FakeDriveServer, cls=None, **kwargs):
+    """
+    File system with its own scheduler without rate limit, so that the quota does not throttle the fake server
+    """
+    scheduler = RequestScheduler(rate=None)
+    return server.file_system(scheduler=scheduler, **kwargs) if cls is None \
+        else server.file_system(cls, scheduler=scheduler, **kwargs)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def bench_listdir_large(files=5000):
+    with FakeDriveServer(latency=LATENCY) as server:
+        server.add_folder('large')
+        for i in range(files):
+            server.add_file(f'file_{i}', parents=['large'])
+        gfs = unlimited_file_system(server)
+        server.request_count = 0
+        listing, duration = timed(lambda: gfs.listdir('large', CliBrowser.listing_fields))
+        assert len(listing) == files
+        return {'duration_s': duration, 'requests': server.request_count}
+
+
+def bench_reader_throughput(chunk_sizes=(256 * 1024, MIB, 4 * MIB, 16 * MIB), size=64 * MIB):
+    results = {}
+    with FakeDriveServer(latency=LATENCY, bandwidth=BANDWIDTH) as server:
+        server.add_file('data', content=os.urandom(size))
+        for chunk_size in chunk_sizes:
+            for workers in (1, 4):
+                reader = GDriveFileReader(server.media_request('data'), chunk_size, workers)
+                total, duration = timed(lambda: read_all(reader, 64 * 1024))
+                reader.close()
+                assert total == size
+                results[f'chunk_{chunk_size // 1024}k_workers_{workers}_mib_per_s'] = size / MIB / duration
+    return results
+
+
+def bench_small_files(files=200, size=4096, workers=8):
+    with FakeDriveServer(latency=LATENCY) as server:
+        for i in range(files):
+            server.add_file(f'small_{i}', content=os.urandom(size))
+        gfs = unlimited_file_system(server, max_connections=workers)
+
+        def read(i):
+            with gfs.open(f'small_{i}') as reader:
+                return len(reader.read())
+
+        server.request_count = 0
+        total, sequential = timed(lambda: sum(map(read, range(files))))
+        assert total == files * size
+        requests = server.request_count
+        with ThreadPoolExecutor(workers) as executor:
+            total, concurrent = timed(lambda: sum(executor.map(read, range(files))))
+        return {'sequential_s': sequential, f'concurrent_{workers}_s': concurrent, 'requests': requests}
+
+
+class Screen:
+    """
+    curses window of 40 rows discarding what is drawn
+    """
+    def clear(self):
+        pass
+
+    def getmaxyx(self):
+        return 40, 120
+
+    def addnstr(self, y, x, line, n):
+        pass
+
+    def refresh(self):
+        pass
+
+
+def bench_cli_navigation(width=50, depth=4, think_time=0.05):
+    """
+    Enter a chain of nested folders, go back up and down again (served by the metadata cache) and select a file
+
+    The user looks at each listing for think_time seconds, the latency of a step is the time between a selection
+    and the display of the next listing.
+    """
+    with FakeDriveServer(latency=LATENCY) as server:
+        server.add_folder('root', parents=())
+        parent = 'root'
+        for level in range(depth):
+            for i in range(width):
+                server.add_file(f'file_{level}_{i}', parents=[parent])
+            server.add_folder(f'folder_{level}', parents=[parent])
+            parent = f'folder_{level}'
+        server.add_file('leaf', parents=[parent])
+        selections = [f'folder_{level}' for level in range(depth)] + ['..'] * depth \
+            + [f'folder_{level}' for level in range(depth)] + ['leaf']
+        browser = unlimited_file_system(server, CliBrowser)
+        steps = []
+        selected_at = []
+
+        def run_loop(picker, screen, position):
+            picker.draw(Screen())
+            steps.append(time.perf_counter() - selected_at[-1])
+            title = selections[len(steps) - 1]
+            index = next(index for index in range(len(picker.options)) if picker.options[index].file['title'] == title)
+            picker.index = index  # the user moves to the entry
+            picker.draw(Screen())
+            time.sleep(think_time)
+            selected_at.append(time.perf_counter())
+            return picker.options[index], index
+
+        server.request_count = 0
+        with patch.object(Picker, 'config_curses'), patch.object(Picker, 'run_loop', run_loop):
+            selected_at.append(time.perf_counter())
+            browser._select_file(None, 'root')
+        uncached, cached = steps[1:depth + 1], steps[depth + 1:]
+        return {'first_listing_s': steps[0], 'uncached_step_s': sum(uncached) / len(uncached),
+                'cached_step_s': sum(cached) / len(cached), 'requests': server.request_count}
+
+
+def bench_cli_large_folder(files=20000):
+    """
+    Open a large folder in CliBrowser, draw it once and select its first file
+    """
+    with FakeDriveServer(latency=LATENCY) as server:
+        server.add_folder('root', parents=())
+        server.add_folder('large')
+        for i in range(files):
+            server.add_file(f'file_{i}', parents=['large'])
+        browser = unlimited_file_system(server, CliBrowser)
+
+        def run_loop(picker, screen, position):
+            picker.draw(Screen())
+            return picker.options[1], 1
+
+        server.request_count = 0
+        with patch.object(Picker, 'config_curses'), patch.object(Picker, 'run_loop', run_loop):
+            file, duration = timed(lambda: browser._select_file(None, 'large'))
+        assert file['id'] == 'file_0'
+        return {'first_paint_s': duration, 'requests': server.request_count}
+
+
+SEARCH_WORDS = ['report', 'budget', 'meeting', 'notes', 'invoice', 'draft', 'final', 'summary', 'plan', 'review',
+                'photo', 'scan', 'contract', 'slides', 'data', 'export', 'backup', 'minutes', 'design', 'thesis']
+
+
+def bench_search_index(folders=25, files_per_folder=200, searches=200):
+    """
+    Build the search index of a tree of folders, update it after a folder rename and look up file names,
+    half of them misspelt
+    """
+    random = Random(0)
+    with FakeDriveServer(latency=LATENCY) as server:
+        server.add_folder('root', parents=())
+        titles = []
+        for folder in range(folders):
+            server.add_folder(f'folder_{folder}', f'{random.choice(SEARCH_WORDS)} {folder}')
+            for i in range(files_per_folder):
+                titles.append(f'{" ".join(random.sample(SEARCH_WORDS, 2))} {folder}-{i}.pdf')
+                server.add_file(f'file_{folder}_{i}', titles[-1], parents=[f'folder_{folder}'])
+        gfs = unlimited_file_system(server)
+        index = SearchIndex()
+        server.request_count = 0
+        _, build = timed(lambda: index.build(gfs))
+        build_requests = server.request_count
+        server.update_file('folder_0', title='renamed')
+        _, update = timed(lambda: index.update(gfs))
+        assert index.get('file_0_0')['path'] == f'renamed/{titles[0]}'
+        queries = [random.choice(titles)[:random.randint(7, 16)].strip() for _ in range(searches // 2)]
+        queries += [query[:3] + query[4] + query[3] + query[5:] for query in queries]  # swapped letters
+        hits, search = timed(lambda: [index.search(query, limit=10) for query in queries])
+        assert all(hits)
+        return {'build_s': build, 'build_requests': build_requests, 'update_s': update,
+                'search_s': search / len(queries)}
+
+
+STARTUP_SCRIPT = '''
+import json, os, sys, time
+start = time.perf_counter()
+from pydrivebrowser.google_drive import GoogleDriveFileSystem
+import_time = time.perf_counter() - start
+ui_modules = sum(module in sys.modules for module in ('curses', 'pick'))
+sys.path.insert(0, os.path.join(sys.argv[1], 'tests'))
+from fake_drive import FakeDriveServer
+with FakeDriveServer() as server:
+    server.add_file('file')
+    start = time.perf_counter()
+    server.file_system().listdir('root')
+    first_call = time.perf_counter() - start
+print(json.dumps([import_time, first_call, ui_modules]))
+'''
+
+
+def bench_startup(runs=5):
+    """
+    Import GoogleDriveFileSystem in a fresh interpreter, then create a file system and list a folder
+    """
+    env = {**os.environ, 'PYTHONPATH': ROOT_DIR}
+    measures = [json.loads(subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, ROOT_DIR], env=env,
+                                          capture_output=True, text=True, check=True).stdout) for _ in range(runs)]
+    return {'import_s': min(measure[0] for measure in measures), 'first_call_s': min(measure[1] for measure in measures),
+            'ui_modules': max(measure[2] for measure in measures)}
+
+
+SCENARIOS = {
+    'startup': bench_startup,
+    'listdir_large': bench_listdir_large,
+    'reader_throughput': bench_reader_throughput,
+    'small_files': bench_small_files,
+    'cli_navigation': bench_cli_navigation,
+    'cli_large_folder': bench_cli_large_folder,
+    'search_index': bench_search_index,
+}
+
+
+def regressions(results: dict, baselines: dict, tolerance: float) -> list:
+    """
+    :return: descriptions of the metrics worse than their baseline by more than the tolerance
+    """
+    found = []
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            baseline = baselines.get(scenario, {}).get(name)
+            if baseline is None:
+                continue
+            if name.endswith('mib_per_s'):
+                regressed = value < baseline * (1 - tolerance)
+            elif name.endswith(('requests', 'modules')):
+                regressed = value > baseline
+            else:
+                regressed = value > baseline * (1 + tolerance) + DURATION_SLACK
+            if regressed:
+                found.append(f'{scenario}.{name}: {value:.4g} (baseline {baseline:.4g})')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative slowdown allowed before a metric counts as regressed')
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    parser.add_argument('--update-baselines', action='store_true', help='store the results as the new baselines')
+    args = parser.parse_args()
+
+    results = {}
+    for scenario in args.scenario:
+        results[scenario] = SCENARIOS[scenario]()
+        for name, value in results[scenario].items():
+            print(f'{scenario:<20} {name:<36} {value:10.4g}')
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as json_file:
+            baselines = json.load(json_file)
+    if args.update_baselines:
+        baselines.update({scenario: {name: value if isinstance(value, int) else float(f'{value:.4g}')
+                                     for name, value in metrics.items()}
+                          for scenario, metrics in results.items()})
+        with open(args.baselines, 'w') as json_file:
+            json.dump(baselines, json_file, indent=2, sort_keys=True)
+            json_file.write('\n')
+        return 0
+    found = regressions(results, baselines, args.tolerance)
+    for regression in found:
+        print(f'regression: {regression}', file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Compare GoogleDriveFileSystem.walk() with a sequential listdir() recursion on a fake folder tree
+
+usage: python bench_walk.py [--fan-out 4] [--depth 3] [--files 2] [--latency 0.02]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from fake_drive import FakeDriveServer  # noqa: E402
+from pydrivebrowser.google_drive import is_folder  # noqa: E402
+
+
+def build_tree(server: FakeDriveServer, fan_out: int, depth: int, files: int) -> int:
+    folders = ['root']
+    count = 1
+    for level in range(depth):
+        children = []
+        for parent in folders:
+            for i in range(fan_out):
+                folder_id = f'{parent}-{i}'
+                server.add_folder(folder_id, parents=[parent])
+                children.append(folder_id)
+            for i in range(files):
+                server.add_file(f'{parent}-file{i}', parents=[parent])
+        folders = children
+        count += len(children)
+    return count
+
+
+def sequential_walk(gfs, folder_id: str) -> int:
+    count = 1
+    for file in gfs.listdir(folder_id):
+        if is_folder(file):
+            count += sequential_walk(gfs, file['id'])
+    return count
+
+
+def measure(server: FakeDriveServer, name: str, func) -> None:
+    server.request_count = 0
+    start = time.perf_counter()
+    folders = func()
+    duration = time.perf_counter() - start
+    print(f'{name:<24} {folders:>6} folders  {server.request_count:>5} requests  {duration:8.3f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fan-out', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--files', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with FakeDriveServer(latency=args.latency) as server:
+        build_tree(server, args.fan_out, args.depth, args.files)
+        gfs = server.file_system()
+        measure(server, 'sequential listdir', lambda: sequential_walk(gfs, 'root'))
+        measure(server, f'walk ({args.workers} workers)', lambda: sum(1 for _ in gfs.walk(workers=args.workers)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,17 @@
-from pydrivebrowser.cli_browser import CliBrowser
\ No newline at end of file
+import importlib
+
+# imported on first access, so that importing the package does not load curses and pick
+_lazy_attributes = {
+    'CliBrowser': 'pydrivebrowser.cli_browser',
+    'GoogleDriveFileSystem': 'pydrivebrowser.google_drive',
+}
+
+
+def __getattr__(name: str):
+    if name not in _lazy_attributes:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return getattr(importlib.import_module(_lazy_attributes[name]), name)
+
+
+def __dir__():
+    return [*globals(), *_lazy_attributes]
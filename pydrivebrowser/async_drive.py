@@ -0,0 +1,232 @@
+import asyncio
+import itertools
+import json
+from typing import AsyncIterator, Dict, List
+
+import httplib2
+from googleapiclient.errors import HttpError
+from pydrive2.auth import GoogleAuth
+from pydrive2.files import ApiRequestError
+
+from pydrivebrowser.google_drive import GoogleDriveFileSystem, DEFAULT_PAGE_SIZE
+from pydrivebrowser.scheduler import RequestScheduler, default_scheduler, is_retryable_response
+from pydrivebrowser.url_parser import find_file_id_from_url
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DRIVE_API_URL = 'https://www.googleapis.com/drive/v2/'
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_ASYNC_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class AsyncGDriveFileReader:
+    """
+    Asynchronous reader downloading a file chunk by chunk with range requests
+
+    Iterating with `async for` yields the downloaded chunks.
+    """
+    def __init__(self, file_system: 'AsyncGoogleDriveFileSystem', file_id: str, chunksize=DEFAULT_ASYNC_CHUNK_SIZE):
+        self._file_system = file_system
+        self._file_id = file_id
+        self._chunksize = chunksize
+        self._pending = memoryview(b'')
+        self._offset = 0
+        self._position = 0
+        self.size = None
+
+    async def _next_chunk(self) -> bytes:
+        if self.size is not None and self._offset >= self.size:
+            return b''
+        headers = {'Range': f'bytes={self._offset}-{self._offset + self._chunksize - 1}'}
+        status, response_headers, content = await self._file_system.request(
+            'GET', f'files/{self._file_id}', {'alt': 'media'}, headers)
+        if status == 416:
+            self.size = int(response_headers['Content-Range'].rsplit('/', 1)[1])
+            return b''
+        if status == 206:
+            self.size = int(response_headers['Content-Range'].rsplit('/', 1)[1])
+        elif status == 200:  # server ignored the range
+            self.size = len(content)
+            content = content[self._offset:self._offset + self._chunksize]
+        else:
+            raise HttpError(httplib2.Response({'status': status}), content)
+        self._offset += len(content)
+        return content
+
+    async def readinto(self, b) -> int:
+        if not self._pending:
+            self._pending = memoryview(await self._next_chunk())
+        size = min(len(b), len(self._pending))
+        b[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self._position += size
+        return size
+
+    async def read(self, size=-1) -> bytes:
+        result = bytearray()
+        while size < 0 or len(result) < size:
+            if not self._pending:
+                self._pending = memoryview(await self._next_chunk())
+                if not self._pending:
+                    break
+            count = len(self._pending) if size < 0 else min(size - len(result), len(self._pending))
+            result += self._pending[:count]
+            self._pending = self._pending[count:]
+        self._position += len(result)
+        return bytes(result)
+
+    def __aiter__(self) -> 'AsyncGDriveFileReader':
+        return self
+
+    async def __anext__(self) -> bytes:
+        chunk = bytes(self._pending) if self._pending else await self._next_chunk()
+        self._pending = memoryview(b'')
+        if not chunk:
+            raise StopAsyncIteration
+        self._position += len(chunk)
+        return chunk
+
+    def tell(self) -> int:
+        return self._position
+
+    async def close(self) -> None:
+        self._pending = memoryview(b'')
+
+    async def __aenter__(self) -> 'AsyncGDriveFileReader':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+
+class AsyncGoogleDriveFileSystem:
+    """
+    asyncio counterpart of GoogleDriveFileSystem, built on aiohttp
+
+    All requests share one connection pool of at most max_connections connections, and go through the
+    RequestScheduler like the requests of GoogleDriveFileSystem (rate limit, retries of throttled requests
+    and server errors). Files are returned as metadata dictionaries.
+    """
+    def __init__(self, auth=None, max_connections=DEFAULT_MAX_CONNECTIONS, base_url=DRIVE_API_URL, token_cache=None,
+                 scheduler: RequestScheduler = None):
+        """
+        :param auth: GoogleAuth, authenticated interactively if it has no credentials
+        :param max_connections: maximum number of simultaneous connections
+        :param base_url: url of the Drive API
+        :param token_cache: json file the credentials are loaded from and saved to, see GoogleDriveFileSystem
+        :param scheduler: RequestScheduler shared with other file systems, the default one of the process if None
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncGoogleDriveFileSystem requires aiohttp (pip install pydrivebrowser[async])')
+        if not auth:
+            auth = GoogleAuth()
+        GoogleDriveFileSystem._authenticate(auth, token_cache)
+        self.auth = auth
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.scheduler = scheduler or default_scheduler()
+        self._session = None
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _access_token(self, refresh=False) -> str:
+        credentials = self.auth.credentials
+        if refresh or credentials.access_token_expired:
+            async with self._refresh_lock:
+                if refresh or credentials.access_token_expired:
+                    await asyncio.get_running_loop().run_in_executor(None, credentials.refresh, httplib2.Http())
+        return credentials.access_token
+
+    async def request(self, method: str, path: str, params=None, headers=None):
+        """
+        Send an authorized request to the Drive API when the scheduler allows it, retrying it on throttling
+        and server errors, and refreshing the access token once if it was rejected
+
+        :return: status, headers and body of the response
+        """
+        for attempt in itertools.count():
+            delay = self.scheduler.try_acquire()
+            while delay:  # waiting on the event loop, not in executor threads needed e.g. by token refreshes
+                await asyncio.sleep(delay)
+                delay = self.scheduler.try_acquire()
+            status, response_headers, content = await self._send(method, path, params, headers)
+            if attempt >= self.scheduler.max_retries or not is_retryable_response(status, content):
+                return status, response_headers, content
+            await asyncio.sleep(self.scheduler.retry_delay(attempt, status, content,
+                                                           response_headers.get('Retry-After', '')))
+
+    async def _send(self, method: str, path: str, params=None, headers=None):
+        for refresh in (False, True):
+            request_headers = {'Authorization': f'Bearer {await self._access_token(refresh)}', **(headers or {})}
+            async with self.session.request(method, self.base_url + path, params=params,
+                                            headers=request_headers) as response:
+                content = await response.read()
+                if response.status != 401:
+                    return response.status, response.headers, content
+        return response.status, response.headers, content
+
+    async def _get_json(self, path: str, params: Dict) -> Dict:
+        status, _, content = await self.request('GET', path, {k: v for k, v in params.items() if v is not None})
+        if status >= 300:
+            raise ApiRequestError(HttpError(httplib2.Response({'status': status}), content))
+        return json.loads(content)
+
+    async def iterdir(self, folder_id: str, fields=None, page_size=DEFAULT_PAGE_SIZE) -> AsyncIterator[Dict]:
+        """
+        Iterate over the files in a folder, fetching them page by page
+
+        :param folder_id: id of the folder
+        :param fields: metadata fields to fetch (e.g. ['id', 'title', 'mimeType']), all fields if None
+        :param page_size: number of files fetched per request
+        :return: async iterator over file metadata
+        """
+        if fields is not None and 'id' not in fields:
+            fields = ['id', *fields]
+        params = {'q': f"'{folder_id}' in parents and trashed=false", 'maxResults': page_size,
+                  'supportsAllDrives': 'true', 'includeItemsFromAllDrives': 'true',
+                  'fields': f"nextPageToken,items({','.join(fields)})" if fields else None}
+        while True:
+            response = await self._get_json('files', params)
+            for file in response.get('items', []):
+                yield file
+            params['pageToken'] = response.get('nextPageToken')
+            if not params['pageToken']:
+                return
+
+    async def listdir(self, folder_id: str, fields=None) -> List[Dict]:
+        return [file async for file in self.iterdir(folder_id, fields)]
+
+    async def get_metadata(self, file_id: str, fields=None) -> Dict:
+        return await self._get_json(f'files/{file_id}', {'fields': ','.join(fields) if fields else None,
+                                                          'supportsAllDrives': 'true'})
+
+    async def open(self, filename: str, chunksize=DEFAULT_ASYNC_CHUNK_SIZE) -> AsyncGDriveFileReader:
+        """
+        Open a file on Google Drive
+
+        :param filename: fileID or URL
+        :param chunksize: number of bytes downloaded per request
+        :return: AsyncGDriveFileReader
+        """
+        file_id = find_file_id_from_url(filename) or filename
+        return AsyncGDriveFileReader(self, file_id, chunksize)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> 'AsyncGoogleDriveFileSystem':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
@@ -1,12 +1,120 @@
 import curses
+import posixpath
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
 
 import pick
 from pick import Picker
 from pydrive2.files import GoogleDriveFile
 
 from pydrivebrowser.google_drive import GoogleDriveFileSystem, GoogleDriveBinaryFile, is_folder, has_file_extension
+from pydrivebrowser.metadata_cache import MetadataCache
+from pydrivebrowser.prefetch import Prefetcher
+from pydrivebrowser.scheduler import PRIORITY_INTERACTIVE
+from pydrivebrowser.search_index import SearchIndex
 from pydrivebrowser.url_parser import find_file_id_from_url, find_folder_id_from_url
 
+DEFAULT_LISTING_PAGE_SIZE = 200
+DEFAULT_PREFETCH_RADIUS = 3
+KEYS_SEARCH = (ord('/'),)
+KEYS_ENTER = (curses.KEY_ENTER, '\n', '\r')
+KEYS_BACKSPACE = (curses.KEY_BACKSPACE, '\b', '\x7f')
+KEY_ESCAPE = '\x1b'
+
+
+class Listing:
+    """
+    Sequence of the entries of a folder, fetching further pages only when entries past the loaded ones are accessed
+
+    Its length is the number of entries loaded so far. Whole pages are consumed at once, so that the file system
+    sees the end of short listings (and caches them).
+    """
+    def __init__(self, files: Iterator[GoogleDriveFile], item_factory: Callable, head: List = (),
+                 page_size=DEFAULT_LISTING_PAGE_SIZE, predicate: Callable[[GoogleDriveFile], bool] = None,
+                 generation=None):
+        """
+        :param files: files of the folder, fetched page by page
+        :param item_factory: creates the entry of a file
+        :param head: entries before the files (e.g. the parent folder)
+        :param page_size: number of files per page of the iterator
+        :param predicate: files for which it returns False are skipped, all files are kept if None
+        :param generation: MetadataCache.generation before the entries were fetched
+        """
+        self._files = files
+        self._item_factory = item_factory
+        self._items = list(head)
+        self.head_length = len(self._items)
+        self._page_size = page_size
+        self._predicate = predicate
+        self._consumed = 0
+        self.generation = generation
+
+    @property
+    def complete(self) -> bool:
+        return self._files is None
+
+    def load(self, count=None) -> None:
+        """
+        Fetch pages until count entries are loaded, or all of them if count is None
+        """
+        while self._files is not None and (count is None or len(self._items) < count):
+            target = self._consumed + self._page_size
+            for file in self._files:
+                self._consumed += 1
+                if self._predicate is None or self._predicate(file):
+                    self._items.append(self._item_factory(file))
+                if self._consumed >= target:
+                    break
+            else:
+                self._files = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or index < 0:
+            self.load()
+        else:
+            self.load(index + 1)
+        return self._items[index]
+
+
+@dataclass
+class ListingPicker(Picker):
+    """
+    Picker drawing only the visible entries of a Listing, loading further pages as the user scrolls down
+
+    on_highlight is called with the index of the highlighted entry each time the picker is drawn.
+    """
+    on_highlight: Optional[Callable[[int], None]] = None
+
+    def move_down(self) -> None:
+        self.options.load(self.index + 2)
+        super().move_down()
+
+    def move_up(self) -> None:
+        if self.index == 0:
+            self.options.load()  # wrap around to the last entry
+        super().move_up()
+
+    def draw(self, screen) -> None:
+        if self.clear_screen:
+            screen.clear()
+        y, x = self.position
+        max_y, max_x = screen.getmaxyx()
+        title_lines = self.get_title_lines(max_width=max_x)
+        rows = max(1, max_y - y - len(title_lines))
+        first = max(0, self.index - rows + 1)
+        self.options.load(first + rows)
+        lines = title_lines + [f'{self.indicator if index == self.index else " " * len(self.indicator)} '
+                               f'{self.options[index]}' for index in range(first, min(first + rows, len(self.options)))]
+        for line in lines:
+            screen.addnstr(y, x, line, max_x - 2)
+            y += 1
+        screen.refresh()
+        if self.on_highlight:
+            self.on_highlight(self.index)
+
 
 class CliBrowser(GoogleDriveFileSystem):
     class PickItem:
@@ -28,7 +136,28 @@ class CliBrowser(GoogleDriveFileSystem):
                     entry += f'  {int(size / (1024 * 1024 * 1024))} GiB'
             return entry
 
+    class SearchItem(PickItem):
+        """
+        Search hit, followed by the path of its folder
+        """
+        def __str__(self) -> str:
+            entry = super().__str__().ljust(CliBrowser.max_file_name_length + 10, ' ')
+            return f'{entry}  {posixpath.dirname(self.file["path"]) or "/"}'
+
     max_file_name_length = 40
+    listing_fields = ['id', 'title', 'mimeType', 'fileSize']
+    listing_page_size = DEFAULT_LISTING_PAGE_SIZE
+    prefetch_radius = DEFAULT_PREFETCH_RADIUS
+
+    def __init__(self, auth=None, metadata_cache: MetadataCache = None, search_index: SearchIndex = None, **kwargs):
+        """
+        :param auth: GoogleAuth, authenticated interactively if it has no credentials
+        :param metadata_cache: cache of visited folders, an in-memory cache is used if None
+        :param search_index: index searched by typing '/' in a listing, no search mode if None
+        :param kwargs: passed to GoogleDriveFileSystem
+        """
+        super().__init__(auth, metadata_cache=metadata_cache or MetadataCache(), **kwargs)
+        self.search_index = search_index
 
     def select_file(self, url='', file_extension=None) -> GoogleDriveBinaryFile:
         if url:
@@ -40,23 +169,104 @@ class CliBrowser(GoogleDriveFileSystem):
         else:
             folder_id = 'root'
 
-        return curses.wrapper(self._select_file, folder_id, file_extension)
+        try:
+            with self.scheduler.priority(PRIORITY_INTERACTIVE):  # ahead of downloads running in the background
+                return curses.wrapper(self._select_file, folder_id, file_extension)
+        finally:
+            self.metadata_cache.save()
+
+    def _open_listing(self, folder_id: str, file_extension=None) -> Listing:
+        """
+        :return: entries of a folder (preceded by its parent as '..') with the first page loaded
+        """
+        self.sync_changes()
+        generation = self.metadata_cache.generation
+        head = []
+        parent = self._get_parent(folder_id)
+        if parent:
+            parent['title'] = '..'
+            head = [self.PickItem(parent)]
+        # the extension is checked here, as the title filter of Drive queries is not a suffix match
+        files = Listing(self.iterdir(folder_id, self.listing_fields, self.listing_page_size), self.PickItem, head,
+                        self.listing_page_size,
+                        lambda f: is_folder(f) or has_file_extension(f, file_extension), generation)
+        files.load(len(head) + 1)
+        return files
+
+    def _is_listing_current(self, folder_id: str, files: Listing) -> bool:
+        """
+        :return: False if the changes feed touched the folder, its parent or the loaded entries since files were fetched
+        """
+        self.sync_changes()
+        ids = [folder_id, *(files[i].file['id'] for i in range(len(files)))]
+        return not self.metadata_cache.changed_since(files.generation, ids)
+
+    def _prefetch_near(self, prefetcher: Prefetcher, files: Listing, index: int) -> None:
+        """
+        Prefetch the highlighted folder, the parent and the loaded folders within prefetch_radius entries
+        """
+        indexes = [index, 0]
+        for distance in range(1, self.prefetch_radius + 1):
+            indexes += [index + distance, index - distance]
+        folder_ids = [files[i].file['id'] for i in indexes if 0 <= i < len(files) and is_folder(files[i].file)]
+        prefetcher.prefetch(folder_ids)
 
     def _select_file(self, screen, folder_id: str, file_extension=None) -> GoogleDriveBinaryFile:
         Picker([''], 'select file').config_curses()  # dummy picker to  configure curses
 
+        prefetcher = Prefetcher(lambda prefetched_id: self._open_listing(prefetched_id, file_extension), self.scheduler)
+        try:
+            while True:
+                files = prefetcher.take(folder_id, lambda listing: self._is_listing_current(folder_id, listing)) \
+                    or self._open_listing(folder_id, file_extension)
+                default_index = 1 if files.head_length and len(files) > 1 else 0
+                picker = ListingPicker(files, title='select file', default_index=default_index,
+                                       quit_keys=KEYS_SEARCH if self.search_index else None,
+                                       on_highlight=lambda index: self._prefetch_near(prefetcher, files, index))
+                item = None
+                while item is None:
+                    item, _ = picker.run_loop(screen, pick.Position(0,0))
+                    if item is None:  # search key
+                        item = self._search(screen, file_extension)
+                if not is_folder(item.file):
+                    return self.CreateFile({'id': item.file['id']})
+                else:
+                    folder_id = item.file['id']
+        finally:
+            prefetcher.close()
+
+    def _search(self, screen, file_extension=None) -> Optional[PickItem]:
+        """
+        Search mode: the hits of the search index are updated as the user types
+
+        The index is brought up to date from the changes feed first (built if it never was).
+
+        :return: highlighted hit when enter is pressed, None when escape is pressed
+        """
+        max_y, max_x = screen.getmaxyx()
+        screen.clear()
+        screen.addnstr(0, 0, 'search: updating index...', max_x - 2)
+        screen.refresh()
+        self.search_index.update(self)
+        text, index, hits = '', 0, []
         while True:
-            files = [self.PickItem(f) for f in self.listdir(folder_id) if is_folder(f) or has_file_extension(f, file_extension)]
-            default_index = 0
-            parent = self._get_parent(folder_id)
-            if parent:
-                parent['title'] = '..'
-                files = [self.PickItem(parent)] + files
-                if len(files) > 1:
-                    default_index = 1
-            picker = Picker(files, title='select file', default_index=default_index)
-            item, _ = picker.run_loop(screen, pick.Position(0,0))
-            if not is_folder(item.file):
-                return self.CreateFile({'id': item.file['id']})
-            else:
-                folder_id = item.file['id']
+            screen.clear()
+            screen.addnstr(0, 0, f'search: {text}', max_x - 2)
+            for row, hit in enumerate(hits[:max_y - 2]):
+                screen.addnstr(row + 2, 0, f'{"*" if row == index else " "} {hit}', max_x - 2)
+            screen.refresh()
+            key = screen.get_wch()
+            if key == KEY_ESCAPE:
+                return None
+            elif key in KEYS_ENTER:
+                if hits:
+                    return hits[index]
+            elif key == curses.KEY_UP:
+                index = max(0, index - 1)
+            elif key == curses.KEY_DOWN:
+                index = min(len(hits) - 1, index + 1)
+            elif key in KEYS_BACKSPACE or (isinstance(key, str) and key.isprintable()):
+                text = text[:-1] if key in KEYS_BACKSPACE else text + key
+                hits = [self.SearchItem(hit) for hit in self.search_index.search(text, max_y - 2)
+                        if is_folder(hit) or has_file_extension(hit, file_extension)]
+                index = 0
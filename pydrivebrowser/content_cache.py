@@ -0,0 +1,174 @@
+import io
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from pydrive2.files import GoogleDriveFile
+
+from pydrivebrowser import metrics
+
+try:
+    import fcntl
+except ImportError:  # no inter-process locking on Windows, renames stay atomic
+    fcntl = None
+
+DEFAULT_MAX_CACHE_SIZE = 1024 * 1024 * 1024
+TEMP_SUFFIX = '.part'
+LOCK_FILE = '.lock'
+
+
+class CachingStream(io.RawIOBase):
+    """
+    Raw stream copying everything read from a reader into a temporary file of the cache
+
+    The temporary file is added to the cache once the reader reaches the end of the file
+    and discarded if the stream is closed before.
+    """
+    def __init__(self, reader: io.BufferedIOBase, cache: 'ContentCache', key: str):
+        super().__init__()
+        self._reader = reader
+        self._cache = cache
+        self._key = key
+        fd, self._temp_path = tempfile.mkstemp(suffix=TEMP_SUFFIX, dir=cache.directory)
+        self._temp_file = os.fdopen(fd, 'wb')
+
+    def readinto(self, b) -> int:
+        size = self._reader.readinto(b)
+        if size:
+            self._temp_file.write(memoryview(b)[:size])
+        elif self._temp_file:
+            self._temp_file.close()
+            self._temp_file = None
+            if self._cache.store(self._key, self._temp_path) is None:
+                os.remove(self._temp_path)
+        return size
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        if self._temp_file:
+            self._temp_file.close()
+            self._temp_file = None
+            os.remove(self._temp_path)
+        self._reader.close()
+        super().close()
+
+
+class ContentCache:
+    """
+    On-disk cache of file contents keyed by md5Checksum (or file id and version if there is no checksum)
+
+    As entries are addressed by content, files with the same content share one entry.
+
+    Entries are written to temporary files and renamed into place, and the directory is locked while
+    entries are added or evicted, so several processes can share one cache directory.
+    The least recently used entries are evicted when the cache grows beyond max_size bytes.
+    """
+    def __init__(self, directory: str, max_size=DEFAULT_MAX_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._thread_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(file: GoogleDriveFile) -> Optional[str]:
+        if file.get('md5Checksum'):
+            return f"md5-{file['md5Checksum']}"
+        if file.get('version'):
+            return f"{file['id']}-{file['version']}"
+        return None
+
+    def open(self, key: str, reader_factory: Callable[[], io.BufferedIOBase]) -> io.BufferedReader:
+        """
+        Open a cached file, or a reader filling the cache as it is read
+
+        :param key: cache key (see ContentCache.key)
+        :param reader_factory: opens the remote file on cache miss
+        :return: local file if cached, buffered reader filling the cache otherwise
+        """
+        path = self._path(key)
+        with self._lock():
+            try:
+                file = open(path, 'rb')
+            except FileNotFoundError:
+                self.misses += 1
+                metrics.count('content_cache.miss')
+            else:
+                self.hits += 1
+                metrics.count('content_cache.hit')
+                os.utime(path)  # mark as recently used
+                return file
+        return io.BufferedReader(CachingStream(reader_factory(), self, key))
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        :return: path of the cached file, marked as recently used, None if not cached
+        """
+        path = self._path(key)
+        with self._lock():
+            if not os.path.exists(path):
+                self.misses += 1
+                metrics.count('content_cache.miss')
+                return None
+            self.hits += 1
+            metrics.count('content_cache.hit')
+            os.utime(path)
+            return path
+
+    def store(self, key: str, temp_path: str) -> Optional[str]:
+        """
+        Add a complete temporary file of the cache directory to the cache
+
+        :return: path of the cached file, None if the file is larger than max_size (temp_path is left as is)
+        """
+        if os.path.getsize(temp_path) > self.max_size:
+            return None
+        path = self._path(key)
+        with self._lock():
+            os.replace(temp_path, path)
+            self._evict(path)
+        return path
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def size(self) -> int:
+        return sum(os.path.getsize(path) for path in self._entries())
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._entries()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(entries),
+                'size': sum(os.path.getsize(path) for path in entries)}
+
+    def _evict(self, new_path: str) -> None:
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        size = sum(os.path.getsize(path) for path in entries)
+        for path in entries:
+            if size <= self.max_size:
+                break
+            if path != new_path:
+                size -= os.path.getsize(path)
+                os.remove(path)
+
+    def _entries(self):
+        return [entry.path for entry in os.scandir(self.directory)
+                if entry.is_file() and not entry.name.endswith(TEMP_SUFFIX) and entry.name != LOCK_FILE]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    @contextmanager
+    def _lock(self):
+        with self._thread_lock, open(os.path.join(self.directory, LOCK_FILE), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,194 @@
+from typing import Dict, List
+
+from pydrivebrowser.google_drive import GoogleDriveFileSystem, is_folder, quote_query_value
+from pydrivebrowser.io_stream import fetch_range
+from pydrivebrowser.url_parser import find_folder_id_from_url
+
+try:
+    import fsspec
+    from fsspec.dircache import DirCache
+    from fsspec.spec import AbstractFileSystem, AbstractBufferedFile
+except ImportError:
+    fsspec = DirCache = None
+    AbstractFileSystem = AbstractBufferedFile = object
+
+LISTING_FIELDS = ['id', 'title', 'mimeType', 'fileSize', 'md5Checksum', 'modifiedDate']
+
+
+class GoogleDriveBufferedFile(AbstractBufferedFile):
+    """
+    Seekable read-only file downloading the byte ranges read (through the block cache of fsspec)
+    """
+    def _fetch_range(self, start: int, end: int) -> bytes:
+        return self.fs.fetch_range(self.details['id'], start, end)
+
+
+class FsspecGoogleDriveFileSystem(AbstractFileSystem):
+    """
+    fsspec file system addressing the files below a Drive folder by path ('folder/subfolder/title')
+
+    Paths are resolved to ids title by title, and the results are cached like the folder listings,
+    so that looking up a path again sends no request. These caches do not follow the changes made on Drive:
+    call invalidate_cache(), or pass listings_expiry_time (seconds) or use_listings_cache=False.
+    Titles containing '/' cannot be addressed, and of several files with the same title in a folder the first
+    one listed is used. Files are read only.
+
+    Pass token_cache rather than file_system for the instance to be picklable (e.g. for dask workers).
+    """
+    protocol = 'pydrivebrowser'
+    root_marker = ''
+
+    def __init__(self, file_system: GoogleDriveFileSystem = None, root_id='root', token_cache=None,
+                 **storage_options):
+        """
+        :param file_system: GoogleDriveFileSystem sending the requests, one is created with token_cache if None
+        :param root_id: id or URL of the folder paths are relative to
+        :param token_cache: json file of the credentials, see GoogleDriveFileSystem
+        :param storage_options: passed to AbstractFileSystem (e.g. use_listings_cache, listings_expiry_time)
+        """
+        if fsspec is None:
+            raise ImportError('FsspecGoogleDriveFileSystem requires fsspec (pip install pydrivebrowser[fsspec])')
+        super().__init__(file_system=file_system, root_id=root_id, token_cache=token_cache, **storage_options)
+        self.file_system = file_system or GoogleDriveFileSystem(token_cache=token_cache)
+        self.root_id = find_folder_id_from_url(root_id) or root_id
+        self._entries = DirCache(**storage_options)  # info by path
+
+    @classmethod
+    def _strip_protocol(cls, path):
+        path = super()._strip_protocol(path)
+        return [p.strip('/') for p in path] if isinstance(path, list) else path.strip('/')
+
+    @staticmethod
+    def _info(path: str, file: Dict) -> Dict:
+        directory = is_folder(file)
+        size = file.get('fileSize')
+        info = {'name': path, 'size': 0 if directory else int(size) if size is not None else None,
+                'type': 'directory' if directory else 'file', 'id': file['id'], 'mimeType': file['mimeType']}
+        info.update({key: file[key] for key in ('md5Checksum', 'modifiedDate') if key in file})
+        return info
+
+    def _entry(self, path: str) -> Dict:
+        """
+        :return: info of a stripped path, resolving it title by title from the deepest cached folder
+        :raises: FileNotFoundError
+        """
+        entry = self._entries.get(path)
+        if entry is not None:
+            return entry
+        if path == self.root_marker:
+            return {'name': path, 'size': 0, 'type': 'directory', 'id': self.root_id}
+        parent, _, title = path.rpartition('/')
+        parent_entry = self._entry(parent)
+        if parent_entry['type'] != 'directory' or self.dircache.get(parent) is not None:
+            raise FileNotFoundError(path)  # a listed folder has all its entries cached
+        files = self.file_system.listdir(parent_entry['id'], LISTING_FIELDS, f'title = {quote_query_value(title)}')
+        if not files:
+            raise FileNotFoundError(path)
+        entry = self._entries[path] = self._info(path, files[0])
+        return entry
+
+    def _cache_listing(self, path: str, files: List[Dict]) -> List[Dict]:
+        entries = {}
+        for file in files:
+            child_path = f'{path}/{file["title"]}'.lstrip('/')
+            entries.setdefault(child_path, self._info(child_path, file))
+        self._entries.update(entries)
+        self.dircache[path] = listing = list(entries.values())
+        return listing
+
+    def ls(self, path, detail=True, refresh=False, **kwargs):
+        """
+        :param path: folder (or file) path
+        :param detail: return the info of the entries rather than their paths
+        :param refresh: list the folder again even if its listing is cached
+        """
+        path = self._strip_protocol(path)
+        entries = None if refresh else self.dircache.get(path)
+        if entries is None:
+            entry = self._entry(path)
+            if entry['type'] == 'directory':
+                entries = self._cache_listing(path, self.file_system.listdir(entry['id'], LISTING_FIELDS))
+            else:
+                entries = [entry]
+        return [dict(entry) for entry in entries] if detail else [entry['name'] for entry in entries]
+
+    def info(self, path, **kwargs) -> Dict:
+        """
+        :return: name, size, type ('file' or 'directory'), id, mimeType, md5Checksum and modifiedDate of a path
+        :raises: FileNotFoundError
+        """
+        return dict(self._entry(self._strip_protocol(path)))
+
+    def walk(self, path, maxdepth=None, topdown=True, on_error='omit', **kwargs):
+        """
+        Like AbstractFileSystem.walk, but the folders not listed yet are first listed several at a time
+        with GoogleDriveFileSystem.walk (maxdepth levels deep)
+        """
+        path = self._strip_protocol(path)
+        try:
+            entry = self._entry(path)
+        except FileNotFoundError:
+            entry = None
+        if entry is not None and entry['type'] == 'directory' and self.dircache.use_listings_cache \
+                and path not in self.dircache:
+            paths = {entry['id']: path}
+            for folder, subfolders, files in self.file_system.walk(
+                    entry['id'], max_depth=None if maxdepth is None else maxdepth - 1):
+                for child in self._cache_listing(paths[folder['id']], subfolders + files):
+                    if child['type'] == 'directory':
+                        paths.setdefault(child['id'], child['name'])
+        yield from super().walk(path, maxdepth, topdown, on_error, **kwargs)
+
+    def fetch_range(self, file_id: str, start: int, end: int) -> bytes:
+        """
+        :return: bytes start to end (exclusive) of a file
+        """
+        if start >= end:
+            return b''
+        request = self.file_system.CreateFile({'id': file_id}).media_request()
+        content, _ = fetch_range(request, start, end - 1, self.file_system.http_pool)
+        return content
+
+    def _file_info(self, path) -> Dict:
+        """
+        :return: info of a file with binary content
+        :raises: IsADirectoryError for folders, ValueError for Google Docs and other files without a size
+        """
+        entry = self.info(path)
+        if entry['type'] == 'directory':
+            raise IsADirectoryError(path)
+        if entry['size'] is None:
+            raise ValueError(f'{path} ({entry["mimeType"]}) has no binary content to read')
+        return entry
+
+    def cat_file(self, path, start=None, end=None, **kwargs) -> bytes:
+        """
+        :param start: first byte, from the end if negative
+        :param end: end of the range (exclusive), from the end if negative, the end of the file if None
+        """
+        entry = self._file_info(path)
+        size = entry['size']
+        start = 0 if start is None else max(0, size + start) if start < 0 else start
+        end = size if end is None else max(0, size + end) if end < 0 else min(end, size)
+        return self.fetch_range(entry['id'], start, end)
+
+    def _open(self, path, mode='rb', block_size=None, autocommit=True, cache_options=None, **kwargs):
+        if mode != 'rb':
+            raise ValueError(f'Unsupported mode {mode}')
+        self._file_info(path)
+        return GoogleDriveBufferedFile(self, path, mode, block_size, autocommit, cache_options=cache_options,
+                                       **kwargs)
+
+    def invalidate_cache(self, path=None) -> None:
+        """
+        Drop the cached listings and path resolutions of a path and the paths below it, of all paths if None
+        """
+        path = None if path is None else self._strip_protocol(path)
+        if not path:
+            self.dircache.clear()
+            self._entries.clear()
+            return
+        self.dircache.pop(self._parent(path), None)
+        for cache in (self.dircache, self._entries):
+            for key in [key for key in cache if key == path or key.startswith(path + '/')]:
+                cache.pop(key, None)
@@ -1,37 +1,144 @@
+import collections
+import io
+import itertools
 import os
-from typing import List, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Iterator, Iterable, Tuple
 
-from pydrive2.files import FileNotUploadedError, GoogleDriveFile
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from pydrive2.files import ApiRequestError, FileNotUploadedError, GoogleDriveFile
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 
-from pydrivebrowser.io_stream import GDriveFileReader
+from pydrivebrowser.http_pool import HttpPool, DEFAULT_MAX_CONNECTIONS
+from pydrivebrowser.content_cache import ContentCache, DEFAULT_MAX_CACHE_SIZE
+from pydrivebrowser.io_stream import GDriveFileReader, GDriveFileWriter, ChunkSizeController, MaterializedFile, \
+    materialize, DEFAULT_BLOCK_SIZE, DEFAULT_CACHE_SIZE, DEFAULT_UPLOAD_CHUNK_SIZE
+from pydrivebrowser.metadata_cache import MetadataCache
+from pydrivebrowser.scheduler import RequestScheduler, default_scheduler, is_retryable_response
 from pydrivebrowser.url_parser import find_file_id_from_url
 
-try:
-    from curses import wrapper
-    if 'TERM' not in os.environ:
-        raise ValueError('No terminal')
-except (ImportError, ValueError):
-    def wrapper(func, *args, **kwargs):
-        return func(None, *args, **kwargs)
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+def wrapper(func, *args, **kwargs):
+    """
+    curses.wrapper if there is a terminal, a plain call otherwise (curses is only imported when needed)
+    """
+    if 'TERM' in os.environ:
+        try:
+            import curses
+        except ImportError:
+            pass
+        else:
+            return curses.wrapper(func, *args, **kwargs)
+    return func(None, *args, **kwargs)
 
 
 class GoogleDriveBinaryFile(GoogleDriveFile):
-    def open(self) -> GDriveFileReader:
+    def open(self, workers=1, seekable=False, cache_size=DEFAULT_CACHE_SIZE, read_ahead=0,
+             adaptive_chunks=False, verify_checksum=False) -> GDriveFileReader:
+        """
+        Open the file for reading
+
+        :param workers: number of byte ranges downloaded concurrently
+        :param seekable: download blocks on demand, allowing random access with seek()
+        :param cache_size: number of bytes of downloaded blocks kept in memory if seekable
+        :param read_ahead: number of chunks downloaded ahead of the reader by a background thread
+        :param adaptive_chunks: adapt the chunk size to the measured latency and bandwidth (sequential readers only)
+        :param verify_checksum: hash the content as it is read and raise ChecksumError at the end
+                                if it does not match md5Checksum (sequential readers only)
+        :return: GDriveFileReader (file-like buffered reader)
+        """
+        request = self.media_request()
+        md5_checksum = self['md5Checksum'] if verify_checksum else None
+        size = self.metadata.get('fileSize') or self.get('fileSize')
+        return GDriveFileReader(request, workers=workers, http_factory=self._http_factory(), seekable=seekable,
+                                cache_size=cache_size, size=int(size) if size is not None else None,
+                                read_ahead=read_ahead,
+                                chunk_controller=ChunkSizeController() if adaptive_chunks else None,
+                                md5_checksum=md5_checksum)
+
+    def materialize(self, directory=None, workers=1, block_size=DEFAULT_BLOCK_SIZE,
+                    callback=None) -> MaterializedFile:
+        """
+        Download the file into a sparse temporary file in the background and map it in memory
+
+        :param directory: directory of the temporary file, the default temporary directory if None
+        :param workers: number of blocks downloaded concurrently
+        :param block_size: number of bytes per range request
+        :param callback: called with the MaterializedFile once the download is complete
+        :return: MaterializedFile (read-only, blocking until the regions read are downloaded)
+        """
+        return materialize(self.media_request(), int(self['fileSize']), directory, workers, block_size,
+                           self._http_factory(), callback)
+
+    def _http_factory(self):
+        if isinstance(self.http, HttpPool):
+            return lambda: self.http  # the pool is thread-safe, workers share it
+        return self.auth.Get_Http_Object
+
+    def open_writer(self, chunksize=DEFAULT_UPLOAD_CHUNK_SIZE, write_behind=0, callback=None) -> GDriveFileWriter:
+        """
+        Open the file for writing, replacing its content (or creating it if it has no id)
+
+        The metadata of the file is updated once the writer is closed.
+
+        :param chunksize: number of bytes per upload request, a multiple of 256 KiB
+        :param write_behind: number of chunks buffered for a background upload thread
+        :param callback: called with the new metadata once the upload is complete
+        :return: GDriveFileWriter (file-like raw writer)
+        """
+        files = self.auth.service.files()
+        file_id = self.metadata.get('id') or self.get('id')
+        mimetype = self.get('mimeType') or 'application/octet-stream'
+
+        def request_factory(media):
+            if file_id:
+                request = files.update(fileId=file_id, media_body=media, supportsAllDrives=True)
+            else:
+                request = files.insert(body=dict(self), media_body=media, supportsAllDrives=True)
+            return self._WrapRequest(request)
+
+        def on_complete(metadata):
+            self.uploaded = True
+            self.UpdateMetadata(metadata)
+            if callback:
+                callback(metadata)
+
+        return GDriveFileWriter(request_factory, mimetype, chunksize, write_behind, callback=on_complete)
+
+    def media_request(self) -> HttpRequest:
         files = self.auth.service.files()
         file_id = self.metadata.get("id") or self.get("id")
         if not file_id:
             raise FileNotUploadedError()
-        request = self._WrapRequest(files.get_media(fileId=file_id))
-        return GDriveFileReader(request)
+        return self._WrapRequest(files.get_media(fileId=file_id))
 
     def close(self):
         pass
 
 
+def is_retryable(error: HttpError) -> bool:
+    """
+    :return: True if the request failed because of rate limiting or a server error
+    """
+    return is_retryable_response(error.resp.status, error.content)
+
+
 def is_folder(file: GoogleDriveFile):
-    return 'folder' in file['mimeType']
+    return file['mimeType'] == FOLDER_MIME_TYPE
+
+
+def quote_query_value(value: str) -> str:
+    """
+    :return: value as a quoted string of the Drive query language
+    """
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
 
 
 def has_file_extension(file: GoogleDriveFile, extension: str):
@@ -46,46 +153,368 @@ def has_file_extension(file: GoogleDriveFile, extension: str):
     return len(split_list) > 1 and split_list[-1] == extension
 
 
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_WALK_WORKERS = 4
+DEFAULT_WALK_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 100
+
+
+class PoolThreadLocal(threading.local):
+    """
+    Thread-local storage of pydrive2 (GoogleAuth.thread_local) whose http object is an HttpPool in every thread
+
+    pydrive2 sends the requests of a thread with the http object it finds (or creates) in auth.thread_local.http,
+    as httplib2.Http is not thread-safe. Sharing one HttpPool between the threads keeps that contract,
+    since the pool is thread-safe, and any other attribute pydrive2 sets remains per thread.
+    """
+    def __init__(self, http: HttpPool):
+        super().__init__()
+        self.http = http
+
+
 class GoogleDriveFileSystem(GoogleDrive):
 
-    def __init__(self, auth=None):
+    def __init__(self, auth=None, cache_dir=None, cache_size=DEFAULT_MAX_CACHE_SIZE,
+                 metadata_cache: MetadataCache = None, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 scheduler: RequestScheduler = None, token_cache=None):
+        """
+        The API service is built, and an expired access token refreshed, on the first request rather than here.
+
+        :param auth: GoogleAuth, authenticated interactively if it has no credentials
+        :param cache_dir: directory of the local content cache, files are downloaded on every open if None
+        :param cache_size: maximum size of the content cache in bytes
+        :param metadata_cache: MetadataCache for listings and file metadata, every call hits the API if None
+        :param max_connections: maximum number of simultaneous connections to the API, shared by all threads
+        :param scheduler: RequestScheduler of all the requests, the one shared by the process if None
+        :param token_cache: json file the credentials are loaded from if auth has none, and saved to after
+                            an interactive authentication or a refresh, so that later runs start without either
+        """
         if not auth:
             auth = GoogleAuth()
-        self._authenticate(auth)
+        self._authenticate(auth, token_cache)
         super().__init__(auth)
-        self.auth.Authorize()
+        self._authorize_lock = threading.Lock()
+        self.scheduler = scheduler or default_scheduler()
+        self.http_pool = HttpPool(self.auth.Get_Http_Object, max_connections, self.auth.credentials, self.scheduler)
+        self.auth.thread_local = PoolThreadLocal(self.http_pool)
+        self.content_cache = ContentCache(cache_dir, cache_size) if cache_dir else None
+        self.metadata_cache = metadata_cache
 
-    def open(self, filename: str) -> GDriveFileReader:
+    def open(self, filename: str, mode='rb', seekable=False, parent_id=None, materialize=None, **kwargs) -> io.IOBase:
         """
         Open a file on Google Drive
 
-        :param filename: fileID or URL
-        :return: GDriveFileReader (file-like buffered reader)
+        In write mode ('wb'), a new file titled filename is created in the folder parent_id,
+        or if parent_id is None, the content of the existing file filename (fileID or URL) is replaced.
+
+        If the file system has a content cache, files whose content is in the cache (possibly under another id)
+        are read from the local cache. Otherwise they are added to the cache as they are read (unless seekable),
+        once their content is verified against md5Checksum.
 
-        :raises:
+        With materialize='mmap', the file is downloaded in the background to a local sparse file (in the content
+        cache directory if any) mapped in memory, and reads block until the regions they need are downloaded.
+
+        :param filename: fileID or URL, or title of the new file if writing with a parent_id
+        :param mode: 'rb' to read, 'wb' to write
+        :param seekable: download blocks on demand, allowing random access with seek()
+        :param parent_id: id of the folder of the new file if writing
+        :param materialize: 'mmap' to read from a local memory-mapped copy
+        :param kwargs: passed to GoogleDriveBinaryFile.open (workers, cache_size, read_ahead, adaptive_chunks,
+                       verify_checksum), GoogleDriveBinaryFile.materialize (workers, block_size)
+                       or GoogleDriveBinaryFile.open_writer (chunksize, write_behind)
+        :return: GDriveFileReader (file-like buffered reader), or local file if cached, or GDriveFileWriter,
+                 or MaterializedFile
+
+        :raises: ValueError if the mode is not supported
         """
-        file_id = find_file_id_from_url(filename)
-        if not file_id:
-            file_id = filename
-        return self.CreateFile({'id': file_id}).open()
+        if mode not in ('rb', 'wb'):
+            raise ValueError(f'Unsupported mode {mode}')
+        if materialize not in (None, 'mmap') or (materialize and mode != 'rb'):
+            raise ValueError(f'Unsupported materialize mode {materialize}')
+        if mode == 'wb' and parent_id:
+            file = self.CreateFile({'title': filename, 'parents': [{'id': parent_id}]})
+        else:
+            file = self.CreateFile({'id': find_file_id_from_url(filename) or filename})
+        if mode == 'wb':
+            if self.metadata_cache is not None:
+                callback = kwargs.pop('callback', None)
+
+                def on_uploaded(metadata: Dict) -> None:
+                    self.metadata_cache.apply_change(metadata['id'], metadata)
+                    if callback is not None:
+                        callback(metadata)
+                kwargs['callback'] = on_uploaded
+            return file.open_writer(**kwargs)
+        if materialize:
+            return self._materialize(file, **kwargs)
+        if self.content_cache:
+            file.FetchMetadata(fields='id,md5Checksum,version,fileSize')
+            key = ContentCache.key(file)
+            if key and (not seekable or key in self.content_cache):
+                kwargs.setdefault('verify_checksum', 'md5Checksum' in file)
+                return self.content_cache.open(key, lambda: file.open(**kwargs))
+        return file.open(seekable=seekable, **kwargs)
+
+    def _materialize(self, file: GoogleDriveBinaryFile, **kwargs) -> MaterializedFile:
+        if not self.content_cache:
+            return file.materialize(**kwargs)
+        file.FetchMetadata(fields='id,md5Checksum,version,fileSize')
+        key = ContentCache.key(file)
+        if not key:
+            return file.materialize(**kwargs)
+        path = self.content_cache.get(key)
+        if path:
+            return MaterializedFile(path, os.path.getsize(path), delete=False)
+
+        def store(materialized: MaterializedFile):
+            path = self.content_cache.store(key, materialized.name)
+            if path is not None:  # otherwise too large for the cache, removed on close
+                materialized.keep(path)
+
+        return file.materialize(self.content_cache.directory, callback=store, **kwargs)
 
     @staticmethod
-    def _authenticate(auth) -> None:
+    def _authenticate(auth, token_cache=None) -> None:
+        if not auth.credentials and token_cache and os.path.exists(token_cache):
+            auth.LoadCredentialsFile(token_cache)  # refreshed tokens are saved back to the file
         if not auth.credentials:
             # curses wrapper to avoid spamming the console
             wrapper(lambda std_scr: auth.LocalWebserverAuth())
+            if token_cache:
+                auth.SaveCredentialsFile(token_cache)
+                auth.LoadCredentialsFile(token_cache)
+
+    def _authorize(self) -> None:
+        """
+        Refresh an expired access token and build the API service, if not done yet
+
+        pydrive2 would otherwise authenticate interactively again when it finds an expired token.
+        """
+        if self.auth.service is not None and not self.auth.access_token_expired:
+            return
+        with self._authorize_lock:
+            if self.auth.access_token_expired:
+                self.auth.credentials.refresh(httplib2.Http(timeout=self.auth.http_timeout))
+            if self.auth.service is None:
+                self.auth.Authorize()
+
+    def ListFile(self, param=None):
+        self._authorize()
+        return super().ListFile(param)
+
+    def listdir(self, folder_id: str, fields=None, query=None) -> List:
+        return list(self.iterdir(folder_id, fields, query=query))
+
+    def iterdir(self, folder_id: str, fields=None, page_size=DEFAULT_PAGE_SIZE, query=None
+                ) -> Iterator[GoogleDriveFile]:
+        """
+        Iterate over the files in a folder, fetching them page by page
+
+        :param folder_id: id of the folder
+        :param fields: metadata fields to fetch (e.g. ['id', 'title', 'mimeType']), all fields if None
+        :param page_size: number of files fetched per request
+        :param query: Drive query the files must also match (e.g. "title contains 'report'"), evaluated by the API
+        :return: iterator over GoogleDriveFile
+        """
+        if fields is not None and 'id' not in fields:
+            fields = ['id', *fields]
+        if self.metadata_cache is not None:
+            self.sync_changes()
+            files = self.metadata_cache.get_listing(folder_id, fields, query)
+            if files is not None:
+                for file in files:
+                    yield GoogleDriveFile(auth=self.auth, metadata=file, uploaded=True)
+                return
+            generation = self.metadata_cache.generation
+
+        param = {'q': f"{quote_query_value(folder_id)} in parents and trashed=false", 'maxResults': page_size}
+        if query:
+            param['q'] += f' and ({query})'
+        if fields is not None:
+            param['fields'] = f"nextPageToken,items({','.join(fields)})"
+        files = []
+        for page in self.ListFile(param):
+            files.extend(page)
+            yield from page
+        if self.metadata_cache is not None:
+            self.sync_changes()  # earlier pages may have changed during a long iteration
+            self.metadata_cache.set_listing(folder_id, files, fields, query, generation)
+
+    def walk(self, folder_id='root', max_depth=None, workers=DEFAULT_WALK_WORKERS, batch_size=DEFAULT_WALK_BATCH_SIZE
+             ) -> Iterator[Tuple[GoogleDriveFile, List[GoogleDriveFile], List[GoogleDriveFile]]]:
+        """
+        Walk a folder tree breadth-first, listing several folders concurrently
+
+        Up to batch_size folders are listed with a single query and up to workers queries run at a time.
+        Folders reachable through several parents are only visited once.
+
+        :param folder_id: id of the top folder
+        :param max_depth: depth up to which subfolders are listed (0 lists only the top folder), no limit if None
+        :param workers: number of concurrent list queries
+        :param batch_size: maximum number of folders combined in one query
+        :return: iterator over (folder, subfolders, files) in the order the listings arrive
+        """
+        folders = {folder_id: self.CreateFile({'id': folder_id, 'mimeType': FOLDER_MIME_TYPE})}
+        pending = collections.deque([(folder_id, 0)])
+        visited = {folder_id}
+        running = set()
+        with ThreadPoolExecutor(workers, thread_name_prefix='gdrive-walk') as executor:
+            try:
+                while pending or running:
+                    while pending and len(running) < workers:
+                        batch = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+                        running.add(executor.submit(self._list_folders, batch))
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for (parent_id, depth), children in future.result().items():
+                            subfolders = [child for child in children if is_folder(child)]
+                            files = [child for child in children if not is_folder(child)]
+                            yield folders.pop(parent_id), subfolders, files
+                            if max_depth is not None and depth >= max_depth:
+                                continue
+                            for subfolder in subfolders:
+                                if subfolder['id'] not in visited:
+                                    visited.add(subfolder['id'])
+                                    folders[subfolder['id']] = subfolder
+                                    pending.append((subfolder['id'], depth + 1))
+            finally:
+                for future in running:
+                    future.cancel()
+
+    def _list_folders(self, batch: List[Tuple[str, int]]) -> Dict[Tuple[str, int], List[GoogleDriveFile]]:
+        parents_query = ' or '.join(f"'{folder_id}' in parents" for folder_id, _ in batch)
+        children = {entry: [] for entry in batch}
+        for page in self.ListFile({'q': f"({parents_query}) and trashed=false", 'maxResults': DEFAULT_PAGE_SIZE}):
+            for file in page:
+                parent_ids = {'root' if parent.get('isRoot') else parent['id'] for parent in file['parents']}
+                parent_ids.update(parent['id'] for parent in file['parents'])
+                for folder_id, depth in batch:
+                    if folder_id in parent_ids:
+                        children[(folder_id, depth)].append(file)
+        return children
+
+    def start_page_token(self) -> str:
+        """
+        :return: page token of the changes made from now on
+        """
+        self._authorize()
+        return self.auth.service.changes().getStartPageToken(supportsAllDrives=True).execute(
+            http=self.http_pool)['startPageToken']
+
+    def list_changes(self, page_token: str, file_fields='id,parents(id,isRoot)') -> Tuple[List[Dict], str]:
+        """
+        Fetch the changes made since a page token of the changes feed
+
+        :param page_token: token returned by start_page_token() or by a previous call
+        :param file_fields: metadata fields of the changed files
+        :return: changes (fileId, deleted and file) and the token of the following changes
+        """
+        self._authorize()
+        changes = []
+        while True:
+            response = self.auth.service.changes().list(
+                pageToken=page_token, includeDeleted=True, supportsAllDrives=True, includeItemsFromAllDrives=True,
+                fields=f'nextPageToken,newStartPageToken,items(fileId,deleted,file({file_fields}))'
+            ).execute(http=self.http_pool)
+            changes.extend(response['items'])
+            if 'nextPageToken' not in response:
+                return changes, response['newStartPageToken']
+            page_token = response['nextPageToken']
+
+    def sync_changes(self, force=False) -> None:
+        """
+        Poll the Drive changes feed and drop the metadata cache entries of changed files
+
+        :param force: poll even if the poll interval of the cache did not elapse yet
+        """
+        cache = self.metadata_cache
+        if cache is None or not (force or cache.needs_poll()):
+            return
+        if cache.page_token is None:
+            cache.clear()
+            cache.page_token = self.start_page_token()
+        changes, cache.page_token = self.list_changes(cache.page_token)
+        for change in changes:
+            cache.apply_change(change['fileId'], None if change.get('deleted') else change.get('file'))
+        cache.last_poll = time.monotonic()
+
+    def _get_metadata(self, file_id: str) -> Dict:
+        if self.metadata_cache is None:
+            return self.CreateFile({'id': file_id})
+        self.sync_changes()
+        metadata = self.metadata_cache.get_file(file_id)
+        if metadata is None:
+            file = self.CreateFile({'id': file_id})
+            file.FetchMetadata()
+            metadata = dict(file)
+            self.metadata_cache.set_file(file_id, metadata)
+        return metadata
+
+    def get_metadata_many(self, ids: Iterable[str], fields=None) -> Dict[str, Dict]:
+        """
+        Fetch the metadata of many files, grouping up to 100 lookups in one batch request
+
+        Lookups failing with a rate limit or server error are sent again in a later batch, after the backoff
+        and up to the number of retries of the scheduler. Metadata served from the metadata cache is restricted
+        to the (top-level) fields requested, like the metadata fetched.
+
+        :param ids: file ids
+        :param fields: metadata fields to fetch (e.g. ['id', 'title', 'parents']), all fields if None
+        :return: metadata by file id, files which do not exist are left out
+        :raises: ApiRequestError if a lookup fails for another reason or after all retries
+        """
+        results = {}
+        pending = []
+        if self.metadata_cache is not None:
+            self.sync_changes()
+        for file_id in dict.fromkeys(ids):
+            metadata = self.metadata_cache.get_file(file_id) if self.metadata_cache is not None else None
+            if metadata is not None:
+                results[file_id] = metadata if fields is None else \
+                    {key: metadata[key] for key in (field.partition('(')[0] for field in fields) if key in metadata}
+            else:
+                pending.append(file_id)
+
+        if pending:
+            self._authorize()
+        for attempt in itertools.count():
+            failed = {}
+
+            def callback(file_id, response, exception):
+                if exception is None:
+                    results[file_id] = response
+                    if self.metadata_cache is not None and fields is None:
+                        self.metadata_cache.set_file(file_id, response)
+                elif exception.resp.status != 404:
+                    failed[file_id] = exception
+
+            for start in range(0, len(pending), MAX_BATCH_SIZE):
+                batch = self.auth.service.new_batch_http_request(callback=callback)
+                for file_id in pending[start:start + MAX_BATCH_SIZE]:
+                    batch.add(self.auth.service.files().get(fileId=file_id, fields=','.join(fields) if fields else None,
+                                                            supportsAllDrives=True), request_id=file_id)
+                batch.execute(http=self.http_pool)
 
-    def listdir(self, folder_id: str) -> List:
-        return self.ListFile({'q': f"'{folder_id}' in parents and trashed=false"}).GetList()
+            errors = {file_id: e for file_id, e in failed.items()
+                      if not is_retryable(e) or attempt >= self.scheduler.max_retries}
+            if errors:
+                raise ApiRequestError(next(iter(errors.values())))
+            pending = list(failed)
+            if not pending:
+                return results
+            time.sleep(self.scheduler.backoff(attempt))
 
     def _get_parent(self, file_id: str) -> [Dict, None]:
-        parents = self.CreateFile({'id': file_id})['parents']
+        parents = self._get_metadata(file_id)['parents']
         if parents:
-            parent = parents[0]
-            parent['mimeType'] = 'folder'
+            parent = dict(parents[0])
+            parent['mimeType'] = FOLDER_MIME_TYPE
             return parent
         else:
             return None
 
     def CreateFile(self, metadata=None) -> GoogleDriveBinaryFile:
-        return GoogleDriveBinaryFile(auth=self.auth, metadata=metadata)
+        self._authorize()
+        file = GoogleDriveBinaryFile(auth=self.auth, metadata=metadata)
+        file.http = self.http_pool
+        return file
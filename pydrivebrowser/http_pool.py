@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+
+import httplib2
+
+from pydrivebrowser import metrics
+from pydrivebrowser.scheduler import RequestScheduler, PRIORITY_NORMAL
+
+DEFAULT_MAX_CONNECTIONS = 10
+
+
+class HttpPool:
+    """
+    Thread-safe pool of authorized http objects
+
+    httplib2.Http is not thread-safe, so each request borrows an idle http object (keeping its connections alive
+    for the next request) or creates one if fewer than max_connections exist, waiting otherwise.
+    Waiting threads get an http object in the order of their priority in the scheduler (see RequestScheduler),
+    so that an interactive request is not queued behind the requests of bulk downloads.
+    The pool has the request() method of httplib2.Http and can be used wherever an http object is expected.
+    Requests go through the scheduler, if any, before borrowing an http object.
+    Each request is reported to the metrics listeners as an 'http.request' span.
+    """
+    def __init__(self, http_factory: Callable[[], httplib2.Http] = httplib2.Http,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, credentials=None, scheduler: RequestScheduler = None):
+        """
+        :param http_factory: creates an authorized http object
+        :param max_connections: maximum number of http objects, and so of simultaneous connections
+        :param credentials: credentials of the http objects, used by googleapiclient to refresh batch requests
+        :param scheduler: RequestScheduler limiting the request rate and retrying throttled requests, none if None
+        """
+        if max_connections < 1:
+            raise ValueError('max_connections must be at least 1')
+        self.max_connections = max_connections
+        self.credentials = credentials
+        self.scheduler = scheduler
+        self._http_factory = http_factory
+        self._idle: List[httplib2.Http] = []
+        self._created = 0
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        """
+        :return: number of http objects currently in the pool, idle or in use
+        """
+        return self._created
+
+    def acquire(self) -> httplib2.Http:
+        """
+        Take an http object out of the pool, waiting until one is available
+        """
+        priority = PRIORITY_NORMAL if self.scheduler is None else self.scheduler.current_priority
+        entry = (priority, next(self._counter))
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while self._waiting[0] != entry or (not self._idle and self._created >= self.max_connections):
+                    self._condition.wait()
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+            if self._idle:
+                return self._idle.pop()  # most recently used, most likely to still be connected
+            self._created += 1
+        try:
+            return self._http_factory()
+        except BaseException:
+            self._discard()
+            raise
+
+    def release(self, http: httplib2.Http) -> None:
+        with self._condition:
+            self._idle.append(http)
+            self._condition.notify_all()
+
+    def _discard(self) -> None:
+        with self._condition:
+            self._created -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def connection(self) -> Iterator[httplib2.Http]:
+        """
+        Borrow an http object for several requests
+
+        The http object is dropped instead of returned to the pool if the block raises,
+        as its connection may be left in the middle of a response.
+        """
+        http = self.acquire()
+        try:
+            yield http
+        except BaseException:
+            http.close()
+            self._discard()
+            raise
+        self.release(http)
+
+    def request(self, *args, **kwargs):
+        """
+        Send a request with an http object of the pool, see httplib2.Http.request
+        """
+        if self.scheduler is None:
+            return self._request(*args, **kwargs)
+        return self.scheduler.call(lambda: self._request(*args, **kwargs))
+
+    def _request(self, *args, **kwargs):
+        with metrics.span('http.request') as span, self.connection() as http:
+            response, content = http.request(*args, **kwargs)
+            if span is not None:
+                span.set(method=args[1] if len(args) > 1 else kwargs.get('method', 'GET'), status=response.status,
+                         bytes=len(content or b''))
+            return response, content
+
+    def close(self) -> None:
+        """
+        Close the connections of the idle http objects
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._condition.notify_all()
+        for http in idle:
+            http.close()
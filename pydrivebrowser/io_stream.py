@@ -1,47 +1,919 @@
+import collections
+import hashlib
 import io
+import mmap
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
 
 import googleapiclient
-from googleapiclient.http import DEFAULT_CHUNK_SIZE, MediaDownloadProgress
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import DEFAULT_CHUNK_SIZE, MediaDownloadProgress, MediaUpload
+
+from pydrivebrowser import metrics
+from pydrivebrowser.http_pool import HttpPool
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_MIN_CHUNK_SIZE = 256 * 1024
+DEFAULT_CACHE_SIZE = 64 * DEFAULT_BLOCK_SIZE
+UPLOAD_CHUNK_GRANULARITY = 256 * 1024  # chunks of a resumable upload must be multiples of this
+DEFAULT_UPLOAD_CHUNK_SIZE = 32 * UPLOAD_CHUNK_GRANULARITY
+
+
+class ChecksumError(IOError):
+    """
+    Raised at the end of a download whose content does not match the expected md5 checksum
+    """
+
+
+def verify_md5(md5, expected: str) -> None:
+    """
+    :param md5: hashlib md5 of the downloaded content
+    :param expected: expected hex digest (e.g. md5Checksum)
+    :raises: ChecksumError if they differ
+    """
+    if md5.hexdigest() != expected:
+        raise ChecksumError(f'md5 checksum mismatch: expected {expected}, downloaded {md5.hexdigest()}')
+
+
+def worker_http_factory(http) -> Callable[[], httplib2.Http]:
+    """
+    :return: factory of http objects with the credentials of http, for worker threads (httplib2.Http is not
+             thread-safe), returning http itself if it is an HttpPool
+    """
+    if isinstance(http, HttpPool):
+        return lambda: http
+    credentials = getattr(http.request, 'credentials', None)  # set by oauth2client's authorize()
+    if credentials is not None:
+        return lambda: credentials.authorize(httplib2.Http(timeout=getattr(http, 'timeout', None)))
+    if not isinstance(http, httplib2.Http) and hasattr(http, 'credentials'):  # google_auth_httplib2.AuthorizedHttp
+        return lambda: type(http)(http.credentials)
+    return httplib2.Http
+
+
+def fetch_range(request: googleapiclient.http.HttpRequest, start: int, end: int, http=None) -> Tuple[bytes, int]:
+    """
+    Download bytes start to end (inclusive) of a media request
+
+    :param request: media request (e.g. files().get_media())
+    :param start: first byte to download
+    :param end: last byte to download
+    :param http: http object to use instead of request.http
+    :return: downloaded bytes and total size of the file
+    """
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in ('accept', 'accept-encoding', 'user-agent')}
+    headers['range'] = f'bytes={start}-{end}'
+    with metrics.span('drive.fetch_range') as span:
+        resp, content = (http or request.http).request(request.uri, 'GET', headers=headers)
+        if span is not None:
+            span.set(status=resp.status, bytes=len(content))
+    if resp.status == 206:
+        return content, int(resp['content-range'].rsplit('/', 1)[1])
+    elif resp.status == 200:  # server ignored the range
+        return content[start:end + 1], len(content)
+    elif resp.status == 416:  # range starts after end of file
+        return b'', int(resp['content-range'].rsplit('/', 1)[1])
+    raise HttpError(resp, content, uri=request.uri)
+
+
+class ChunkSizeController:
+    """
+    Adapts the chunk size to the measured per-chunk latency and bandwidth
+
+    Downloads start with small chunks, so small files and peeks return quickly. After each chunk, the size is scaled
+    so that the next chunk takes about target_duration seconds (at most doubling or halving per chunk), which grows
+    chunks on fast connections and until the request latency is amortized, and shrinks them on slow connections.
+    """
+    def __init__(self, minimum=DEFAULT_MIN_CHUNK_SIZE, maximum=DEFAULT_CHUNK_SIZE, target_duration=0.5, initial=None,
+                 smoothing=0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_duration = target_duration
+        self.smoothing = smoothing
+        self.chunksize = initial or minimum
+        self.latency = None
+        self.bandwidth = None
+        self.chunk_count = 0
+
+    def update(self, size: int, duration: float) -> None:
+        """
+        :param size: number of bytes of the downloaded chunk
+        :param duration: time the chunk took in seconds
+        """
+        duration = max(duration, 1e-6)
+        bandwidth = size / duration
+        self.latency = duration if self.latency is None else self._smooth(self.latency, duration)
+        self.bandwidth = bandwidth if self.bandwidth is None else self._smooth(self.bandwidth, bandwidth)
+        self.chunk_count += 1
+        if size < self.chunksize:  # end of file, duration says nothing about larger chunks
+            return
+        scale = min(2.0, max(0.5, self.target_duration / duration))
+        self.chunksize = int(min(self.maximum, max(self.minimum, self.chunksize * scale)))
+
+    def _smooth(self, average: float, value: float) -> float:
+        return self.smoothing * average + (1 - self.smoothing) * value
+
+    def __repr__(self) -> str:
+        return f'ChunkSizeController(chunksize={self.chunksize}, latency={self.latency}, bandwidth={self.bandwidth})'
 
 
 class DownloadStream(io.RawIOBase):
-    def __init__(self, request: googleapiclient.http.HttpRequest, chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Raw stream downloading a file chunk by chunk with MediaIoBaseDownload
+
+    Each chunk is written straight into the buffer passed to readinto(). If a chunk does not fit,
+    the remainder is kept as a view on the received bytes and returned by the following calls.
+    With a chunk_controller, the size of each chunk is chosen by the controller instead of chunksize.
+    With an md5_checksum, the chunks are hashed as they arrive and reading past the end raises ChecksumError
+    if the content does not match.
+    """
+    def __init__(self, request: googleapiclient.http.HttpRequest, chunksize=DEFAULT_CHUNK_SIZE,
+                 chunk_controller: ChunkSizeController = None, md5_checksum=None):
         super().__init__()
+        self.md5_checksum = md5_checksum
+        self._md5 = hashlib.md5() if md5_checksum else None
+        self.chunk_controller = chunk_controller
+        if chunk_controller:
+            chunksize = chunk_controller.chunksize
         self._downloader = googleapiclient.http.MediaIoBaseDownload(self, request, chunksize=chunksize)
         self._memory = None
         self._memory_size = 0
+        self._pending = memoryview(b'')
         self._done = False
         self.status = None
 
     def readinto(self, b) -> int:
+        if self._pending:
+            size = min(len(b), len(self._pending))
+            b[:size] = self._pending[:size]
+            self._pending = self._pending[size:]
+            return size
         if self._done:
+            if self._md5:
+                verify_md5(self._md5, self.md5_checksum)
             return 0
         self._memory = b
-        self.status, self._done = self._downloader.next_chunk()
+        with metrics.span('drive.download_chunk') as span:
+            if not self.chunk_controller:
+                self.status, self._done = self._downloader.next_chunk()
+            else:
+                self._downloader._chunksize = self.chunk_controller.chunksize
+                start = time.monotonic()
+                self.status, self._done = self._downloader.next_chunk()
+                self.chunk_controller.update(self._memory_size + len(self._pending), time.monotonic() - start)
+            if span is not None:
+                span.set(bytes=self._memory_size + len(self._pending))
         return self._memory_size
 
     def write(self, b):
-        if len(b) > len(self._memory):
-            raise BufferError(f'Trying to write {len(b)} bytes. Buffer only holds {len(self._memory)} bytes')
-        self._memory_size = len(b)
-        self._memory[:self._memory_size] = b
+        b = memoryview(b)
+        if self._md5:
+            self._md5.update(b)
+        self._memory_size = min(len(b), len(self._memory))
+        self._memory[:self._memory_size] = b[:self._memory_size]
+        self._pending = b[self._memory_size:]
 
     def readable(self) -> bool:
         return True
 
     def tell(self) -> int:
         if self.status:
-            return self.status.resumable_progress
+            return self.status.resumable_progress - len(self._pending)
         else:
             return 0
 
 
+class ParallelDownloadStream(io.RawIOBase):
+    """
+    Raw stream downloading byte ranges of a file concurrently and returning them in order
+
+    At most max_chunks_ahead chunks are downloaded or held in memory ahead of the reader.
+    Each worker thread uses its own http object created by http_factory (see worker_http_factory, the default),
+    as httplib2.Http is not thread-safe. With an md5_checksum, the chunks are hashed in order and reading past
+    the end raises ChecksumError if the content does not match.
+    """
+    def __init__(self, request: googleapiclient.http.HttpRequest, chunksize=DEFAULT_CHUNK_SIZE, workers=4,
+                 http_factory=None, max_chunks_ahead=None, md5_checksum=None):
+        super().__init__()
+        self.md5_checksum = md5_checksum
+        self._md5 = hashlib.md5() if md5_checksum else None
+        self._request = request
+        self._chunksize = chunksize
+        self._workers = workers
+        self._http_factory = http_factory or worker_http_factory(request.http)
+        self._max_chunks_ahead = max_chunks_ahead or 2 * workers
+        self._local = threading.local()
+        self._executor = None
+        self._futures = collections.deque()
+        self._next_chunk = 0
+        self._size = None
+        self._position = 0
+        self._pending = memoryview(b'')
+        self.status = None
+
+    def readinto(self, b) -> int:
+        if not self._pending:
+            content = self._next_content()
+            if not content:
+                if self._md5:
+                    verify_md5(self._md5, self.md5_checksum)
+                return 0
+            if self._md5:
+                self._md5.update(content)
+            self._pending = memoryview(content)
+        size = min(len(b), len(self._pending))
+        b[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self._position += size
+        self.status = MediaDownloadProgress(self._position, self._size)
+        return size
+
+    def _next_content(self) -> bytes:
+        if self._size is None:
+            # the first chunk is downloaded synchronously to learn the file size
+            content, self._size = fetch_range(self._request, 0, self._chunksize - 1, self._http())
+            self._next_chunk = 1
+            self._executor = ThreadPoolExecutor(self._workers, thread_name_prefix='gdrive-download')
+            self._schedule()
+            return content
+        if not self._futures:
+            return b''
+        content = self._futures.popleft().result()
+        self._schedule()
+        return content
+
+    def _schedule(self) -> None:
+        while len(self._futures) < self._max_chunks_ahead and self._next_chunk * self._chunksize < self._size:
+            start = self._next_chunk * self._chunksize
+            end = min(start + self._chunksize, self._size) - 1
+            self._futures.append(self._executor.submit(self._fetch, start, end))
+            self._next_chunk += 1
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        content, _ = fetch_range(self._request, start, end, self._http())
+        return content
+
+    def _http(self):
+        if not hasattr(self._local, 'http'):
+            self._local.http = self._http_factory()
+        return self._local.http
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        if self._executor:
+            futures, self._futures = self._futures, collections.deque()
+            for future in futures:
+                future.cancel()
+            self._executor.shutdown(wait=True)  # running fetches finish before their buffers go away
+            self._executor = None
+        super().close()
+
+
+class SeekableDownloadStream(io.RawIOBase):
+    """
+    Seekable raw stream downloading fixed-size blocks with range requests
+
+    The most recently used blocks are kept in memory, up to cache_size bytes,
+    so that reads close to previous reads do not download the same block twice.
+    """
+    def __init__(self, request: googleapiclient.http.HttpRequest, block_size=DEFAULT_BLOCK_SIZE,
+                 cache_size=DEFAULT_CACHE_SIZE, size=None):
+        super().__init__()
+        self._request = request
+        self._block_size = block_size
+        self._max_blocks = max(1, cache_size // block_size)
+        self._blocks = collections.OrderedDict()
+        self._size = size
+        self._position = 0
+        self.hits = 0
+        self.misses = 0
+        self.status = None
+
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            self._block(0)
+        return self._size
+
+    def readinto(self, b) -> int:
+        if self._position >= self.size:
+            return 0
+        index, offset = divmod(self._position, self._block_size)
+        block = self._block(index)
+        size = min(len(b), len(block) - offset)
+        b[:size] = memoryview(block)[offset:offset + size]
+        self._position += size
+        self.status = MediaDownloadProgress(self._position, self._size)
+        return size
+
+    def _block(self, index: int) -> bytes:
+        if index in self._blocks:
+            self.hits += 1
+            metrics.count('block_cache.hit')
+            self._blocks.move_to_end(index)
+            return self._blocks[index]
+        self.misses += 1
+        metrics.count('block_cache.miss')
+        start = index * self._block_size
+        block, self._size = fetch_range(self._request, start, start + self._block_size - 1)
+        self._blocks[index] = block
+        while len(self._blocks) > self._max_blocks:
+            self._blocks.popitem(last=False)
+        return block
+
+    def seek(self, offset: int, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence ({whence})')
+        if position < 0:
+            raise ValueError(f'Negative seek position {position}')
+        self._position = position
+        return position
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+
+class ReadAheadStream(io.RawIOBase):
+    """
+    Raw stream reading chunks of another raw stream in a background thread
+
+    Up to read_ahead chunks are kept in a queue ahead of the reader, so that processing the data
+    and downloading the next chunks overlap. An error of the background thread is raised by readinto(),
+    and again by every later call. Closing does not wait for the chunk being read: the background thread stops
+    after it and then closes the raw stream.
+    """
+    def __init__(self, raw: io.RawIOBase, read_ahead: int, chunksize=DEFAULT_CHUNK_SIZE):
+        super().__init__()
+        self._raw = raw
+        self._chunksize = chunksize
+        self._queue = queue.Queue(maxsize=read_ahead)
+        self._stop = threading.Event()
+        self._thread = None
+        self._done = False
+        self._lock = threading.Lock()
+        self._pending = memoryview(b'')
+        self._eof = False
+        self._error = None
+        self._position = 0
+
+    def readinto(self, b) -> int:
+        if not self._pending:
+            if self._error is not None:
+                raise self._error
+            if self._eof:
+                return 0
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._read_ahead, name='gdrive-read-ahead', daemon=True)
+                self._thread.start()
+            chunk = self._queue.get()
+            if isinstance(chunk, BaseException):
+                self._error = chunk
+                raise chunk
+            if not chunk:
+                self._eof = True
+                return 0
+            self._pending = chunk
+        size = min(len(b), len(self._pending))
+        b[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self._position += size
+        return size
+
+    def _read_ahead(self) -> None:
+        try:
+            while not self._stop.is_set():
+                buffer = bytearray(self._chunksize)
+                size = self._raw.readinto(buffer)
+                self._put(memoryview(buffer)[:size])
+                if not size:
+                    return
+        except Exception as e:
+            self._put(e)
+        finally:
+            with self._lock:
+                self._done = True
+                if self._stop.is_set():
+                    self._raw.close()
+
+    def _put(self, item) -> None:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    @property
+    def status(self) -> [MediaDownloadProgress, None]:
+        if not self._raw.status:
+            return None
+        return MediaDownloadProgress(self._position, self._raw.status.total_size)
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            if self._thread is None or self._done:
+                self._raw.close()
+            # otherwise the raw stream may be reading a chunk, which can take long: the thread closes it afterwards
+        self._thread = None
+        super().close()
+
+
 class GDriveFileReader(io.BufferedReader):
-    def __init__(self, request: googleapiclient.http.HttpRequest, buffer_size=DEFAULT_CHUNK_SIZE):
-        super().__init__(DownloadStream(request, buffer_size), buffer_size)
+    def __init__(self, request: googleapiclient.http.HttpRequest, buffer_size=None, workers=1,
+                 http_factory=None, seekable=False, cache_size=DEFAULT_CACHE_SIZE, size=None, read_ahead=0,
+                 chunk_controller: ChunkSizeController = None, md5_checksum=None):
+        """
+        :param request: media request (e.g. files().get_media())
+        :param buffer_size: size of the buffer and of each downloaded chunk,
+                            DEFAULT_BLOCK_SIZE if seekable, DEFAULT_CHUNK_SIZE otherwise
+        :param workers: number of concurrent range downloads, 1 downloads one chunk at a time on request.http
+        :param http_factory: creates the http object of each worker if workers > 1,
+                             http objects with the credentials of request.http if None
+        :param seekable: download blocks on demand, allowing seek() to any offset
+        :param cache_size: number of bytes of downloaded blocks kept in memory if seekable
+        :param size: size of the file if known, avoids downloading the first block to find it if seekable
+        :param read_ahead: number of chunks downloaded ahead of the reader by a background thread
+        :param chunk_controller: adapts the size of each chunk (ignoring buffer_size) if given,
+                                 only supported when downloading one chunk at a time
+        :param md5_checksum: expected md5 hex digest, checked as the file is read sequentially
+                             (reading past the end raises ChecksumError on mismatch)
+        """
+        if seekable and read_ahead:
+            raise ValueError('read_ahead is not supported for seekable readers')
+        if chunk_controller and (seekable or workers > 1):
+            raise ValueError('chunk_controller is only supported for sequential readers')
+        if seekable and md5_checksum:
+            raise ValueError('md5_checksum is not supported for seekable readers')
+        if buffer_size is None:
+            if chunk_controller:
+                buffer_size = chunk_controller.minimum
+            else:
+                buffer_size = DEFAULT_BLOCK_SIZE if seekable else DEFAULT_CHUNK_SIZE
+        if seekable:
+            raw = SeekableDownloadStream(request, buffer_size, cache_size, size)
+        elif workers > 1:
+            raw = ParallelDownloadStream(request, buffer_size, workers, http_factory, md5_checksum=md5_checksum)
+        else:
+            raw = DownloadStream(request, buffer_size, chunk_controller, md5_checksum)
+        self._chunk_controller = chunk_controller
+        if read_ahead:
+            raw = ReadAheadStream(raw, read_ahead, buffer_size)
+        super().__init__(raw, buffer_size)
+        self._opened = time.monotonic()
+
+    @property
+    def chunk_controller(self) -> [ChunkSizeController, None]:
+        """
+        Adaptive chunk size controller, with the current chunk size and measured latency and bandwidth
+        """
+        return self._chunk_controller
 
     @property
     def progress(self) -> MediaDownloadProgress:
         if not self.raw.status:
             self.peek(0)  # download one chunk to know size
         return self.raw.status
+
+    def close(self) -> None:
+        if not self.closed and metrics.enabled():
+            size = self.raw.tell()
+            metrics.record('reader.bytes', size)
+            metrics.record('reader.throughput', size / max(time.monotonic() - self._opened, 1e-6))
+        super().close()
+
+
+class MaterializedFile(io.RawIOBase):
+    """
+    Local copy of a file, downloaded by background threads into a sparse file mapped read-only in memory
+
+    Reads, slices and views of regions which are not downloaded yet block until they arrive,
+    so the beginning of the file can be processed while the rest is still downloading.
+    The local file (name, fileno()) and the mmap have their final content once the download is complete.
+    """
+    def __init__(self, path: str, size: int, delete=True):
+        """
+        Map a local file, complete unless download() is called
+
+        :param path: local file of the given size (sparse until downloaded)
+        :param size: size of the file in bytes
+        :param delete: remove the local file on close
+        """
+        super().__init__()
+        self.name = path
+        self.size = size
+        self._delete = delete
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._block_size = None
+        self._missing = None
+        self._error = None
+        self._executor = None
+        self._position = 0
+        self._condition = threading.Condition()
+
+    def download(self, request: googleapiclient.http.HttpRequest, workers=1, block_size=DEFAULT_BLOCK_SIZE,
+                 http_factory=None, callback: Callable[['MaterializedFile'], None] = None) -> None:
+        """
+        Start downloading the content in the background, block by block in file order
+
+        :param request: media request (e.g. files().get_media())
+        :param workers: number of blocks downloaded concurrently
+        :param block_size: number of bytes per range request
+        :param http_factory: creates the http object of each worker thread,
+                             http objects with the credentials of request.http if None
+        :param callback: called with this file from a worker thread once the download is complete
+        """
+        http_factory = http_factory or worker_http_factory(request.http)
+        self._block_size = block_size
+        self._missing = set(range(-(-self.size // block_size)))
+        unwritten = set(self._missing)
+        local = threading.local()
+
+        def fetch(index: int):
+            if not hasattr(local, 'http'):
+                local.http = http_factory()
+            start = index * block_size
+            content, _ = fetch_range(request, start, min(start + block_size, self.size) - 1, local.http)
+            os.pwrite(fd, content, start)
+            with self._condition:
+                unwritten.discard(index)
+                last = not unwritten
+            if last and callback:
+                callback(self)  # before the last block is marked as downloaded, so that waiting readers see its effect
+            with self._condition:
+                self._missing.discard(index)
+                self._condition.notify_all()
+
+        def done(future):
+            if not future.cancelled() and future.exception() is not None:
+                with self._condition:
+                    self._error = self._error or future.exception()
+                    self._condition.notify_all()
+
+        fd = os.open(self.name, os.O_WRONLY)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='gdrive-materialize')
+        futures = [self._executor.submit(fetch, index) for index in sorted(self._missing)]
+        for future in futures:
+            future.add_done_callback(done)
+        threading.Thread(target=lambda: (self._executor.shutdown(), os.close(fd)), daemon=True).start()
+
+    def wait(self, start=0, end=None, timeout=None) -> bool:
+        """
+        Wait until a region is downloaded
+
+        :param start: first byte of the region
+        :param end: end of the region (exclusive), end of the file if None
+        :param timeout: maximum number of seconds to wait, no limit if None
+        :return: False if the timeout expired
+        :raises: the error of the download if it failed
+        """
+        end = self.size if end is None else min(end, self.size)
+        if self._missing is None or start >= end:
+            return True
+        blocks = range(start // self._block_size, -(-end // self._block_size))
+        with self._condition:
+            return self._condition.wait_for(lambda: self._check_error() or not self._missing.intersection(blocks),
+                                            timeout)
+
+    def _check_error(self) -> bool:
+        if self._error is not None:
+            raise IOError('Download failed') from self._error
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        return False
+
+    @property
+    def complete(self) -> bool:
+        return not self._missing
+
+    @property
+    def mmap(self) -> Optional[mmap.mmap]:
+        """
+        Read-only mmap of the whole file (None if empty), once it is downloaded
+        """
+        self.wait()
+        return self._mmap
+
+    def view(self, start=0, end=None) -> memoryview:
+        """
+        :return: read-only memoryview of a region of the mmap, once it is downloaded
+        """
+        end = self.size if end is None else min(end, self.size)
+        self.wait(start, end)
+        if self._mmap is None:
+            return memoryview(b'')
+        return memoryview(self._mmap)[start:end]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key) -> [bytes, int]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step > 0:
+                self.wait(start, stop)
+            else:
+                self.wait(stop + 1, start + 1)
+            return self._mmap[key] if self._mmap is not None else b''
+        index = key + self.size if key < 0 else key
+        if not 0 <= index < self.size:
+            raise IndexError('index out of range')
+        self.wait(index, index + 1)
+        return self._mmap[index]
+
+    def readinto(self, b) -> int:
+        size = max(0, min(len(b), self.size - self._position))
+        if size:
+            b[:size] = self.view(self._position, self._position + size)
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence ({whence})')
+        if position < 0:
+            raise ValueError(f'Negative seek position {position}')
+        self._position = position
+        return position
+
+    def tell(self) -> int:
+        return self._position
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def keep(self, path: str) -> None:
+        """
+        Keep the local file on close, after it was moved to path
+        """
+        self.name = path
+        self._delete = False
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._condition:
+            super().close()
+            self._condition.notify_all()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:  # views are still exported, the mapping is released with them
+                pass
+        self._file.close()
+        if self._delete and os.path.exists(self.name):
+            os.remove(self.name)
+
+
+def materialize(request: googleapiclient.http.HttpRequest, size: int, directory=None, workers=1,
+                block_size=DEFAULT_BLOCK_SIZE, http_factory=None,
+                callback: Callable[[MaterializedFile], None] = None) -> MaterializedFile:
+    """
+    Download a file into a sparse temporary file in the background and map it in memory
+
+    :param request: media request (e.g. files().get_media())
+    :param size: size of the file in bytes
+    :param directory: directory of the temporary file, the default temporary directory if None
+    :param workers: number of blocks downloaded concurrently
+    :param block_size: number of bytes per range request
+    :param http_factory: creates the http object of each worker thread,
+                         http objects with the credentials of request.http if None
+    :param callback: called with the MaterializedFile from a worker thread once the download is complete
+    :return: MaterializedFile, removing the temporary file on close
+    """
+    fd, path = tempfile.mkstemp(suffix='.part', dir=directory)
+    try:
+        os.ftruncate(fd, size)  # sparse, blocks are allocated as they are written
+    finally:
+        os.close(fd)
+    file = MaterializedFile(path, size)
+    if size:
+        file.download(request, workers, block_size, http_factory, callback)
+    elif callback:
+        callback(file)
+    return file
+
+
+class _UploadBuffer(MediaUpload):
+    """
+    Resumable media holding the bytes written but not yet acknowledged by the server
+    """
+    def __init__(self, mimetype: str, chunksize: int):
+        super().__init__()
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self.data = bytearray()
+        self.offset = 0  # position of data[0] in the file
+        self.total_size = None  # known once the writer is closed
+        self.condition = threading.Condition()
+
+    def chunksize(self) -> int:
+        return self._chunksize
+
+    def mimetype(self) -> str:
+        return self._mimetype
+
+    def size(self):
+        return self.total_size
+
+    def resumable(self) -> bool:
+        return True
+
+    def has_stream(self) -> bool:
+        return False
+
+    def getbytes(self, begin: int, length: int) -> bytes:
+        with self.condition:
+            start = begin - self.offset
+            return bytes(self.data[start:start + length])
+
+    def acknowledge(self, progress: int) -> None:
+        with self.condition:
+            del self.data[:progress - self.offset]
+            self.offset = progress
+            self.condition.notify_all()
+
+
+class GDriveFileWriter(io.RawIOBase):
+    """
+    Writable raw stream uploading a file through a resumable upload session in fixed-size chunks
+
+    A chunk is sent once more data than a chunk has been written (the rest goes with the final chunk on close),
+    so at most (2 + write_behind) chunks are held in memory and writes block until the upload catches up.
+    Rate limiting and server errors are retried by the scheduler of the http pool; after a transport error,
+    the chunk is sent once more from the offset the server acknowledged. With write_behind, chunks are uploaded
+    by a background thread while the producer keeps writing. The upload is complete once close() returns.
+    """
+    def __init__(self, request_factory: Callable[[MediaUpload], googleapiclient.http.HttpRequest],
+                 mimetype='application/octet-stream', chunksize=DEFAULT_UPLOAD_CHUNK_SIZE, write_behind=0,
+                 callback: Callable[[Dict], None] = None):
+        """
+        :param request_factory: creates the upload request for a media body (e.g. files().insert(media_body=...))
+        :param mimetype: mime type of the content
+        :param chunksize: number of bytes per request, a multiple of 256 KiB
+        :param write_behind: number of chunks buffered for a background upload thread, uploads in write() if 0
+        :param callback: called with the metadata of the uploaded file
+        """
+        super().__init__()
+        if chunksize <= 0 or chunksize % UPLOAD_CHUNK_GRANULARITY:
+            raise ValueError(f'chunksize must be a multiple of {UPLOAD_CHUNK_GRANULARITY}')
+        self._buffer = _UploadBuffer(mimetype, chunksize)
+        self._request = request_factory(self._buffer)
+        self._chunksize = chunksize
+        self._max_buffered = (2 + write_behind) * chunksize
+        self._write_behind = write_behind
+        self._callback = callback
+        self._thread = None
+        self._error = None
+        self._aborted = False
+        self.metadata = None
+
+    def write(self, b) -> int:
+        view = memoryview(b).cast('B')
+        written = 0
+        buffer = self._buffer
+        while written < len(view):
+            with buffer.condition:
+                while len(buffer.data) >= self._max_buffered and self._error is None:
+                    buffer.condition.wait()
+                self._raise_error()
+                size = min(len(view) - written, self._max_buffered - len(buffer.data))
+                buffer.data += view[written:written + size]
+                buffer.condition.notify_all()
+            written += size
+            if self._write_behind:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._upload_loop, name='gdrive-upload', daemon=True)
+                    self._thread.start()
+            else:
+                while len(buffer.data) > self._chunksize:
+                    self._upload_chunk()
+        return written
+
+    def _upload_loop(self) -> None:
+        buffer = self._buffer
+        try:
+            while self.metadata is None:
+                with buffer.condition:
+                    while len(buffer.data) <= self._chunksize and buffer.total_size is None and not self._aborted:
+                        buffer.condition.wait()
+                    if self._aborted:
+                        return
+                self._upload_chunk()
+        except Exception as e:
+            with buffer.condition:
+                self._error = e
+                buffer.condition.notify_all()
+
+    def _upload_chunk(self) -> None:
+        try:
+            body = self._send_chunk()
+        except (httplib2.HttpLib2Error, OSError):
+            metrics.count('drive.upload_resumes')
+            body = self._send_chunk()  # after an error, next_chunk() first queries the offset the server has
+        if body is None:
+            self._buffer.acknowledge(self._request.resumable_progress)
+        else:
+            self._buffer.acknowledge(self._buffer.total_size)
+            self.metadata = body
+            if self._callback:
+                self._callback(body)
+
+    def _send_chunk(self) -> Optional[Dict]:
+        progress = self._request.resumable_progress
+        with metrics.span('drive.upload_chunk') as span:
+            _, body = self._request.next_chunk()
+            if span is not None:
+                uploaded = self._request.resumable_progress if body is None else self._buffer.total_size
+                span.set(bytes=uploaded - progress)
+        return body
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise IOError('Upload failed') from self._error
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._buffer.offset + len(self._buffer.data)
+
+    def close(self) -> None:
+        """
+        Upload the remaining data and complete the upload
+        """
+        if self.closed:
+            return
+        try:
+            buffer = self._buffer
+            with buffer.condition:
+                self._raise_error()
+                buffer.total_size = buffer.offset + len(buffer.data)
+                buffer.condition.notify_all()
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+                self._raise_error()
+            else:
+                while self.metadata is None:
+                    self._upload_chunk()
+        finally:
+            super().close()
+
+    def abort(self) -> None:
+        """
+        Close without completing the upload, leaving the file on Drive unchanged
+        """
+        with self._buffer.condition:
+            self._aborted = True
+            self._buffer.condition.notify_all()
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pydrivebrowser import metrics
+
+DEFAULT_POLL_INTERVAL = 5.0
+
+
+class MetadataCache:
+    """
+    Cache of folder listings and file metadata, kept up to date from the Drive changes feed
+
+    Instead of expiring entries after a fixed time, the changes feed is polled at most every poll_interval seconds
+    and only the listings and files affected by a change are dropped.
+    If a path is given, the cache (including the changes page token) is loaded from and saved to this json file,
+    so that a later run only needs to fetch the changes made in the meantime.
+    """
+    def __init__(self, path=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.page_token = None
+        self.last_poll = 0.0
+        self._listings = {}
+        self._files = {}
+        self.generation = 0  # number of changes applied, to tell whether something was changed since
+        self._changed = {}  # file and folder ids -> generation of the last change touching them
+        self._cleared = 0
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def _listing_key(folder_id: str, query=None) -> str:
+        return f'{folder_id}?q={query}' if query else folder_id
+
+    def get_listing(self, folder_id: str, fields=None, query=None) -> Optional[List[Dict]]:
+        """
+        :param folder_id: id of the folder
+        :param fields: metadata fields needed, all fields if None
+        :param query: additional query the files were filtered with, all files of the folder if None
+        :return: cached files of the folder, None if not cached or cached with fewer fields
+        """
+        with self._lock:
+            listing = self._listings.get(self._listing_key(folder_id, query))
+            if listing is None or (listing['fields'] is not None
+                                   and (fields is None or not set(fields) <= set(listing['fields']))):
+                metrics.count('metadata_cache.miss', kind='listing')
+                return None
+            metrics.count('metadata_cache.hit', kind='listing')
+            return listing['files']
+
+    def set_listing(self, folder_id: str, files: List[Dict], fields=None, query=None, generation=None) -> None:
+        """
+        :param folder_id: id of the folder
+        :param files: metadata of the files in the folder
+        :param fields: metadata fields the files were fetched with, all fields if None
+        :param query: additional query the files were filtered with, all files of the folder if None
+        :param generation: generation when fetching the files started, if given the listing is not stored when
+            a change touching the folder or its files was applied since
+        """
+        with self._lock:
+            if generation is not None and self.changed_since(generation, [folder_id, *(file['id'] for file in files)]):
+                return
+            self._listings[self._listing_key(folder_id, query)] = {
+                'folder_id': folder_id, 'fields': list(fields) if fields else None,
+                'files': [dict(file) for file in files]}
+
+    def get_file(self, file_id: str) -> Optional[Dict]:
+        with self._lock:
+            metadata = self._files.get(file_id)
+        metrics.count('metadata_cache.miss' if metadata is None else 'metadata_cache.hit', kind='file')
+        return metadata
+
+    def set_file(self, file_id: str, metadata: Dict) -> None:
+        with self._lock:
+            self._files[file_id] = dict(metadata)
+
+    def changed_since(self, generation: int, ids) -> bool:
+        """
+        :param generation: value of generation before the cached data was fetched
+        :param ids: ids of the files and folders the data depends on
+        :return: True if a change touching one of the ids (or clearing the cache) was applied since generation
+        """
+        with self._lock:
+            return self._cleared > generation or any(self._changed.get(id_, 0) > generation for id_ in ids)
+
+    def needs_poll(self) -> bool:
+        return time.monotonic() - self.last_poll >= self.poll_interval
+
+    def apply_change(self, file_id: str, metadata: Optional[Dict]) -> None:
+        """
+        Drop the cache entries affected by a change of a file
+
+        :param file_id: id of the changed file
+        :param metadata: new metadata of the file (with parents(id,isRoot)), None if it was deleted
+        """
+        with self._lock:
+            self._files.pop(file_id, None)
+            new_parents = [parent_id for parent in (metadata or {}).get('parents', [])
+                           for parent_id in (parent['id'], 'root' if parent.get('isRoot') else None) if parent_id]
+            self.generation += 1
+            for changed_id in (file_id, *new_parents):
+                self._changed[changed_id] = self.generation
+            for key, listing in list(self._listings.items()):
+                if listing.get('folder_id', key) in (file_id, *new_parents) \
+                        or any(file['id'] == file_id for file in listing['files']):
+                    self._changed[listing.get('folder_id', key)] = self.generation  # e.g. the former parent
+                    del self._listings[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._listings.clear()
+            self._files.clear()
+            self.page_token = None
+            self.generation += 1
+            self._changed.clear()
+            self._cleared = self.generation
+
+    def load(self) -> None:
+        with self._lock, open(self.path, 'r') as json_file:
+            data = json.load(json_file)
+            self.page_token = data['page_token']
+            self._listings = data['listings']
+            self._files = data['files']
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = {'page_token': self.page_token, 'listings': self._listings, 'files': self._files}
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w') as json_file:
+                json.dump(data, json_file)
+            os.replace(temp_path, self.path)
@@ -0,0 +1,190 @@
+import collections
+import contextlib
+import threading
+import time
+from typing import Dict, List
+
+DEFAULT_HISTOGRAM_SAMPLES = 1000
+
+_listeners: List['Listener'] = []
+_disabled_span = contextlib.nullcontext()
+
+
+class Listener:
+    """
+    Receives the measurements of pydrivebrowser, subclass it and override the methods of interest
+
+    Methods are called from the threads doing the work and must be thread-safe.
+    """
+    def on_span(self, name: str, duration: float, attributes: Dict) -> None:
+        """
+        :param name: name of the timed operation (e.g. 'http.request')
+        :param duration: seconds the operation took
+        :param attributes: details of the operation (e.g. method, status, bytes, error)
+        """
+
+    def on_count(self, name: str, value: int, attributes: Dict) -> None:
+        """
+        :param name: name of the counter (e.g. 'content_cache.hit')
+        :param value: increment
+        """
+
+    def on_value(self, name: str, value: float, attributes: Dict) -> None:
+        """
+        :param name: name of the measured quantity (e.g. 'reader.throughput')
+        :param value: measured value
+        """
+
+
+def add_listener(listener: Listener) -> Listener:
+    _listeners.append(listener)
+    return listener
+
+
+def remove_listener(listener: Listener) -> None:
+    _listeners.remove(listener)
+
+
+def enabled() -> bool:
+    return bool(_listeners)
+
+
+class _Span:
+    def __init__(self, name: str, attributes: Dict):
+        self.name = name
+        self.attributes = attributes
+        self._start = None
+
+    def __enter__(self) -> '_Span':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        for listener in _listeners:
+            listener.on_span(self.name, duration, self.attributes)
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+
+def span(name: str, **attributes):
+    """
+    Time a block, reporting its duration and attributes to the listeners when it exits
+
+    Attributes can be added while the block runs with the set() method of the returned span.
+    Without listeners, a shared no-op context manager is returned (test `enabled()` before computing
+    expensive attributes).
+    """
+    if not _listeners:
+        return _disabled_span
+    return _Span(name, attributes)
+
+
+def count(name: str, value=1, **attributes) -> None:
+    if _listeners:
+        for listener in _listeners:
+            listener.on_count(name, value, attributes)
+
+
+def record(name: str, value: float, **attributes) -> None:
+    if _listeners:
+        for listener in _listeners:
+            listener.on_value(name, value, attributes)
+
+
+class Histogram:
+    """
+    Count, sum, minimum and maximum of values, with percentiles over the most recent samples
+    """
+    def __init__(self, samples=DEFAULT_HISTOGRAM_SAMPLES):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._samples = collections.deque(maxlen=samples)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._samples.append(value)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        if not self._samples:
+            return 0.0
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def to_dict(self) -> Dict:
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max, 'mean': self.mean,
+                'p50': self.percentile(50), 'p95': self.percentile(95)}
+
+
+class MetricsCollector(Listener):
+    """
+    In-process listener aggregating durations and values in histograms and counts in counters
+
+    Span durations go to the histogram of their name, the bytes attribute of spans to the counter
+    '<name>.bytes' and failed spans to '<name>.errors'.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = collections.defaultdict(int)
+        self.histograms: Dict[str, Histogram] = collections.defaultdict(Histogram)
+
+    def on_span(self, name: str, duration: float, attributes: Dict) -> None:
+        with self._lock:
+            self.histograms[name].add(duration)
+            if 'bytes' in attributes:
+                self.counters[f'{name}.bytes'] += attributes['bytes']
+            if 'error' in attributes:
+                self.counters[f'{name}.errors'] += 1
+
+    def on_count(self, name: str, value: int, attributes: Dict) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def on_value(self, name: str, value: float, attributes: Dict) -> None:
+        with self._lock:
+            self.histograms[name].add(value)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        :return: {'counters': {name: value}, 'histograms': {name: {count, sum, min, max, mean, p50, p95}}}
+        """
+        with self._lock:
+            return {'counters': dict(self.counters),
+                    'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()}}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def summary(self) -> str:
+        """
+        :return: table of the counters and histograms
+        """
+        snapshot = self.snapshot()
+        lines = [f"{'histogram':<32}{'count':>8}{'mean':>12}{'p50':>12}{'p95':>12}{'max':>12}"]
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            lines.append(f"{name:<32}{histogram['count']:>8}{histogram['mean']:>12.4g}{histogram['p50']:>12.4g}"
+                         f"{histogram['p95']:>12.4g}{histogram['max']:>12.4g}")
+        lines.append(f"{'counter':<32}{'value':>8}")
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{name:<32}{value:>8}')
+        return '\n'.join(lines)
+
+    def __enter__(self) -> 'MetricsCollector':
+        return add_listener(self)
+
+    def __exit__(self, *args) -> None:
+        remove_listener(self)
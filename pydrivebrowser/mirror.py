@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from pydrive2.files import GoogleDriveFile
+
+from pydrivebrowser import metrics
+from pydrivebrowser.google_drive import GoogleDriveFileSystem, GoogleDriveBinaryFile
+from pydrivebrowser.io_stream import fetch_range, verify_md5
+from pydrivebrowser.scheduler import PRIORITY_BULK
+from pydrivebrowser.url_parser import find_folder_id_from_url
+
+DEFAULT_MIRROR_WORKERS = 4
+DEFAULT_MIRROR_CHUNK_SIZE = 8 * 1024 * 1024
+PARTIAL_SUFFIX = '.part'
+CHECKPOINT_SUFFIX = '.checkpoint'
+GOOGLE_APPS_MIME_TYPE_PREFIX = 'application/vnd.google-apps.'
+UNSAFE_NAME_CHARACTERS = {'/', '\\', '\0', os.sep, os.altsep} - {None}
+
+
+class MirrorResult:
+    def __init__(self):
+        self.downloaded: List[str] = []
+        self.skipped: List[str] = []
+        self.copied: List[str] = []
+        self.failed: Dict[str, Exception] = {}
+
+
+def _md5_prefix(path: str, size=None, chunksize=DEFAULT_MIRROR_CHUNK_SIZE):
+    """
+    :return: hashlib md5 of the first size bytes of a local file, of the whole file if None
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as local_file:
+        remaining = size
+        while remaining is None or remaining > 0:
+            chunk = local_file.read(chunksize if remaining is None else min(chunksize, remaining))
+            if not chunk:
+                break
+            md5.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return md5
+
+
+def file_md5(path: str, chunksize=DEFAULT_MIRROR_CHUNK_SIZE) -> str:
+    return _md5_prefix(path, chunksize=chunksize).hexdigest()
+
+
+def is_up_to_date(file: GoogleDriveFile, path: str) -> bool:
+    """
+    :return: True if the local file has the size and md5 checksum of the Drive file
+    """
+    if not os.path.isfile(path) or os.path.getsize(path) != int(file['fileSize']):
+        return False
+    return file_md5(path) == file['md5Checksum']
+
+
+class DownloadCheckpoint:
+    """
+    Progress of a download, saved next to its destination so that a later attempt can resume it
+    """
+    def __init__(self, path: str, file_id: str, md5_checksum: str, version: str, offset=0):
+        """
+        :param path: path of the checkpoint file
+        :param file_id: id of the downloaded file
+        :param md5_checksum: md5Checksum of the downloaded file
+        :param version: version of the downloaded file
+        :param offset: number of bytes written and synced to the partial file
+        """
+        self.path = path
+        self.file_id = file_id
+        self.md5_checksum = md5_checksum
+        self.version = version
+        self.offset = offset
+
+    @classmethod
+    def load(cls, path: str) -> Optional['DownloadCheckpoint']:
+        """
+        :return: checkpoint saved at path, None if there is none or it is unreadable
+        """
+        try:
+            with open(path, 'r') as json_file:
+                data = json.load(json_file)
+            return cls(path, data['id'], data['md5Checksum'], data['version'], int(data['offset']))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def matches(self, file: GoogleDriveFile) -> bool:
+        """
+        :return: True if the checkpoint was saved for the current content of the file (same md5Checksum)
+        """
+        return self.file_id == file['id'] and self.md5_checksum == file['md5Checksum']
+
+    def save(self) -> None:
+        data = {'id': self.file_id, 'md5Checksum': self.md5_checksum, 'version': self.version, 'offset': self.offset}
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as json_file:
+            json.dump(data, json_file)
+        os.replace(temp_path, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def download_file(file: GoogleDriveBinaryFile, path: str, http=None, chunksize=DEFAULT_MIRROR_CHUNK_SIZE) -> None:
+    """
+    Download a file atomically, resuming a download interrupted by a previous attempt
+
+    The file is downloaded to path + '.part' with range requests. After each chunk the offset written to disk
+    is saved to path + '.checkpoint' together with the id, md5Checksum and version of the file,
+    so that a later attempt continues from there unless the file changed in the meantime.
+    The content is hashed as it arrives (after the bytes kept from a previous attempt),
+    checked against md5Checksum and the file renamed to path.
+
+    :param file: file to download (with fileSize, md5Checksum and version metadata)
+    :param path: local destination
+    :param http: http object used for the requests, request.http if None
+    :param chunksize: number of bytes per range request
+    :raises: ChecksumError (IOError) if the downloaded file does not match md5Checksum
+    """
+    partial_path = path + PARTIAL_SUFFIX
+    checkpoint = DownloadCheckpoint.load(path + CHECKPOINT_SUFFIX)
+    if checkpoint is None or not checkpoint.matches(file) or not os.path.exists(partial_path):
+        checkpoint = DownloadCheckpoint(path + CHECKPOINT_SUFFIX, file['id'], file['md5Checksum'], file.get('version'))
+    # bytes after the checkpoint may not have been completely written
+    offset = min(checkpoint.offset, os.path.getsize(partial_path)) if checkpoint.offset else 0
+    md5 = _md5_prefix(partial_path, offset) if offset else hashlib.md5()
+    request = file.media_request()
+    size = int(file['fileSize'])
+    with open(partial_path, 'ab') as partial_file:
+        partial_file.truncate(offset)
+        while offset < size:
+            content, size = fetch_range(request, offset, offset + chunksize - 1, http)
+            if not content:
+                break
+            partial_file.write(content)
+            md5.update(content)
+            partial_file.flush()
+            os.fsync(partial_file.fileno())
+            offset += len(content)
+            checkpoint.offset = offset
+            checkpoint.save()
+    try:
+        verify_md5(md5, file['md5Checksum'])
+    except IOError:
+        os.remove(partial_path)  # corrupt bytes or file changed during the download, start over next time
+        checkpoint.remove()
+        raise
+    os.replace(partial_path, path)
+    checkpoint.remove()
+
+
+def copy_file(source: str, path: str) -> None:
+    """
+    Copy a local file atomically
+    """
+    shutil.copyfile(source, path + PARTIAL_SUFFIX)
+    os.replace(path + PARTIAL_SUFFIX, path)
+
+
+def _local_name(file: GoogleDriveFile, used_names: set) -> str:
+    """
+    :return: name of the local copy of a file, without path separators and unique among used_names
+    """
+    name = ''.join('_' if character in UNSAFE_NAME_CHARACTERS else character for character in file['title'])
+    if name in ('', '.', '..'):
+        name = file['id']
+    if name in used_names:  # Drive allows several files with the same title in a folder
+        stem, extension = os.path.splitext(name)
+        name = f"{stem} ({file['id']}){extension}"
+    used_names.add(name)
+    return name
+
+
+def _local_path(destination: str, folder_path: str, name: str) -> str:
+    """
+    :return: path of a name in a local folder
+    :raises: ValueError if the path is not below destination
+    """
+    path = os.path.join(folder_path, name)
+    root = os.path.abspath(destination)
+    if os.path.commonpath([root, os.path.abspath(path)]) != root or os.path.abspath(path) == root:
+        raise ValueError(f'{name!r} is outside of {destination}')
+    return path
+
+
+def mirror(file_system: GoogleDriveFileSystem, folder_id: str, destination: str, workers=DEFAULT_MIRROR_WORKERS,
+           max_depth=None) -> MirrorResult:
+    """
+    Copy a Drive folder tree to a local directory
+
+    Files whose local copy already has the same size and md5 checksum are skipped.
+    Files with the same md5 checksum as another file of the tree are downloaded once and copied locally.
+    Google Docs files (which have no binary content) are skipped as well.
+
+    :param file_system: GoogleDriveFileSystem
+    :param folder_id: id of the folder to copy
+    :param destination: local directory
+    :param workers: number of concurrent downloads
+    :param max_depth: depth up to which subfolders are copied, no limit if None
+    :return: MirrorResult with the downloaded, skipped, copied and failed local paths
+    """
+    result = MirrorResult()
+
+    def download(file: GoogleDriveBinaryFile, path: str):
+        try:
+            with file_system.scheduler.priority(PRIORITY_BULK):
+                download_file(file, path, file_system.http_pool)
+            result.downloaded.append(path)
+        except Exception as e:
+            result.failed[path] = e
+
+    paths = {folder_id: destination}
+    sources = {}  # local path with the content of each md5 checksum, downloaded or up to date
+    copies = []
+    with ThreadPoolExecutor(workers, thread_name_prefix='gdrive-mirror') as executor:
+        for folder, subfolders, files in file_system.walk(folder_id, max_depth=max_depth):
+            path = paths.pop(folder['id'])
+            os.makedirs(path, exist_ok=True)
+            used_names = set()
+            for subfolder in subfolders:
+                paths[subfolder['id']] = _local_path(destination, path, _local_name(subfolder, used_names))
+            for file in files:
+                file_path = _local_path(destination, path, _local_name(file, used_names))
+                if file['mimeType'].startswith(GOOGLE_APPS_MIME_TYPE_PREFIX):
+                    result.skipped.append(file_path)
+                elif is_up_to_date(file, file_path):
+                    result.skipped.append(file_path)
+                    sources.setdefault(file['md5Checksum'], file_path)
+                elif file['md5Checksum'] in sources:
+                    copies.append((file, file_path, sources[file['md5Checksum']]))
+                else:
+                    sources[file['md5Checksum']] = file_path
+                    executor.submit(download, file_system.CreateFile(dict(file)), file_path)
+    for file, path, source in copies:
+        if source in result.failed:
+            download(file_system.CreateFile(dict(file)), path)
+        else:
+            try:
+                copy_file(source, path)
+                result.copied.append(path)
+            except OSError as e:
+                result.failed[path] = e
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Copy a Google Drive folder to a local directory')
+    parser.add_argument('folder', help='folder URL or ID')
+    parser.add_argument('destination', help='local directory')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MIRROR_WORKERS, help='number of concurrent downloads')
+    parser.add_argument('--max-depth', type=int, default=None, help='depth up to which subfolders are copied')
+    parser.add_argument('--metrics', action='store_true', help='print request and download metrics at the end')
+    parser.add_argument('--token-cache', default=None,
+                        help='json file keeping the credentials between runs, avoids authenticating every time')
+    args = parser.parse_args(argv)
+
+    folder_id = find_folder_id_from_url(args.folder) or args.folder
+    collector = metrics.add_listener(metrics.MetricsCollector()) if args.metrics else None
+    try:
+        result = mirror(GoogleDriveFileSystem(token_cache=args.token_cache), folder_id, args.destination, args.workers,
+                        args.max_depth)
+    finally:
+        if collector:
+            metrics.remove_listener(collector)
+            print(collector.summary(), file=sys.stderr)
+    print(f'{len(result.downloaded)} downloaded, {len(result.copied)} copied, {len(result.skipped)} up to date, '
+          f'{len(result.failed)} failed')
+    for path, error in result.failed.items():
+        print(f'failed: {path}: {error}', file=sys.stderr)
+    return 1 if result.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import collections
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from pydrivebrowser.scheduler import RequestScheduler, PRIORITY_PREFETCH
+
+DEFAULT_PREFETCH_WORKERS = 1
+DEFAULT_PREFETCH_ENTRIES = 32
+
+
+class Prefetcher:
+    """
+    Loads the values of likely-next keys in background threads into a bounded LRU cache
+
+    Each call to prefetch() replaces the wanted keys: loads not started yet for keys no longer wanted are cancelled.
+    Loads send their requests with the lowest priority of the scheduler, behind the foreground requests.
+    The priority only matters while the rate limit holds requests back, so the number of workers also caps
+    the connections of the http pool taken by prefetching (a load sends its requests one at a time):
+    keep it well below the size of the pool, one by default.
+    """
+    def __init__(self, load: Callable[[str], Any], scheduler: RequestScheduler = None,
+                 workers=DEFAULT_PREFETCH_WORKERS, max_entries=DEFAULT_PREFETCH_ENTRIES):
+        """
+        :param load: loads the value of a key
+        :param scheduler: scheduler of the requests sent by load, whose priority is lowered in the prefetch threads
+        :param workers: number of concurrent loads, and so of pool connections used by prefetching
+        :param max_entries: maximum number of loaded values kept
+        """
+        self._load = load
+        self.scheduler = scheduler
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='prefetch')
+        self._futures: Dict[str, Future] = {}
+        self._values = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, keys: Iterable[str]) -> None:
+        """
+        Load the given keys in the background, most wanted first
+
+        :param keys: keys to load, keys already loaded or being loaded are skipped
+        """
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for key, future in list(self._futures.items()):
+                if key not in keys and future.cancel():
+                    del self._futures[key]
+            for key in keys:
+                if key in self._values:
+                    self._values.move_to_end(key)
+                elif key not in self._futures:
+                    self._futures[key] = self._executor.submit(self._run, key)
+
+    def _run(self, key: str) -> None:
+        try:
+            if self.scheduler is None:
+                value = self._load(key)
+            else:
+                with self.scheduler.priority(PRIORITY_PREFETCH):
+                    value = self._load(key)
+        except Exception:
+            value = None  # the foreground load reports the error
+        with self._lock:
+            del self._futures[key]
+            if value is None:
+                return
+            self._values[key] = value
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+
+    def take(self, key: str, is_current: Callable[[Any], bool] = None) -> Optional[Any]:
+        """
+        Remove and return the value of a key, waiting for its load if it is running
+
+        :param key: key of the value
+        :param is_current: values for which it returns False are outdated and dropped, all are kept if None
+        :return: value, None if it was neither loaded nor being loaded (a pending load is cancelled) or is outdated
+        """
+        with self._lock:
+            value = self._values.pop(key, None)
+            future = self._futures.get(key) if value is None else None
+            if future is not None and future.cancel():
+                del self._futures[key]
+                future = None
+        if future is not None:
+            future.exception()  # wait for the running load
+            with self._lock:
+                value = self._values.pop(key, None)
+        if value is not None and is_current is not None and not is_current(value):
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def close(self) -> None:
+        """
+        Cancel the pending loads, without waiting for the running ones
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
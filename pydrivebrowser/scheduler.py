@@ -0,0 +1,191 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Tuple
+
+from pydrivebrowser import metrics
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+PRIORITY_PREFETCH = 3
+
+DEFAULT_REQUESTS_PER_SECOND = 200.0  # Drive API default quota: 12000 queries per minute
+DEFAULT_BURST = 100
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 64.0
+
+RATE_LIMIT_REASONS = ('userRateLimitExceeded', 'rateLimitExceeded')
+
+
+def is_rate_limited(status: int, content) -> bool:
+    return status == 429 or (status == 403 and any(reason in str(content) for reason in RATE_LIMIT_REASONS))
+
+
+def is_retryable_response(status: int, content) -> bool:
+    """
+    :return: True if the request failed because of rate limiting or a server error
+    """
+    return is_rate_limited(status, content) or status >= 500
+
+
+class RequestScheduler:
+    """
+    Rate limiter shared by all the requests to the API
+
+    Requests take a token from a bucket refilled at the rate of the quota, in the order of their priority
+    (lower values first). Throttled requests and server errors are retried after an exponential backoff
+    with full jitter, and throttling also holds back all the other requests for that time.
+    """
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        """
+        :param rate: requests per second, unlimited if None
+        :param burst: number of requests which can be sent at once after an idle period
+        :param max_retries: number of times a throttled or failed request is sent again
+        :param base_delay: maximum delay in seconds before the first retry, doubled for each retry
+        :param max_delay: maximum delay in seconds before any retry
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    @contextmanager
+    def priority(self, priority: int) -> Iterator[None]:
+        """
+        Send the requests of the current thread with another priority within the block
+        """
+        previous = self.current_priority
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    @property
+    def current_priority(self) -> int:
+        return getattr(self._local, 'priority', PRIORITY_NORMAL)
+
+    def _wait_time(self, now: float) -> float:
+        if self._resume_at > now:
+            return self._resume_at - now
+        if self.rate is None:
+            return 0.0
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def acquire(self, priority=None) -> None:
+        """
+        Wait until a request can be sent
+
+        :param priority: priority of the request, the priority of the current thread if None
+        """
+        entry = (self.current_priority if priority is None else priority, next(self._counter))
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    wait_time = self._wait_time(time.monotonic())
+                    if self._waiting[0] != entry:
+                        self._condition.wait()
+                    elif wait_time > 0:
+                        self._condition.wait(wait_time)
+                    else:
+                        break
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+            if self.rate is not None:
+                self._tokens -= 1
+
+    def try_acquire(self, priority=None) -> float:
+        """
+        Take a token if a request can be sent now, without blocking (e.g. from an event loop)
+
+        :param priority: priority of the request, the priority of the current thread if None
+        :return: 0 if the request can be sent, otherwise the delay in seconds before trying again
+        """
+        priority = self.current_priority if priority is None else priority
+        with self._condition:
+            wait_time = self._wait_time(time.monotonic())
+            if self.rate is None:
+                return wait_time
+            if not wait_time and self._waiting and self._waiting[0][0] <= priority:
+                wait_time = 1 / self.rate  # a blocked request with at least the same priority goes first
+            if not wait_time:
+                self._tokens -= 1
+            return wait_time
+
+    def backoff(self, attempt: int) -> float:
+        """
+        :return: random delay in seconds before the given retry (starting at 0)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, send: Callable[[], Tuple], priority=None) -> Tuple:
+        """
+        Send a request when the rate limit allows it, retrying it on throttling and server errors
+
+        :param send: sends the request and returns the httplib2 response and content
+        :param priority: priority of the request, the priority of the current thread if None
+        :return: response and content of the last attempt
+        """
+        for attempt in itertools.count():
+            with metrics.span('scheduler.wait'):
+                self.acquire(priority)
+            response, content = send()
+            if attempt >= self.max_retries or not is_retryable_response(response.status, content):
+                return response, content
+            time.sleep(self.retry_delay(attempt, response.status, content, response.get('retry-after', '')))
+
+    def retry_delay(self, attempt: int, status: int, content, retry_after='') -> float:
+        """
+        Record a throttled or failed attempt, holding back all requests if it was throttled
+
+        :param attempt: number of the attempt (starting at 0)
+        :param status: http status of the response
+        :param content: body of the response
+        :param retry_after: Retry-After header of the response
+        :return: delay in seconds before the retry
+        """
+        delay = self.backoff(attempt)
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        rate_limited = is_rate_limited(status, content)
+        metrics.count('scheduler.retries', status=status, rate_limited=rate_limited)
+        with self._condition:
+            self.retries += 1
+            if rate_limited:
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return delay
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def default_scheduler() -> RequestScheduler:
+    """
+    :return: scheduler shared by all file systems of the process, as they share the same quota
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
@@ -0,0 +1,288 @@
+import argparse
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Set
+
+from pydrivebrowser.google_drive import GoogleDriveFileSystem, is_folder, DEFAULT_WALK_WORKERS
+from pydrivebrowser.url_parser import find_folder_id_from_url
+
+DEFAULT_SEARCH_LIMIT = 20
+MIN_SEARCH_CANDIDATES = 200
+INDEX_FIELDS = ('id', 'parentId', 'title', 'path', 'mimeType', 'fileSize', 'modifiedDate')
+CHANGE_FILE_FIELDS = 'id,title,mimeType,fileSize,modifiedDate,parents(id,isRoot),labels(trashed)'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (id TEXT PRIMARY KEY, parentId TEXT, title TEXT NOT NULL, path TEXT NOT NULL,
+                                  mimeType TEXT, fileSize TEXT, modifiedDate TEXT);
+CREATE INDEX IF NOT EXISTS files_parent ON files (parentId);
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5 (title, path, content='files', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN
+    INSERT INTO names (rowid, title, path) VALUES (new.rowid, new.title, new.path);
+END;
+CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN
+    INSERT INTO names (names, rowid, title, path) VALUES ('delete', old.rowid, old.title, old.path);
+END;
+CREATE TRIGGER IF NOT EXISTS files_update AFTER UPDATE OF title, path ON files BEGIN
+    INSERT INTO names (names, rowid, title, path) VALUES ('delete', old.rowid, old.title, old.path);
+    INSERT INTO names (rowid, title, path) VALUES (new.rowid, new.title, new.path);
+END;
+'''
+INSERT = f"INSERT INTO files ({', '.join(INDEX_FIELDS)}) VALUES ({', '.join('?' * len(INDEX_FIELDS))})"
+UPSERT = f"{INSERT} ON CONFLICT (id) DO UPDATE SET " \
+    + ', '.join(f'{field} = excluded.{field}' for field in INDEX_FIELDS[1:])
+
+
+def fts_phrase(text: str) -> str:
+    """
+    :return: FTS5 phrase matching the text, with the trigram tokenizer as a substring
+    """
+    return '"{}"'.format(text.replace('"', '""'))
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def match_score(text: str, file: Dict) -> float:
+    """
+    :param text: lower case search text
+    :return: how well a file matches, titles containing the text first, then paths containing it,
+             then titles by the share of trigrams they have in common with the text
+    """
+    title = file['title'].lower()
+    if text in title:
+        return 2.0 + len(text) / len(title)
+    if text in file['path'].lower():
+        return 1.0 + len(text) / len(file['path'])
+    text_trigrams, title_trigrams = trigrams(text), trigrams(title)
+    return len(text_trigrams & title_trigrams) / len(text_trigrams | title_trigrams) if text_trigrams else 0.0
+
+
+class SearchIndex:
+    """
+    On-disk index of the names, paths and basic metadata of the files below a root folder, for fuzzy lookup
+
+    The index is built once by crawling the folder tree, then kept current by applying the Drive changes feed from
+    the page token stored with it. Titles and paths are indexed by an SQLite FTS5 trigram table (SQLite 3.34 or later),
+    so that a lookup takes milliseconds without any request.
+    A file reachable through several parents is indexed under the first one.
+    """
+    def __init__(self, path=':memory:', root_id='root'):
+        """
+        :param path: SQLite database file, created if it does not exist
+        :param root_id: id of the indexed folder, an index of another folder stored in path is discarded
+        """
+        self.path = path
+        self.root_id = root_id
+        self._connection = sqlite3.connect(path)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+            if self._get_meta('root_id') != root_id:
+                self._clear()
+                self._set_meta('root_id', root_id)
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row['value']
+
+    def _set_meta(self, key: str, value: Optional[str]) -> None:
+        self._connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _clear(self) -> None:
+        self._connection.execute('DELETE FROM files')
+        self._set_meta('page_token', None)
+
+    @property
+    def page_token(self) -> Optional[str]:
+        """
+        Token of the changes not applied yet, None if the index was not built
+        """
+        return self._get_meta('page_token')
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT count(*) FROM files').fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> 'SearchIndex':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def update(self, file_system: GoogleDriveFileSystem) -> int:
+        """
+        Build the index if it was not built yet, otherwise apply the changes made since the last update
+
+        :return: number of changes applied (files indexed when building)
+        """
+        if self.page_token is None:
+            self.build(file_system)
+            return len(self)
+        changes, page_token = file_system.list_changes(self.page_token, CHANGE_FILE_FIELDS)
+        with self._connection:
+            for change in changes:
+                self._apply_change(file_system, change)
+            self._set_meta('page_token', page_token)
+        return len(changes)
+
+    def build(self, file_system: GoogleDriveFileSystem, workers=DEFAULT_WALK_WORKERS) -> None:
+        """
+        Index all files below the root folder, replacing the current index
+        """
+        page_token = file_system.start_page_token()  # changes made during the crawl are applied by the next update
+        with self._connection:
+            self._clear()
+            self._crawl(file_system, self.root_id, '', workers)
+            self._set_meta('page_token', page_token)
+
+    def _crawl(self, file_system: GoogleDriveFileSystem, folder_id: str, folder_path: str,
+               workers=DEFAULT_WALK_WORKERS) -> None:
+        paths = {folder_id: folder_path}
+        for folder, subfolders, files in file_system.walk(folder_id, workers=workers):
+            rows = []
+            for file in subfolders + files:
+                path = f'{paths[folder["id"]]}/{file["title"]}'.lstrip('/')
+                if is_folder(file):
+                    paths.setdefault(file['id'], path)
+                rows.append(self._row(file, folder['id'], path))
+            self._connection.executemany(f'{INSERT} ON CONFLICT (id) DO NOTHING', rows)
+
+    @staticmethod
+    def _row(file: Dict, parent_id: str, path: str) -> tuple:
+        return file['id'], parent_id, file['title'], path, file.get('mimeType'), file.get('fileSize'), \
+            file.get('modifiedDate')
+
+    def _indexed_parent(self, file: Dict) -> Optional[str]:
+        """
+        :return: id of the first parent of a file that is the root or an indexed folder, None if there is none
+        """
+        for parent in file.get('parents', []):
+            if parent['id'] == self.root_id or (self.root_id == 'root' and parent.get('isRoot')):
+                return self.root_id
+            row = self._connection.execute('SELECT mimeType FROM files WHERE id = ?', (parent['id'],)).fetchone()
+            if row is not None and is_folder(row):
+                return parent['id']
+        return None
+
+    def _path(self, file_id: str) -> str:
+        if file_id == self.root_id:
+            return ''
+        return self._connection.execute('SELECT path FROM files WHERE id = ?', (file_id,)).fetchone()['path']
+
+    def _apply_change(self, file_system: GoogleDriveFileSystem, change: Dict) -> None:
+        if change['fileId'] == self.root_id:
+            return  # paths are relative to the root folder
+        file = None if change.get('deleted') else change.get('file')
+        parent_id = None
+        if file is not None and not file.get('labels', {}).get('trashed'):
+            parent_id = self._indexed_parent(file)
+        if parent_id is None:  # deleted, trashed or moved out of the root folder
+            self._remove(change['fileId'])
+            return
+        path = f'{self._path(parent_id)}/{file["title"]}'.lstrip('/')
+        previous = self._connection.execute('SELECT path FROM files WHERE id = ?', (file['id'],)).fetchone()
+        self._connection.execute(UPSERT, self._row(file, parent_id, path))
+        if is_folder(file):
+            if previous is None:  # moved in from outside: the changes feed does not report its content
+                self._crawl(file_system, file['id'], path)
+            elif previous['path'] != path:
+                self._move(file['id'], path)
+
+    def _subtree(self, folder_id: str) -> List[sqlite3.Row]:
+        """
+        :return: id, title and parentId of the files below a folder, parents before their children
+        """
+        return self._connection.execute('''
+            WITH RECURSIVE subtree (id, title, parentId, depth) AS (
+                SELECT id, title, parentId, 0 FROM files WHERE parentId = ?
+                UNION ALL
+                SELECT files.id, files.title, files.parentId, depth + 1 FROM files JOIN subtree
+                ON files.parentId = subtree.id)
+            SELECT id, title, parentId FROM subtree ORDER BY depth''', (folder_id,)).fetchall()
+
+    def _move(self, folder_id: str, path: str) -> None:
+        paths = {folder_id: path}
+        for row in self._subtree(folder_id):
+            paths[row['id']] = f'{paths[row["parentId"]]}/{row["title"]}'
+        del paths[folder_id]
+        self._connection.executemany('UPDATE files SET path = ? WHERE id = ?',
+                                     [(file_path, file_id) for file_id, file_path in paths.items()])
+
+    def _remove(self, file_id: str) -> None:
+        file_ids = [file_id] + [row['id'] for row in self._subtree(file_id)]
+        self._connection.executemany('DELETE FROM files WHERE id = ?', [(file_id,) for file_id in file_ids])
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """
+        :return: indexed metadata of a file (id, parentId, title, path, mimeType, fileSize, modifiedDate),
+                 None if it is not indexed
+        """
+        row = self._connection.execute('SELECT * FROM files WHERE id = ?', (file_id,)).fetchone()
+        return None if row is None else self._metadata(row)
+
+    @staticmethod
+    def _metadata(row: sqlite3.Row) -> Dict:
+        return {key: row[key] for key in row.keys() if row[key] is not None}
+
+    def search(self, text: str, limit=DEFAULT_SEARCH_LIMIT) -> List[Dict]:
+        """
+        Fuzzy lookup of files by title or path
+
+        Titles containing the text are looked up first. Only if there are fewer than limit of them, files sharing
+        trigrams with the text (e.g. misspelt) are looked up too, which needs the slower bm25 ranking of SQLite.
+        The candidates are then ordered by match_score().
+
+        :param text: searched text, case insensitive
+        :param limit: maximum number of results
+        :return: metadata of the best matching files, best first
+        """
+        text = ' '.join(text.lower().split())
+        if not text:
+            return []
+        candidates = max(MIN_SEARCH_CANDIDATES, 10 * limit)
+        if len(text) < 3:  # shorter than a trigram
+            pattern = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            rows = self._connection.execute("SELECT * FROM files WHERE title LIKE ? ESCAPE '\\' LIMIT ?",
+                                            (f'%{pattern}%', candidates)).fetchall()
+        else:
+            rows = self._match(f'title : {fts_phrase(text)}', candidates)
+            if len(rows) < limit:
+                rows += self._match(' OR '.join(map(fts_phrase, sorted(trigrams(text)))), candidates, ranked=True)
+        files = list({row['id']: self._metadata(row) for row in rows}.values())
+        files.sort(key=lambda file: match_score(text, file), reverse=True)
+        return files[:limit]
+
+    def _match(self, query: str, limit: int, ranked=False) -> List[sqlite3.Row]:
+        """
+        :param query: FTS5 query
+        :param ranked: return the best matches by bm25 (titles weighted over paths), otherwise the first found
+        """
+        order = 'ORDER BY bm25(names, 10.0, 1.0)' if ranked else ''
+        return self._connection.execute(f'SELECT files.* FROM names JOIN files ON files.rowid = names.rowid '
+                                        f'WHERE names MATCH ? {order} LIMIT ?', (query, limit)).fetchall()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Search the files of a Google Drive folder by name')
+    parser.add_argument('text', nargs='?', help='searched text, only update the index if omitted')
+    parser.add_argument('--index', default='pydrivebrowser-index.sqlite', help='index file')
+    parser.add_argument('--folder', default='root', help='URL or ID of the indexed folder')
+    parser.add_argument('--limit', type=int, default=DEFAULT_SEARCH_LIMIT, help='maximum number of results')
+    parser.add_argument('--token-cache', default=None,
+                        help='json file keeping the credentials between runs, avoids authenticating every time')
+    args = parser.parse_args(argv)
+
+    with SearchIndex(args.index, find_folder_id_from_url(args.folder) or args.folder) as index:
+        index.update(GoogleDriveFileSystem(token_cache=args.token_cache))
+        if args.text:
+            for file in index.search(args.text, args.limit):
+                print(f'{file["id"]}  {file["path"]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
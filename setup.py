@@ -19,4 +19,8 @@ setup(name='PyDriveBrowser',
       license='Anti-996',
       packages=['pydrivebrowser'],
       install_requires=['pydrive2==1.20.0', 'pick==2.4.0', 'oauth2client==4.1.3'],
+      extras_require={'async': ['aiohttp'], 'fsspec': ['fsspec']},
+      entry_points={'console_scripts': ['pydrivebrowser-mirror=pydrivebrowser.mirror:main',
+                                        'pydrivebrowser-search=pydrivebrowser.search_index:main'],
+                    'fsspec.specs': ['pydrivebrowser=pydrivebrowser.fsspec_drive:FsspecGoogleDriveFileSystem']},
       zip_safe=False)
@@ -0,0 +1,421 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from email.message import Message
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import HttpRequest
+from pydrive2.auth import GoogleAuth
+
+from pydrivebrowser.google_drive import GoogleDriveFileSystem
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+range_regex = re.compile(r'bytes=(\d+)-(\d*)')
+content_range_regex = re.compile(r'bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)')
+file_path_regex = re.compile(r'/files/([0-9A-Za-z_-]+)$')
+query_token_regex = re.compile(r"\s*(\(|\)|'(?:[^'\\]|\\.)*'|!=|=|[A-Za-z]+)")
+
+
+class FakeCredentials:
+    access_token_expired = False
+    invalid = False
+    access_token = 'fake-token'
+
+    def authorize(self, http):
+        return http
+
+
+def _query_tokens(q: str):
+    tokens = []
+    position = 0
+    while position < len(q.rstrip()):
+        match = query_token_regex.match(q, position)
+        if not match:
+            raise ValueError(f'Invalid query {q}')
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+def _unquote(token: str) -> str:
+    return re.sub(r'\\(.)', r'\1', token[1:-1])
+
+
+def match_query(q: str, file: dict) -> bool:
+    """
+    Evaluate the subset of the Drive search syntax used by pydrivebrowser on file metadata
+    """
+    tokens = _query_tokens(q)
+
+    def parse_or():
+        result = parse_and()
+        while tokens and tokens[0] == 'or':
+            tokens.pop(0)
+            result = parse_and() or result
+        return result
+
+    def parse_and():
+        result = parse_not()
+        while tokens and tokens[0] == 'and':
+            tokens.pop(0)
+            result = parse_not() and result
+        return result
+
+    def parse_not():
+        if tokens[0] == 'not':
+            tokens.pop(0)
+            return not parse_not()
+        if tokens[0] == '(':
+            tokens.pop(0)
+            result = parse_or()
+            tokens.pop(0)
+            return result
+        return parse_clause()
+
+    def parse_clause():
+        first, operator, value = tokens.pop(0), tokens.pop(0), tokens.pop(0)
+        if operator == 'in':  # 'id' in parents, 'root' being an alias of the root folder
+            return any(_unquote(first) in (parent['id'], 'root' if parent.get('isRoot') else None)
+                       for parent in file.get('parents', []))
+        actual = file.get(first)
+        if value in ('true', 'false'):
+            expected = value == 'true'
+        else:
+            expected = _unquote(value)
+        if operator == '=':
+            return actual == expected
+        if operator == '!=':
+            return actual != expected
+        if operator == 'contains':
+            return expected in actual
+        raise ValueError(f'Unsupported operator {operator}')
+
+    return parse_or()
+
+
+def _split_fields(fields: str):
+    """
+    :return: (field, sub_fields) of a fields projection, sub_fields may contain nested projections
+    """
+    depth, start = 0, 0
+    for index, char in enumerate(fields + ','):
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        if char == ',' and depth == 0:
+            field, _, sub_fields = fields[start:index].strip().partition('(')
+            if field:
+                yield field, sub_fields[:-1]
+            start = index + 1
+
+
+def project(resource: dict, fields: str) -> dict:
+    """
+    Apply a fields projection like 'nextPageToken,items(id,title,parents(id))' to a response
+    """
+    if not fields or fields == '*':
+        return resource
+    result = {}
+    for field, sub_fields in _split_fields(fields):
+        if field not in resource:
+            continue
+        value = resource[field]
+        if sub_fields and isinstance(value, list):
+            value = [project(item, sub_fields) for item in value]
+        elif sub_fields:
+            value = project(value, sub_fields)
+        result[field] = value
+    return result
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connection_count += 1
+            self.server.open_connections += 1
+            self.server.peak_connections = max(self.server.peak_connections, self.server.open_connections)
+
+    def finish(self):
+        super().finish()
+        with self.server.lock:
+            self.server.open_connections -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._send(*self.server.handle('GET', self.path, self.headers))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/batch/'):
+            self._send(*self.server.handle_batch(self.headers['Content-Type'], body))
+        else:
+            self._send(*self.server.handle('POST', self.path, self.headers, body))
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._send(*self.server.handle('PUT', self.path, self.headers, body))
+
+    def _send(self, status: int, body: bytes, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def json_response(resource: dict, status=200):
+    return status, json.dumps(resource).encode(), {'Content-Type': 'application/json'}
+
+
+def error_response(status: int, reason: str):
+    return json_response({'error': {'code': status, 'message': reason, 'errors': [{'reason': reason}]}}, status)
+
+
+class FakeDriveServer(ThreadingHTTPServer):
+    """
+    Minimal local stand-in for the Google Drive v2 API
+
+    Supports files.list (with q, paging and fields), files.get, media downloads with Range,
+    resumable uploads (files.insert and files.update), the changes feed and batch requests.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, bandwidth=None, root_id='root'):
+        """
+        :param latency: seconds each request is delayed
+        :param bandwidth: bytes per second at which media is sent, unlimited if None
+        :param root_id: id of the root folder, which 'root' is an alias of (like the real id on Drive)
+        """
+        super().__init__(('127.0.0.1', 0), FakeDriveHandler)
+        self.files = {}
+        self.contents = {}
+        self.changes = []
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.root_id = root_id
+        self.request_count = 0
+        self.connection_count = 0
+        self.open_connections = 0
+        self.peak_connections = 0
+        self.lock = threading.Lock()
+        self.requests = []
+        self.range_requests = []
+        self.batch_sizes = []
+        self.failures = {}
+        self.upload_sessions = {}
+        self.upload_chunks = []
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}/drive/v2/'
+
+    def _parents(self, parents) -> list:
+        return [{'id': self.root_id if parent == 'root' else parent, 'isRoot': parent in ('root', self.root_id)}
+                for parent in parents]
+
+    def add_file(self, file_id: str, title=None, parents=('root',), content=b'', mime_type='application/octet-stream'):
+        self.contents[file_id] = content
+        self.files[file_id] = {'kind': 'drive#file', 'id': file_id, 'title': title or file_id, 'mimeType': mime_type,
+                               'parents': self._parents(parents),
+                               'labels': {'trashed': False}, 'trashed': False, 'version': '1'}
+        if not mime_type.startswith('application/vnd.google-apps.'):  # no content for folders and Google Docs
+            self.files[file_id]['fileSize'] = str(len(content))
+            self.files[file_id]['md5Checksum'] = hashlib.md5(content).hexdigest()
+        self._record_change(file_id)
+
+    def add_folder(self, folder_id: str, title=None, parents=('root',)):
+        self.add_file(folder_id, title, parents, mime_type=FOLDER_MIME_TYPE)
+
+    def update_file(self, file_id: str, content=None, **metadata):
+        if content is not None:
+            self.contents[file_id] = content
+            metadata.update(fileSize=str(len(content)), md5Checksum=hashlib.md5(content).hexdigest())
+        if 'parents' in metadata:
+            metadata['parents'] = self._parents(metadata['parents'])
+        self.files[file_id].update(metadata)
+        self.files[file_id]['version'] = str(int(self.files[file_id]['version']) + 1)
+        self._record_change(file_id)
+
+    def delete_file(self, file_id: str):
+        del self.files[file_id]
+        self._record_change(file_id)
+
+    def _record_change(self, file_id: str):
+        change = {'kind': 'drive#change', 'id': str(len(self.changes) + 1), 'fileId': file_id,
+                  'deleted': file_id not in self.files}
+        if file_id in self.files:
+            change['file'] = dict(self.files[file_id])
+        self.changes.append(change)
+
+    def inject_failures(self, path_part: str, count=1, status=500, reason='backendError'):
+        """
+        Make the next count requests whose path contains path_part fail
+        """
+        self.failures[path_part] = [count, status, reason]
+
+    def handle(self, method: str, path_and_query: str, headers, body=b''):
+        """
+        :return: status, body and headers of the response to a request
+        """
+        self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        path, _, query = path_and_query.partition('?')
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        self.requests.append((path, params))
+        for path_part, failure in self.failures.items():
+            if path_part in path and failure[0] > 0:
+                failure[0] -= 1
+                return error_response(failure[1], failure[2])
+        file_match = file_path_regex.search(path)
+        if path.startswith('/upload/'):
+            return self.handle_upload(path, params, headers, body)
+        if path.endswith('/files'):
+            return json_response(self.list_files(params))
+        elif path.endswith('/changes/startPageToken'):
+            return json_response({'startPageToken': str(len(self.changes) + 1)})
+        elif path.endswith('/changes'):
+            return json_response(self.list_changes(params))
+        elif file_match and (self.root_id if file_match.group(1) == 'root' else file_match.group(1)) in self.files:
+            file_id = self.root_id if file_match.group(1) == 'root' else file_match.group(1)
+            if params.get('alt') == 'media':
+                return self.media_response(self.contents.get(file_id, b''), headers.get('range', ''))
+            return json_response(project(self.files[file_id], params.get('fields')))
+        return error_response(404, 'notFound')
+
+    def handle_batch(self, content_type: str, body: bytes):
+        """
+        Answer a multipart/mixed batch request by handling each part like a separate request
+        """
+        message = BytesParser().parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+        boundary = 'batch_response_boundary'
+        parts = []
+        self.batch_sizes.append(len(message.get_payload()))
+        for part in message.get_payload():
+            request_line, _, request_headers = part.get_payload().partition('\n')
+            method, path, _ = request_line.split(' ')
+            status, content, headers = self.handle(method, path, Message())
+            headers = ''.join(f'{key}: {value}\r\n' for key, value in headers.items())
+            parts.append(f'--{boundary}\r\nContent-Type: application/http\r\n'
+                         f'Content-ID: <response-{part["Content-ID"][1:-1]}>\r\n\r\n'
+                         f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n{headers}\r\n{content.decode()}\r\n')
+        response = ''.join(parts) + f'--{boundary}--\r\n'
+        return 200, response.encode(), {'Content-Type': f'multipart/mixed; boundary={boundary}'}
+
+    def handle_upload(self, path: str, params: dict, headers, body: bytes):
+        """
+        Start a resumable upload session, or receive a chunk of one
+        """
+        if 'upload_id' not in params:
+            file_match = file_path_regex.search(path)
+            upload_id = str(len(self.upload_sessions) + 1)
+            self.upload_sessions[upload_id] = {'file_id': file_match and file_match.group(1), 'content': bytearray(),
+                                               'metadata': json.loads(body) if body else {},
+                                               'mime_type': headers.get('X-Upload-Content-Type')}
+            location = f'http://127.0.0.1:{self.server_port}{path}?uploadType=resumable&upload_id={upload_id}'
+            return 200, b'', {'Location': location}
+        session = self.upload_sessions[params['upload_id']]
+        content = session['content']
+        range_match = content_range_regex.match(headers.get('Content-Range', ''))
+        total = len(content) + len(body)  # no Content-Range: empty file
+        if range_match:
+            total = None if range_match.group(3) == '*' else int(range_match.group(3))
+            if range_match.group(1) is not None and int(range_match.group(1)) <= len(content):
+                start = int(range_match.group(1))
+                self.upload_chunks.append((start, int(range_match.group(2))))
+                content[start:] = body
+        if total is not None and len(content) == total:
+            return json_response(self._finish_upload(session))
+        return 308, b'', {'Range': f'bytes=0-{len(content) - 1}'} if content else {}
+
+    def _finish_upload(self, session: dict) -> dict:
+        file_id = session['file_id']
+        if file_id:
+            self.update_file(file_id, content=bytes(session['content']))
+        else:
+            metadata = session['metadata']
+            file_id = f'uploaded_{len(self.files)}'
+            self.add_file(file_id, metadata.get('title'), [parent['id'] for parent in metadata.get('parents', [])]
+                          or ['root'], bytes(session['content']),
+                          metadata.get('mimeType') or session['mime_type'] or 'application/octet-stream')
+        return self.files[file_id]
+
+    def media_response(self, content: bytes, range_header: str):
+        range_match = range_regex.match(range_header)
+        if not range_match:
+            if self.bandwidth:
+                time.sleep(len(content) / self.bandwidth)
+            return 200, content, {}
+        start = int(range_match.group(1))
+        end = int(range_match.group(2)) if range_match.group(2) else len(content) - 1
+        if start >= len(content):
+            return 416, b'', {'Content-Range': f'bytes */{len(content)}'}
+        end = min(end, len(content) - 1)
+        self.range_requests.append((start, end))
+        if self.bandwidth:
+            time.sleep((end + 1 - start) / self.bandwidth)
+        return 206, content[start:end + 1], {'Content-Range': f'bytes {start}-{end}/{len(content)}'}
+
+    def list_files(self, params: dict) -> dict:
+        files = [file for file in self.files.values() if not params.get('q') or match_query(params['q'], file)]
+        start = int(params.get('pageToken', 0))
+        end = start + int(params.get('maxResults', 100))
+        response = {'kind': 'drive#fileList', 'items': files[start:end]}
+        if end < len(files):
+            response['nextPageToken'] = str(end)
+        return project(response, params.get('fields'))
+
+    def list_changes(self, params: dict) -> dict:
+        start = int(params['pageToken']) - 1
+        end = start + int(params.get('maxResults', 100))
+        response = {'kind': 'drive#changeList', 'items': self.changes[start:end]}
+        if end < len(self.changes):
+            response['nextPageToken'] = str(end + 1)
+        else:
+            response['newStartPageToken'] = str(len(self.changes) + 1)
+        return project(response, params.get('fields'))
+
+    def media_request(self, file_id: str) -> HttpRequest:
+        return HttpRequest(httplib2.Http(), lambda resp, content: content, f'{self.url}files/{file_id}?alt=media')
+
+    def file_system(self, cls=GoogleDriveFileSystem, **kwargs) -> GoogleDriveFileSystem:
+        """
+        Create a file system (or subclass) talking to this server
+        """
+        auth = GoogleAuth()
+        auth.credentials = FakeCredentials()
+        file_system = cls(auth, **kwargs)
+        discovery = json.loads(get_static_doc('drive', 'v2'))
+        discovery['rootUrl'] = f'http://127.0.0.1:{self.server_port}/'
+        auth.service = build_from_document(discovery, http=httplib2.Http())
+        return file_system
+
+    def start(self) -> 'FakeDriveServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> 'FakeDriveServer':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
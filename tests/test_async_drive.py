@@ -0,0 +1,100 @@
+import asyncio
+import os
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from pydrive2.auth import GoogleAuth
+from pydrive2.files import ApiRequestError
+
+from pydrivebrowser.async_drive import AsyncGoogleDriveFileSystem, aiohttp
+from pydrivebrowser.scheduler import RequestScheduler
+
+from fake_drive import FakeDriveServer, FakeCredentials
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncGoogleDriveFileSystemTest(IsolatedAsyncioTestCase):
+    server = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FakeDriveServer().start()
+        cls.server.add_folder('folder')
+        for i in range(5):
+            cls.server.add_file(f'file_{i}', parents=['folder'], content=os.urandom(1000 + i))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    async def asyncSetUp(self) -> None:
+        auth = GoogleAuth()
+        auth.credentials = FakeCredentials()
+        self.gfs = AsyncGoogleDriveFileSystem(auth, max_connections=4, base_url=self.server.url,
+                                              scheduler=RequestScheduler(base_delay=0.01))
+
+    async def asyncTearDown(self) -> None:
+        await self.gfs.close()
+
+    async def test_listdir(self):
+        files = await self.gfs.listdir('folder', fields=['title'])
+        self.assertEqual([{'id': f'file_{i}', 'title': f'file_{i}'} for i in range(5)], files)
+
+    async def test_iterdir_pages(self):
+        self.server.requests.clear()
+        ids = [file['id'] async for file in self.gfs.iterdir('folder', page_size=2)]
+        self.assertEqual([f'file_{i}' for i in range(5)], ids)
+        self.assertEqual(3, len(self.server.requests))
+
+    async def test_get_metadata(self):
+        self.assertEqual({'id': 'file_1', 'fileSize': '1001'}, await self.gfs.get_metadata('file_1', ['id', 'fileSize']))
+        with self.assertRaises(ApiRequestError):
+            await self.gfs.get_metadata('missing')
+
+    async def test_read(self):
+        async with await self.gfs.open('file_0', chunksize=300) as reader:
+            self.assertEqual(self.server.contents['file_0'][:10], await reader.read(10))
+            b = bytearray(100)
+            self.assertEqual(100, await reader.readinto(b))
+            self.assertEqual(self.server.contents['file_0'][10:110], b)
+            self.assertEqual(self.server.contents['file_0'][110:], await reader.read())
+            self.assertEqual(1000, reader.tell())
+            self.assertEqual(b'', await reader.read())
+
+    async def test_iterate_chunks(self):
+        reader = await self.gfs.open('file_0', chunksize=300)
+        chunks = [chunk async for chunk in reader]
+        self.assertEqual([300, 300, 300, 100], [len(chunk) for chunk in chunks])
+        self.assertEqual(self.server.contents['file_0'], b''.join(chunks))
+
+    async def test_concurrent_downloads(self):
+        async def download(file_id):
+            reader = await self.gfs.open(file_id, chunksize=100)
+            return await reader.read()
+
+        self.server.latency = 0.01  # keeps the downloads overlapping
+        self.addCleanup(setattr, self.server, 'latency', 0.0)
+        self.server.peak_connections = self.server.open_connections
+        contents = await asyncio.gather(*[download(f'file_{i % 5}') for i in range(50)])
+        self.assertEqual([self.server.contents[f'file_{i % 5}'] for i in range(50)], contents)
+        self.assertLessEqual(self.server.peak_connections, 4)
+        self.assertGreater(self.server.peak_connections, 1)
+
+    async def test_rate_limited_requests_leave_executor_free(self):
+        self.gfs.scheduler = RequestScheduler(rate=20, burst=1)
+        requests = [asyncio.ensure_future(self.gfs.get_metadata('file_0', ['id'])) for _ in range(40)]
+        await asyncio.sleep(0.1)
+        start = asyncio.get_running_loop().time()
+        await asyncio.get_running_loop().run_in_executor(None, lambda: None)  # as a token refresh would
+        self.assertLess(asyncio.get_running_loop().time() - start, 0.5)
+        self.assertFalse(all(request.done() for request in requests))
+        await asyncio.gather(*requests)
+
+    async def test_retry_server_error(self):
+        self.server.inject_failures('/files/file_2', count=2, status=503)
+        self.assertEqual({'id': 'file_2'}, await self.gfs.get_metadata('file_2', ['id']))
+        self.assertEqual(2, self.gfs.scheduler.retries)
+        self.server.inject_failures('/files/file_2', count=10, status=500)
+        self.addCleanup(self.server.failures.clear)
+        with self.assertRaises(ApiRequestError):
+            await self.gfs.get_metadata('file_2', ['id'])
@@ -1,6 +1,7 @@
 import curses
 import json
 import os
+import time
 from unittest import TestCase
 from unittest.mock import patch
 
@@ -8,7 +9,10 @@ from oauth2client.service_account import ServiceAccountCredentials
 from pick import Picker
 from pydrive2.auth import GoogleAuth
 
-from pydrivebrowser.cli_browser import CliBrowser
+from pydrivebrowser.cli_browser import CliBrowser, Listing, ListingPicker
+from pydrivebrowser.search_index import SearchIndex
+
+from fake_drive import FakeDriveServer
 
 folder_level0_id = '1APzr67aMpXSkcMNlA0rWaJHvMoXwb9o8'
 file_level0_id = '1Rqfi4CeakfGx_xWa58Rz3SM2iHVSPzoH'
@@ -82,3 +86,207 @@ class CliBrowserTest(TestCase):
             file = browser.select_file(url_folder_level_1)
             self.assertEqual(file_level0_id, file['id'])
             mock_config_curses.assert_called()
+
+
+class FakeScreen:
+    def __init__(self, rows):
+        self.rows = rows
+        self.lines = []
+
+    def clear(self):
+        self.lines = []
+
+    def getmaxyx(self):
+        return self.rows, 80
+
+    def addnstr(self, y, x, line, n):
+        self.lines.append(line[:n])
+
+    def refresh(self):
+        pass
+
+
+class KeyboardScreen(FakeScreen):
+    def __init__(self, rows, keys):
+        super().__init__(rows)
+        self.keys = iter(keys)
+
+    def get_wch(self):
+        return next(self.keys)
+
+
+class LargeFolderTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_folder('root', parents=())
+        self.server.add_folder('large')
+        for i in range(1000):
+            self.server.add_file(f'file_{i:04}', parents=['large'])
+        self.server.add_file('data.csv', parents=['large'])
+        self.server.add_folder('sub', parents=['large'])
+        self.browser = self.server.file_system(CliBrowser)
+        self.browser.listing_page_size = 100
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def list_requests(self):
+        return [params for path, params in self.server.requests if path.endswith('/files')]
+
+    @patch.object(Picker, 'config_curses', autospec=True)
+    def test_file_extension_filter(self, mock_config_curses):
+        with patch.object(Picker, 'run_loop', create_mock_run_loop('large', 'data.csv')):
+            file = self.browser._select_file(None, 'root', 'csv')
+        self.assertEqual('data.csv', file['id'])
+        self.assertNotIn('title', self.list_requests()[-1]['q'])  # filtered client-side
+        self.assertEqual(11, len([params for params in self.list_requests() if "'large'" in params['q']]))
+
+    def test_listing_loads_pages_on_demand(self):
+        files = Listing(self.browser.iterdir('large', page_size=100), CliBrowser.PickItem, [], 100)
+        files.load(1)
+        self.assertEqual(100, len(files))
+        self.assertEqual(1, len(self.list_requests()))
+        self.assertEqual('file_0250', files[250].file['id'])
+        self.assertEqual(300, len(files))
+        self.assertEqual('sub', files[-1].file['id'])
+        self.assertTrue(files.complete)
+        self.assertEqual(1002, len(files))
+        self.assertEqual(11, len(self.list_requests()))
+
+    def test_picker_draws_visible_entries(self):
+        files = Listing(self.browser.iterdir('large', page_size=100), CliBrowser.PickItem, [], 100)
+        files.load(1)
+        picker = ListingPicker(files, title='select file')
+        screen = FakeScreen(rows=22)
+        picker.draw(screen)
+        self.assertEqual(22, len(screen.lines))
+        self.assertTrue(screen.lines[2].startswith('* file_0000 '))
+        for _ in range(150):
+            picker.move_down()
+        picker.draw(screen)
+        self.assertTrue(screen.lines[-1].startswith('* file_0150 '))
+        self.assertEqual(200, len(files))
+        self.assertEqual(2, len(self.list_requests()))
+        picker.index = 0
+        picker.move_up()  # wraps around to the last entry
+        self.assertEqual('sub', picker.get_selected()[0].file['id'])
+
+
+class PrefetchTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer(latency=0.01).start()
+        self.server.add_folder('root', parents=())
+        for i in range(3):
+            self.server.add_folder(f'folder_{i}')
+            self.server.add_file(f'file_{i}', parents=[f'folder_{i}'])
+        self.browser = self.server.file_system(CliBrowser)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def list_requests(self, folder_id):
+        return [params for path, params in self.server.requests
+                if path.endswith('/files') and f"'{folder_id}' in parents" in params['q']]
+
+    @patch.object(Picker, 'config_curses', autospec=True)
+    def test_highlighted_folders_prefetched(self, mock_config_curses):
+        selections = iter(['folder_2', 'file_2'])
+        prefetched = []
+
+        def run_loop(picker, screen, position):
+            picker.draw(FakeScreen(rows=20))
+            file_id = next(selections)
+            deadline = time.monotonic() + 5
+            while not self.list_requests(file_id) and time.monotonic() < deadline and file_id.startswith('folder'):
+                time.sleep(0.01)
+            prefetched.append(len(self.list_requests(file_id)))
+            for index, option in enumerate(picker.options):
+                if option.file['id'] == file_id:
+                    return option, index
+            raise KeyError(file_id)
+
+        with patch.object(Picker, 'run_loop', run_loop):
+            file = self.browser._select_file(None, 'root')
+        self.assertEqual('file_2', file['id'])
+        self.assertEqual([1, 0], prefetched)
+        self.assertEqual(1, len(self.list_requests('folder_2')))  # entering the folder used the prefetched listing
+        for folder_id in ('folder_0', 'folder_1'):  # near the highlighted entry
+            self.assertEqual(1, len(self.list_requests(folder_id)))
+
+    @patch.object(Picker, 'config_curses', autospec=True)
+    def test_changed_prefetched_folder_reloaded(self, mock_config_curses):
+        self.browser.metadata_cache.poll_interval = 0
+        selections = iter(['folder_2', 'file_new'])
+
+        def run_loop(picker, screen, position):
+            picker.draw(FakeScreen(rows=20))
+            file_id = next(selections)
+            if file_id == 'folder_2':
+                deadline = time.monotonic() + 5
+                while not self.list_requests(file_id) and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                time.sleep(0.1)  # let the prefetch finish
+                self.server.add_file('file_new', parents=['folder_2'])
+            for index, option in enumerate(picker.options):
+                if option.file['id'] == file_id:
+                    return option, index
+            raise KeyError(file_id)
+
+        with patch.object(Picker, 'run_loop', run_loop):
+            file = self.browser._select_file(None, 'root')
+        self.assertEqual('file_new', file['id'])
+        self.assertEqual(2, len(self.list_requests('folder_2')))  # the prefetched listing was outdated
+
+
+class SearchTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_folder('root', parents=())
+        self.server.add_folder('deep', parents=['root'])
+        self.server.add_folder('deeper', parents=['deep'])
+        self.server.add_file('target', 'annual report.csv', parents=['deeper'])
+        self.server.add_file('other', 'annual report.txt', parents=['deeper'])
+        self.browser = self.server.file_system(CliBrowser, search_index=SearchIndex())
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def select(self, keys, *selections):
+        """
+        Type '/' and the keys in the first listing, then select the given entries
+        """
+        screen = KeyboardScreen(20, keys)
+        selections = iter(selections)
+
+        def run_loop(picker, screen, position):
+            selection = next(selections)
+            if selection == '/':
+                return None, -1
+            for index, option in enumerate(picker.options):
+                if option.file['id'] == selection:
+                    return option, index
+            raise KeyError(selection)
+
+        with patch.object(Picker, 'config_curses'), patch.object(Picker, 'run_loop', run_loop):
+            file = self.browser._select_file(screen, 'root', 'csv')
+        return file, screen
+
+    def test_open_hit(self):
+        file, screen = self.select('anual\n', '/')
+        self.assertEqual('target', file['id'])  # 'other' is filtered out by the file extension
+        self.assertEqual('search: anual', screen.lines[0])
+        self.assertTrue(screen.lines[1].startswith('* annual report.csv'))
+        self.assertTrue(screen.lines[1].endswith('deep/deeper'))
+        self.assertEqual(2, len(screen.lines))
+
+    def test_open_folder_hit(self):
+        file, screen = self.select([*'deepex', curses.KEY_BACKSPACE, 'r', curses.KEY_DOWN, curses.KEY_UP, '\r'],
+                                   '/', 'target')
+        self.assertEqual('target', file['id'])
+        self.assertEqual(['search: deeper', 'deeper', 'annual report.csv', 'deep'],  # deep is a fuzzy match
+                         [line.strip('* ').split('  ')[0] for line in screen.lines])
+        self.assertTrue(screen.lines[1].startswith('* deeper'))
+
+    def test_escape(self):
+        file, _ = self.select(['x', '\x1b'], '/', 'deep', 'deeper', 'target')
+        self.assertEqual('target', file['id'])
@@ -0,0 +1,78 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from pydrivebrowser.content_cache import ContentCache
+
+
+def create_reader_factory(content: bytes):
+    def reader_factory():
+        reader_factory.call_count += 1
+        return io.BufferedReader(io.BytesIO(content))
+
+    reader_factory.call_count = 0
+    return reader_factory
+
+
+class ContentCacheTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ContentCache(self.directory.name, max_size=250)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_key(self):
+        self.assertEqual('md5-123', ContentCache.key({'id': 'a', 'md5Checksum': '123', 'version': '4'}))
+        self.assertEqual('md5-123', ContentCache.key({'id': 'b', 'md5Checksum': '123', 'version': '1'}))
+        self.assertEqual('a-4', ContentCache.key({'id': 'a', 'version': '4'}))
+        self.assertIsNone(ContentCache.key({'id': 'a'}))
+
+    def test_miss_then_hit(self):
+        reader_factory = create_reader_factory(b'0123456789')
+        with self.cache.open('a-1', reader_factory) as f:
+            self.assertEqual(b'0123456789', f.read())
+        self.assertIn('a-1', self.cache)
+
+        with self.cache.open('a-1', reader_factory) as f:
+            self.assertEqual(b'0123456789', f.read())
+        self.assertEqual(1, reader_factory.call_count)
+        self.assertEqual({'hits': 1, 'misses': 1, 'entries': 1, 'size': 10}, self.cache.stats())
+
+    def test_partial_read_not_cached(self):
+        with self.cache.open('a-1', create_reader_factory(b'0123456789')) as f:
+            f.read1(1)
+        self.assertNotIn('a-1', self.cache)
+        self.assertEqual(['.lock'], os.listdir(self.directory.name))
+
+    def test_new_version_is_miss(self):
+        with self.cache.open('a-1', create_reader_factory(b'old')) as f:
+            f.read()
+        with self.cache.open('a-2', create_reader_factory(b'new')) as f:
+            self.assertEqual(b'new', f.read())
+        self.assertEqual(2, self.cache.misses)
+
+    def test_lru_eviction(self):
+        for key in ['a-1', 'b-1']:
+            with self.cache.open(key, create_reader_factory(bytes(100))) as f:
+                f.read()
+        os.utime(os.path.join(self.directory.name, 'a-1'), (0, 0))
+        os.utime(os.path.join(self.directory.name, 'b-1'), (1, 1))
+        with self.cache.open('a-1', create_reader_factory(bytes(100))) as f:  # hit, a-1 becomes most recent
+            f.read()
+        with self.cache.open('c-1', create_reader_factory(bytes(100))) as f:
+            f.read()
+        self.assertIn('a-1', self.cache)
+        self.assertNotIn('b-1', self.cache)
+        self.assertIn('c-1', self.cache)
+        self.assertLessEqual(self.cache.size(), 250)
+
+    def test_larger_than_max_size_not_cached(self):
+        with self.cache.open('a-1', create_reader_factory(bytes(100))) as f:
+            f.read()
+        with self.cache.open('big-1', create_reader_factory(bytes(300))) as f:
+            self.assertEqual(bytes(300), f.read())
+        self.assertNotIn('big-1', self.cache)
+        self.assertIn('a-1', self.cache)  # nothing evicted for it
+        self.assertEqual(['.lock', 'a-1'], sorted(os.listdir(self.directory.name)))
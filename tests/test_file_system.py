@@ -1,3 +1,4 @@
+import threading
 import unittest
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
@@ -5,9 +6,14 @@ from unittest.mock import patch, MagicMock
 from googleapiclient.http import DEFAULT_CHUNK_SIZE, MediaDownloadProgress
 from oauth2client.service_account import ServiceAccountCredentials
 from pydrive2.auth import GoogleAuth
+from pydrive2.files import ApiRequestError
 
-from pydrivebrowser.google_drive import GoogleDriveFileSystem
+from pydrivebrowser.google_drive import GoogleDriveFileSystem, has_file_extension, is_folder, quote_query_value
 from pydrivebrowser.io_stream import DownloadStream, GDriveFileReader
+from pydrivebrowser.metadata_cache import MetadataCache
+from pydrivebrowser.scheduler import RequestScheduler
+
+from fake_drive import FakeDriveServer
 
 
 file_level0_id = '1Rqfi4CeakfGx_xWa58Rz3SM2iHVSPzoH'
@@ -35,3 +41,232 @@ class GoogleDriveFileSystemTest(TestCase):
 
         reader = file.open()
         self.assertIsInstance(reader, GDriveFileReader)
+
+
+class GoogleDriveFileSystemListingTest(TestCase):
+    server = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FakeDriveServer().start()
+        cls.server.add_folder('folder')
+        for i in range(5):
+            cls.server.add_file(f'file_{i}', parents=['folder'], content=bytes(i))
+        cls.gfs = cls.server.file_system()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def test_listdir(self):
+        self.assertEqual([f'file_{i}' for i in range(5)], [f['id'] for f in self.gfs.listdir('folder')])
+
+    def test_iterdir_pages(self):
+        self.server.requests.clear()
+        files = self.gfs.iterdir('folder', page_size=2)
+        self.assertEqual('file_0', next(files)['id'])
+        self.assertEqual(1, len(self.server.requests))
+        self.assertEqual([f'file_{i}' for i in range(1, 5)], [f['id'] for f in files])
+        self.assertEqual(3, len(self.server.requests))
+        self.assertEqual('2', self.server.requests[0][1]['maxResults'])
+
+    def test_iterdir_fields(self):
+        self.server.requests.clear()
+        files = list(self.gfs.iterdir('folder', fields=['title', 'fileSize']))
+        self.assertEqual('nextPageToken,items(id,title,fileSize)', self.server.requests[0][1]['fields'])
+        self.assertEqual({'id': 'file_3', 'title': 'file_3', 'fileSize': '3'}, dict(files[3]))
+
+    def test_iterdir_query(self):
+        self.server.requests.clear()
+        files = self.gfs.listdir('folder', query="title contains '_3' or title = 'file_1'")
+        self.assertEqual(['file_1', 'file_3'], [f['id'] for f in files])
+        self.assertEqual("'folder' in parents and trashed=false and (title contains '_3' or title = 'file_1')",
+                         self.server.requests[0][1]['q'])
+
+    def test_file_extension(self):
+        folder = {'title': 'sub.csv', 'mimeType': 'application/vnd.google-apps.folder'}
+        document = {'title': 'folder notes', 'mimeType': 'application/vnd.google-apps.document'}
+        self.assertTrue(is_folder(folder))
+        self.assertFalse(is_folder(document))  # only the folder mime type
+        self.assertTrue(has_file_extension({'title': 'report.csv'}, 'csv'))
+        self.assertFalse(has_file_extension({'title': 'report.csv.bak'}, 'csv'))
+        self.assertTrue(has_file_extension(document, ''))
+        self.assertEqual("'it\\'s'", quote_query_value("it's"))
+
+
+class GoogleDriveFileSystemWalkTest(TestCase):
+    server = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FakeDriveServer().start()
+        cls.server.add_folder('a')
+        cls.server.add_folder('b')
+        cls.server.add_folder('a1', parents=['a'])
+        cls.server.add_folder('a2', parents=['a'])
+        cls.server.add_folder('a11', parents=['a1', 'b'])  # reachable from a and b
+        cls.server.add_file('file_root')
+        cls.server.add_file('file_a1', parents=['a1'])
+        cls.server.add_file('file_a11', parents=['a11'])
+        cls.server.add_folder('cycle', parents=['a2'])
+        cls.server.update_file('a2', parents=['a', 'cycle'])
+        cls.gfs = cls.server.file_system()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def walk(self, *args, **kwargs):
+        return {folder['id']: (sorted(f['id'] for f in subfolders), sorted(f['id'] for f in files))
+                for folder, subfolders, files in self.gfs.walk(*args, **kwargs)}
+
+    def test_walk(self):
+        self.assertEqual({'root': (['a', 'b'], ['file_root']),
+                          'a': (['a1', 'a2'], []),
+                          'b': (['a11'], []),
+                          'a1': (['a11'], ['file_a1']),
+                          'a2': (['cycle'], []),
+                          'a11': ([], ['file_a11']),
+                          'cycle': (['a2'], [])}, self.walk())
+
+    def test_max_depth(self):
+        self.assertEqual(['a'], list(self.walk('a', max_depth=0)))
+        self.assertEqual({'a', 'a1', 'a2'}, set(self.walk('a', max_depth=1)))
+
+    def test_batched_queries(self):
+        self.server.requests.clear()
+        self.walk(workers=1, batch_size=10)
+        self.assertEqual(4, len(self.server.requests))  # root, (a, b), (a1, a2, a11), (cycle)
+
+
+class GoogleDriveFileSystemBatchTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        for i in range(150):
+            self.server.add_file(f'file_{i}')
+        self.gfs = self.server.file_system(scheduler=RequestScheduler(max_retries=3, base_delay=0.01))
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_get_metadata_many(self):
+        ids = [f'file_{i}' for i in range(150)]
+        metadata = self.gfs.get_metadata_many(ids + ['file_0', 'missing'], fields=['id', 'title'])
+        self.assertEqual(ids, list(metadata))
+        self.assertEqual({'id': 'file_7', 'title': 'file_7'}, metadata['file_7'])
+        self.assertEqual([100, 51], self.server.batch_sizes)
+
+    def test_retry_failed(self):
+        self.server.inject_failures('/files/file_3', count=2, status=503)
+        self.server.inject_failures('/files/file_4', count=1, status=403, reason='userRateLimitExceeded')
+        metadata = self.gfs.get_metadata_many(['file_2', 'file_3', 'file_4'])
+        self.assertEqual(['file_2', 'file_3', 'file_4'], sorted(metadata))
+        self.assertEqual([3, 2, 1], self.server.batch_sizes)
+
+    def test_retries_exhausted(self):
+        self.server.inject_failures('/files/file_3', count=5, status=500)
+        with self.assertRaises(ApiRequestError):
+            self.gfs.get_metadata_many(['file_2', 'file_3'])
+        self.assertEqual([2, 1, 1, 1], self.server.batch_sizes)
+
+    def test_not_retryable(self):
+        self.server.inject_failures('/files/file_3', count=1, status=403, reason='insufficientFilePermissions')
+        with self.assertRaises(ApiRequestError):
+            self.gfs.get_metadata_many(['file_3'])
+        self.assertEqual([1], self.server.batch_sizes)
+
+    def test_thread_local_http_pool(self):
+        self.gfs.auth.thread_local.other = 'main thread'
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append((self.gfs.auth.thread_local.http,
+                                                              getattr(self.gfs.auth.thread_local, 'other', None))))
+        thread.start()
+        thread.join()
+        self.assertEqual([(self.gfs.http_pool, None)], seen)  # the shared pool, other attributes per thread
+        self.assertEqual(2, len(self.gfs.get_metadata_many(['file_1', 'file_2'])))
+
+    def test_metadata_cache(self):
+        self.gfs.metadata_cache = MetadataCache(poll_interval=0)
+        self.gfs.get_metadata_many(['file_1', 'file_2'])
+        self.gfs.get_metadata_many(['file_1', 'file_2', 'file_3'])
+        self.assertEqual([2, 1], self.server.batch_sizes)
+        self.assertEqual({'id': 'file_1', 'title': 'file_1'},
+                         self.gfs.get_metadata_many(['file_1'], ['id', 'title'])['file_1'])
+        self.server.update_file('file_1', title='renamed')
+        self.assertEqual('renamed', self.gfs.get_metadata_many(['file_1'])['file_1']['title'])  # changes feed polled
+
+
+class GoogleDriveFileSystemMetadataCacheTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_folder('folder')
+        self.server.add_file('file_a', parents=['folder'])
+        self.gfs = self.server.file_system(metadata_cache=MetadataCache(poll_interval=0))
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def list_requests(self):
+        return [path for path, _ in self.server.requests if path.endswith('/files')]
+
+    def test_listdir_cached(self):
+        self.assertEqual(['file_a'], [f['id'] for f in self.gfs.listdir('folder')])
+        self.assertEqual(['file_a'], [f['id'] for f in self.gfs.listdir('folder')])
+        self.assertEqual(1, len(self.list_requests()))
+
+    def test_listdir_invalidated_by_change(self):
+        self.gfs.listdir('folder')
+        self.server.add_file('file_b', parents=['folder'])
+        self.assertEqual(['file_a', 'file_b'], [f['id'] for f in self.gfs.listdir('folder')])
+        self.server.delete_file('file_a')
+        self.assertEqual(['file_b'], [f['id'] for f in self.gfs.listdir('folder')])
+        self.assertEqual(3, len(self.list_requests()))
+
+    def test_listing_changed_during_iteration_not_cached(self):
+        self.server.add_file('file_b', parents=['folder'])
+        files = self.gfs.iterdir('folder', page_size=1)
+        self.assertEqual('file_a', next(files)['id'])
+        self.server.update_file('file_a', title='renamed')
+        self.gfs.sync_changes()  # e.g. by another listing meanwhile
+        self.assertEqual(['file_b'], [f['id'] for f in files])
+        self.assertEqual('renamed', self.gfs.listdir('folder')[0]['title'])
+        self.assertEqual(3, len(self.list_requests()))
+
+    def test_get_parent_cached(self):
+        self.assertEqual('folder', self.gfs._get_parent('file_a')['id'])
+        self.assertEqual('folder', self.gfs._get_parent('file_a')['id'])
+        self.assertEqual(1, len([path for path, _ in self.server.requests if path.endswith('/files/file_a')]))
+        self.server.update_file('file_a', parents=['root'])
+        self.assertEqual('root', self.gfs._get_parent('file_a')['id'])
+
+    def test_root_listing_invalidated_by_change(self):
+        server = FakeDriveServer(root_id='0AroOt').start()
+        self.addCleanup(server.stop)
+        server.add_folder('0AroOt', 'My Drive', parents=())
+        server.add_file('file_r')
+        server.add_file('file_t', parents=['other_folder'])
+        gfs = server.file_system(metadata_cache=MetadataCache(poll_interval=0))
+        self.assertEqual(['file_r'], [f['id'] for f in gfs.listdir('root')])
+        server.add_file('file_s')  # the changes feed reports the parent as '0AroOt' with isRoot
+        self.assertEqual(['file_r', 'file_s'], [f['id'] for f in gfs.listdir('root')])
+        server.update_file('file_t', parents=['0AroOt'])
+        self.assertEqual(['file_r', 'file_s', 'file_t'], sorted(f['id'] for f in gfs.listdir('root')))
+
+    def test_iterdir_fields_cached(self):
+        self.gfs.listdir('folder', fields=['title'])
+        self.gfs.listdir('folder', fields=['title'])
+        self.assertEqual(1, len(self.list_requests()))
+        self.gfs.listdir('folder', fields=['title', 'mimeType'])
+        self.assertEqual(2, len(self.list_requests()))
+        self.gfs.listdir('folder')
+        self.gfs.listdir('folder', fields=['title'])
+        self.assertEqual(3, len(self.list_requests()))
+
+    def test_iterdir_query_cached(self):
+        query = "title contains 'a'"
+        self.assertEqual(['file_a'], [f['id'] for f in self.gfs.listdir('folder', query=query)])
+        self.assertEqual(['file_a'], [f['id'] for f in self.gfs.listdir('folder', query=query)])
+        self.assertEqual(1, len(self.list_requests()))
+        self.server.add_file('file_ba', parents=['folder'])
+        self.assertEqual(['file_a', 'file_ba'], [f['id'] for f in self.gfs.listdir('folder', query=query)])
+        self.assertEqual(2, len(self.list_requests()))
@@ -0,0 +1,138 @@
+import datetime
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import TestCase
+
+from oauth2client.client import OAuth2Credentials
+from pydrive2.auth import GoogleAuth
+
+from pydrivebrowser.fsspec_drive import FsspecGoogleDriveFileSystem, fsspec
+
+from fake_drive import FakeDriveServer
+
+
+@unittest.skipIf(fsspec is None, 'fsspec is not installed')
+class FsspecGoogleDriveFileSystemTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_folder('root', parents=())
+        self.server.add_folder('data', 'data')
+        self.server.add_folder('2024', '2024', parents=['data'])
+        self.server.add_folder('empty', 'empty', parents=['data'])
+        self.content = os.urandom(100000)
+        self.server.add_file('big', 'big.bin', parents=['data'], content=self.content)
+        for month in range(1, 4):
+            self.server.add_file(f'month_{month}', f'{month:02}.csv', parents=['2024'], content=b'a,b\n1,2\n')
+        self.server.add_file('readme', 'README', content=b'hello')
+        self.fs = FsspecGoogleDriveFileSystem(self.server.file_system(), skip_instance_cache=True)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def requests(self):
+        return [params for path, params in self.server.requests if path.endswith('/files')]
+
+    def test_ls(self):
+        self.assertEqual(['README', 'data'], sorted(self.fs.ls('', detail=False)))
+        self.assertEqual(['data/2024', 'data/big.bin', 'data/empty'],
+                         sorted(self.fs.ls('pydrivebrowser://data/', detail=False)))
+        self.assertEqual([], self.fs.ls('data/empty'))
+        entry = next(entry for entry in self.fs.ls('data') if entry['name'] == 'data/big.bin')
+        self.assertEqual(('file', 100000, 'big'), (entry['type'], entry['size'], entry['id']))
+        self.assertEqual(['data/big.bin'], self.fs.ls('data/big.bin', detail=False))
+        with self.assertRaises(FileNotFoundError):
+            self.fs.ls('missing')
+
+    def test_info(self):
+        self.assertEqual({'name': 'data/2024/01.csv', 'size': 8, 'type': 'file', 'id': 'month_1',
+                          'mimeType': 'application/octet-stream',
+                          'md5Checksum': self.server.files['month_1']['md5Checksum']},
+                         self.fs.info('/data/2024/01.csv'))
+        self.assertEqual('directory', self.fs.info('data/2024')['type'])
+        self.assertTrue(self.fs.isdir(''))
+        self.assertFalse(self.fs.exists('data/2024/12.csv'))
+        self.assertFalse(self.fs.exists('README/child'))
+
+    def test_path_resolution_cached(self):
+        self.fs.info('data/2024/01.csv')
+        self.assertEqual(3, len(self.requests()))  # one lookup by title per level
+        self.assertIn("title = '2024'", self.requests()[1]['q'])
+        self.fs.info('data/2024/01.csv')
+        self.fs.open('data/2024/01.csv').close()
+        self.assertEqual(3, len(self.requests()))
+        self.fs.ls('data/2024')
+        self.assertEqual(['02.csv', 4], [self.fs.info('data/2024/02.csv')['name'][-6:], len(self.requests())])
+        self.assertFalse(self.fs.exists('data/2024/12.csv'))  # the folder was listed
+        self.assertEqual(4, len(self.requests()))
+
+    def test_invalidate_cache(self):
+        self.fs.ls('data/2024')
+        self.server.add_file('month_4', '04.csv', parents=['2024'])
+        self.assertFalse(self.fs.exists('data/2024/04.csv'))
+        self.fs.invalidate_cache('data/2024')
+        self.assertTrue(self.fs.exists('data/2024/04.csv'))
+        self.server.update_file('readme', title='README.md')
+        self.fs.invalidate_cache()
+        self.assertEqual(['README.md', 'data'], sorted(self.fs.ls('', detail=False)))
+
+    def test_walk(self):
+        self.assertEqual([('', ['data'], ['README']), ('data', ['2024', 'empty'], ['big.bin']),
+                          ('data/2024', [], ['01.csv', '02.csv', '03.csv']), ('data/empty', [], [])],
+                         sorted((root, sorted(dirs), sorted(files)) for root, dirs, files in self.fs.walk('')))
+        self.assertEqual(3, len(self.requests()))  # the folders of a level listed with one query
+        self.assertEqual([('', ['data'], ['README'])],
+                         [(root, dirs, files) for root, dirs, files in self.fs.walk('/', maxdepth=1)])
+
+    def test_glob(self):
+        self.assertEqual(['data/2024/01.csv', 'data/2024/02.csv', 'data/2024/03.csv'],
+                         sorted(self.fs.glob('**/*.csv')))
+        self.assertEqual(['data/2024/02.csv'], self.fs.glob('data/*/02.*'))
+        self.assertEqual(100000 + 3 * 8 + 5, self.fs.du(''))
+
+    def test_cat_file(self):
+        self.assertEqual(self.content, self.fs.cat_file('data/big.bin'))
+        self.assertEqual(self.content[10:20], self.fs.cat_file('data/big.bin', 10, 20))
+        self.assertEqual(self.content[-100:], self.fs.cat_file('data/big.bin', -100))
+        self.assertEqual(self.content[5:-5], self.fs.cat_file('data/big.bin', 5, -5))
+        self.assertEqual(b'', self.fs.cat_file('data/big.bin', 200000))
+        self.assertEqual(b'hello', self.fs.cat('README'))
+        with self.assertRaises(IsADirectoryError):
+            self.fs.cat_file('data')
+        self.server.add_file('doc', 'notes', parents=['data'], mime_type='application/vnd.google-apps.document')
+        self.assertIsNone(self.fs.info('data/notes')['size'])
+        with self.assertRaises(ValueError):  # a Google Doc has no size nor content
+            self.fs.cat_file('data/notes', -10)
+        with self.assertRaises(ValueError):
+            self.fs.open('data/notes')
+
+    def test_open(self):
+        with self.fs.open('data/big.bin', block_size=4096) as file:
+            self.assertEqual(100000, file.size)
+            file.seek(50000)
+            self.assertEqual(self.content[50000:50010], file.read(10))
+            file.seek(-10, os.SEEK_END)
+            self.assertEqual(self.content[-10:], file.read())
+            file.seek(0)
+            self.assertEqual(self.content[:100], file.read(100))
+        ranges = [headers for path, headers in self.server.requests if path.endswith('/big')]
+        self.assertLess(len(ranges), 10)  # blocks, not the whole file
+        with self.fs.open('data/2024/01.csv', 'rt') as file:
+            self.assertEqual(['a,b\n', '1,2\n'], file.readlines())
+        with self.assertRaises(ValueError):
+            self.fs.open('data/new.csv', 'wb')
+
+    def test_pickle(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        token_cache = os.path.join(directory.name, 'credentials.json')
+        auth = GoogleAuth()
+        auth.credentials = OAuth2Credentials('token', 'client-id', 'client-secret', 'refresh-token',
+                                             datetime.datetime(2100, 1, 1), 'https://oauth2.googleapis.com/token',
+                                             'user-agent')
+        auth.SaveCredentialsFile(token_cache)
+        fs = FsspecGoogleDriveFileSystem(token_cache=token_cache, root_id='folder_id', skip_instance_cache=True)
+        copy = pickle.loads(pickle.dumps(fs))  # e.g. sent to dask workers
+        self.assertEqual('folder_id', copy.root_id)
+        self.assertEqual('token', copy.file_system.auth.credentials.access_token)
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from pydrivebrowser.http_pool import HttpPool
+from pydrivebrowser.io_stream import ParallelDownloadStream
+from pydrivebrowser.scheduler import PRIORITY_INTERACTIVE
+
+from fake_drive import FakeDriveServer
+
+
+class CountingHttp:
+    def __init__(self, pool_test):
+        self.pool_test = pool_test
+        self.closed = False
+
+    def request(self, uri, method='GET', **kwargs):
+        with self.pool_test.lock:
+            self.pool_test.active += 1
+            self.pool_test.max_active = max(self.pool_test.max_active, self.pool_test.active)
+        time.sleep(0.01)
+        with self.pool_test.lock:
+            self.pool_test.active -= 1
+        if uri == 'fail':
+            raise ConnectionError(uri)
+        return {'status': '200'}, uri.encode()
+
+    def close(self):
+        self.closed = True
+
+
+class HttpPoolTest(TestCase):
+    def setUp(self) -> None:
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.created = []
+
+    def http_factory(self):
+        http = CountingHttp(self)
+        self.created.append(http)
+        return http
+
+    def test_reuse(self):
+        pool = HttpPool(self.http_factory, max_connections=4)
+        for i in range(5):
+            self.assertEqual(b'uri', pool.request('uri')[1])
+        self.assertEqual(1, len(self.created))
+
+    def test_max_connections(self):
+        pool = HttpPool(self.http_factory, max_connections=3)
+        with ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(lambda i: pool.request(str(i))[1], range(100)))
+        self.assertEqual([str(i).encode() for i in range(100)], results)
+        self.assertEqual(3, self.max_active)
+        self.assertEqual(3, len(self.created))
+
+    def test_failed_request_discards_http(self):
+        pool = HttpPool(self.http_factory, max_connections=1)
+        with self.assertRaises(ConnectionError):
+            pool.request('fail')
+        self.assertTrue(self.created[0].closed)
+        self.assertEqual(0, pool.size)
+        pool.request('uri')
+        self.assertEqual(2, len(self.created))
+
+    def test_close(self):
+        pool = HttpPool(self.http_factory)
+        pool.request('uri')
+        pool.close()
+        self.assertTrue(self.created[0].closed)
+        self.assertEqual(0, pool.size)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            HttpPool(self.http_factory, max_connections=0)
+
+
+class ConcurrentReadersTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        for i in range(8):
+            self.server.add_file(f'file_{i}', content=os.urandom(200_000 + i))
+        self.gfs = self.server.file_system(max_connections=4)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def read(self, i):
+        with self.gfs.open(f'file_{i % 8}', workers=1 + i % 3) as reader:
+            return reader.read()
+
+    def test_concurrent_readers(self):
+        with ThreadPoolExecutor(32) as executor:
+            contents = list(executor.map(self.read, range(128)))
+        self.assertEqual([self.server.contents[f'file_{i % 8}'] for i in range(128)], contents)
+        self.assertLessEqual(self.gfs.http_pool.size, 4)
+        self.assertLessEqual(self.server.connection_count, 4)  # connections are kept alive between requests
+
+    def test_interactive_request_ahead_of_downloads(self):
+        self.server.add_file('large', content=os.urandom(2_000_000))
+        self.server.bandwidth = 1_000_000  # 0.1 s per chunk
+        gfs = self.server.file_system(max_connections=2)
+        file = gfs.CreateFile({'id': 'large'})
+        with ParallelDownloadStream(file.media_request(), 100_000, workers=6, http_factory=lambda: gfs.http_pool) \
+                as reader:
+            reader.read(1)
+            time.sleep(0.05)  # the workers saturate the pool
+            started = len(self.server.range_requests)
+            with gfs.scheduler.priority(PRIORITY_INTERACTIVE):
+                self.assertEqual(9, len(gfs.listdir('root')))
+            # the listing took the first connection released, at most the other one went to a download meanwhile
+            self.assertLessEqual(len(self.server.range_requests) - started, 1)
+
+    def test_concurrent_listings(self):
+        with ThreadPoolExecutor(16) as executor:
+            listings = list(executor.map(lambda _: len(self.gfs.listdir('root')), range(64)))
+        self.assertEqual([8] * 64, listings)
+        self.assertLessEqual(self.server.connection_count, 4)
+
@@ -0,0 +1,70 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from pydrivebrowser.metadata_cache import MetadataCache
+
+
+class MetadataCacheTest(TestCase):
+    def setUp(self) -> None:
+        self.cache = MetadataCache()
+        self.cache.set_listing('root', [{'id': 'a', 'parents': [{'id': 'root'}]},
+                                        {'id': 'b', 'parents': [{'id': 'root'}]}])
+        self.cache.set_listing('other', [{'id': 'c', 'parents': [{'id': 'other'}]}])
+        self.cache.set_file('a', {'id': 'a', 'parents': [{'id': 'root'}]})
+
+    def test_get(self):
+        self.assertEqual(['a', 'b'], [file['id'] for file in self.cache.get_listing('root')])
+        self.assertEqual('a', self.cache.get_file('a')['id'])
+        self.assertIsNone(self.cache.get_listing('a'))
+        self.assertIsNone(self.cache.get_file('b'))
+
+    def test_change_drops_old_parent_listing(self):
+        self.cache.apply_change('a', None)
+        self.assertIsNone(self.cache.get_listing('root'))
+        self.assertIsNone(self.cache.get_file('a'))
+        self.assertIsNotNone(self.cache.get_listing('other'))
+
+    def test_change_drops_new_parent_listing(self):
+        self.cache.apply_change('d', {'id': 'd', 'parents': [{'id': 'other'}]})
+        self.assertIsNone(self.cache.get_listing('other'))
+        self.assertIsNotNone(self.cache.get_listing('root'))
+
+    def test_change_drops_root_alias_listing(self):
+        self.cache.apply_change('d', {'id': 'd', 'parents': [{'id': '0AroOt', 'isRoot': True}]})
+        self.assertIsNone(self.cache.get_listing('root'))
+        self.assertIsNotNone(self.cache.get_listing('other'))
+
+    def test_query_listing(self):
+        self.cache.set_listing('root', [{'id': 'a', 'parents': [{'id': 'root'}]}], query="title = 'a'")
+        self.assertEqual(['a'], [file['id'] for file in self.cache.get_listing('root', query="title = 'a'")])
+        self.assertIsNone(self.cache.get_listing('root', query="title = 'b'"))
+        self.assertEqual(2, len(self.cache.get_listing('root')))
+        self.cache.apply_change('d', {'id': 'd', 'parents': [{'id': 'root'}]})
+        self.assertIsNone(self.cache.get_listing('root', query="title = 'a'"))
+        self.assertIsNone(self.cache.get_listing('root'))
+
+    def test_listing_not_stored_after_change(self):
+        generation = self.cache.generation
+        self.cache.apply_change('c', {'id': 'c', 'title': 'renamed', 'parents': [{'id': 'other'}]})
+        self.cache.set_listing('other', [{'id': 'c', 'parents': [{'id': 'other'}]}], generation=generation)
+        self.assertIsNone(self.cache.get_listing('other'))
+        self.cache.set_listing('root', [{'id': 'a', 'parents': [{'id': 'root'}]}], generation=generation)
+        self.assertEqual(['a'], [file['id'] for file in self.cache.get_listing('root')])
+        self.assertTrue(self.cache.changed_since(generation, ['c']))
+        self.assertFalse(self.cache.changed_since(self.cache.generation, ['c']))
+        generation = self.cache.generation
+        self.cache.clear()
+        self.assertTrue(self.cache.changed_since(generation, []))
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metadata.json')
+            self.cache.path = path
+            self.cache.page_token = '42'
+            self.cache.save()
+
+            cache = MetadataCache(path)
+            self.assertEqual('42', cache.page_token)
+            self.assertEqual(self.cache.get_listing('root'), cache.get_listing('root'))
+            self.assertEqual(self.cache.get_file('a'), cache.get_file('a'))
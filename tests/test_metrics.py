@@ -0,0 +1,107 @@
+import os
+from unittest import TestCase
+
+from pydrivebrowser import metrics
+from pydrivebrowser.metrics import Histogram, Listener, MetricsCollector
+
+from fake_drive import FakeDriveServer
+
+
+class RecordingListener(Listener):
+    def __init__(self):
+        self.events = []
+
+    def on_span(self, name, duration, attributes):
+        self.events.append(('span', name, dict(attributes)))
+
+    def on_count(self, name, value, attributes):
+        self.events.append(('count', name, value))
+
+    def on_value(self, name, value, attributes):
+        self.events.append(('value', name, value))
+
+
+class MetricsTest(TestCase):
+    def test_disabled(self):
+        self.assertFalse(metrics.enabled())
+        with metrics.span('operation') as span:
+            self.assertIsNone(span)
+        metrics.count('counter')
+        metrics.record('value', 1.0)
+
+    def test_listener(self):
+        listener = metrics.add_listener(RecordingListener())
+        try:
+            with metrics.span('operation', method='GET') as span:
+                span.set(bytes=10)
+            with self.assertRaises(KeyError):
+                with metrics.span('failing'):
+                    raise KeyError()
+            metrics.count('counter', 2)
+            metrics.record('value', 1.5)
+        finally:
+            metrics.remove_listener(listener)
+        self.assertEqual([('span', 'operation', {'method': 'GET', 'bytes': 10}),
+                          ('span', 'failing', {'error': 'KeyError'}),
+                          ('count', 'counter', 2), ('value', 'value', 1.5)], listener.events)
+        self.assertFalse(metrics.enabled())
+
+    def test_histogram(self):
+        histogram = Histogram(samples=10)
+        for value in range(1, 101):
+            histogram.add(value)
+        self.assertEqual((100, 5050, 1, 100, 50.5), (histogram.count, histogram.sum, histogram.min, histogram.max,
+                                                     histogram.mean))
+        self.assertEqual(96, histogram.percentile(50))  # over the last 10 samples
+
+    def test_collector(self):
+        with MetricsCollector() as collector:
+            with metrics.span('http.request') as span:
+                span.set(bytes=100)
+            with self.assertRaises(OSError), metrics.span('http.request'):
+                raise OSError()
+            metrics.count('content_cache.hit')
+            metrics.record('reader.throughput', 1000.0)
+        metrics.count('content_cache.hit')  # collector no longer registered
+        snapshot = collector.snapshot()
+        self.assertEqual({'http.request.bytes': 100, 'http.request.errors': 1, 'content_cache.hit': 1},
+                         snapshot['counters'])
+        self.assertEqual(2, snapshot['histograms']['http.request']['count'])
+        self.assertEqual(1000.0, snapshot['histograms']['reader.throughput']['max'])
+        summary = collector.summary()
+        self.assertIn('http.request', summary)
+        self.assertIn('content_cache.hit', summary)
+        collector.reset()
+        self.assertEqual({'counters': {}, 'histograms': {}}, collector.snapshot())
+
+
+class FileSystemMetricsTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_file('data', content=os.urandom(10000))
+        self.gfs = self.server.file_system()
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_read(self):
+        with MetricsCollector() as collector:
+            for workers in (1, 3):
+                with self.gfs.open('data', workers=workers) as reader:
+                    self.assertEqual(self.server.contents['data'], reader.read())
+        snapshot = collector.snapshot()
+        self.assertGreaterEqual(snapshot['counters']['http.request.bytes'], 20000)
+        self.assertEqual(10000, snapshot['counters']['drive.download_chunk.bytes'])
+        self.assertEqual(10000, snapshot['counters']['drive.fetch_range.bytes'])
+        self.assertEqual(2, snapshot['histograms']['reader.throughput']['count'])
+        self.assertEqual(10000, snapshot['histograms']['reader.bytes']['min'])
+        self.assertGreaterEqual(snapshot['histograms']['scheduler.wait']['count'],
+                                snapshot['histograms']['http.request']['count'])
+
+    def test_write(self):
+        with MetricsCollector() as collector:
+            with self.gfs.open('data', 'wb', chunksize=256 * 1024) as writer:
+                writer.write(bytes(600 * 1024))
+        snapshot = collector.snapshot()
+        self.assertEqual(600 * 1024, snapshot['counters']['drive.upload_chunk.bytes'])
+        self.assertEqual(3, snapshot['histograms']['drive.upload_chunk']['count'])
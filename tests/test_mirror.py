@@ -0,0 +1,141 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import httplib2
+
+from pydrivebrowser.mirror import mirror, download_file, DownloadCheckpoint, PARTIAL_SUFFIX, CHECKPOINT_SUFFIX
+
+from fake_drive import FakeDriveServer
+
+
+class FailingHttp(httplib2.Http):
+    """
+    Http object losing the connection after a number of requests
+    """
+    def __init__(self, requests: int):
+        super().__init__()
+        self.requests = requests
+
+    def request(self, *args, **kwargs):
+        if self.requests == 0:
+            raise ConnectionError('connection lost')
+        self.requests -= 1
+        return super().request(*args, **kwargs)
+
+
+class MirrorTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_folder('top')
+        self.server.add_folder('sub', parents=['top'])
+        self.server.add_file('a', 'a.txt', parents=['top'], content=b'content a')
+        self.server.add_file('b', 'b.bin', parents=['sub'], content=bytes(range(200)))
+        self.server.add_file('doc', 'doc', parents=['top'], mime_type='application/vnd.google-apps.document')
+        self.gfs = self.server.file_system()
+        self.directory = tempfile.TemporaryDirectory()
+        self.destination = os.path.join(self.directory.name, 'mirror')
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        self.directory.cleanup()
+
+    def read(self, *path) -> bytes:
+        with open(os.path.join(self.destination, *path), 'rb') as local_file:
+            return local_file.read()
+
+    def test_mirror(self):
+        result = mirror(self.gfs, 'top', self.destination, workers=2)
+        self.assertEqual(b'content a', self.read('a.txt'))
+        self.assertEqual(bytes(range(200)), self.read('sub', 'b.bin'))
+        self.assertEqual(2, len(result.downloaded))
+        self.assertEqual([os.path.join(self.destination, 'doc')], result.skipped)
+        self.assertEqual({}, result.failed)
+
+    def test_unsafe_titles(self):
+        self.server.add_file('dotdot', '..', parents=['top'], content=b'1')
+        self.server.add_file('dot', '.', parents=['top'], content=b'2')
+        self.server.add_folder('up', '..', parents=['top'])
+        self.server.add_file('slash', '../escape', parents=['up'], content=b'3')
+        self.server.add_file('backslash', '..\\escape', parents=['top'], content=b'4')
+        self.server.add_file('nul', 'a\0b', parents=['top'], content=b'5')
+        result = mirror(self.gfs, 'top', self.destination)
+        self.assertEqual({}, result.failed)
+        self.assertEqual([b'1', b'2', b'3', b'4', b'5'],
+                         [self.read('dotdot'), self.read('dot'), self.read('up', '.._escape'), self.read('.._escape'),
+                          self.read('a_b')])
+        self.assertEqual(['mirror'], os.listdir(self.directory.name))
+
+    def test_skip_up_to_date(self):
+        mirror(self.gfs, 'top', self.destination)
+        self.server.update_file('a', content=b'new content')
+        self.server.range_requests.clear()
+        result = mirror(self.gfs, 'top', self.destination)
+        self.assertEqual([os.path.join(self.destination, 'a.txt')], result.downloaded)
+        self.assertEqual(b'new content', self.read('a.txt'))
+        self.assertEqual(1, len(self.server.range_requests))
+
+    def interrupted_download(self, file_id: str, path: str, requests: int):
+        http = FailingHttp(requests)
+        with self.assertRaises(ConnectionError):
+            download_file(self.gfs.CreateFile(dict(self.server.files[file_id])), path, http, chunksize=30)
+
+    def test_resume(self):
+        path = os.path.join(self.directory.name, 'b.bin')
+        self.interrupted_download('b', path, requests=5)
+        checkpoint = DownloadCheckpoint.load(path + CHECKPOINT_SUFFIX)
+        self.assertEqual(('b', 150), (checkpoint.file_id, checkpoint.offset))
+        self.server.range_requests.clear()
+        download_file(self.gfs.CreateFile({'id': 'b'}), path, chunksize=30)
+        self.assertEqual([(150, 179), (180, 199)], self.server.range_requests)
+        self.assertFalse(os.path.exists(path + PARTIAL_SUFFIX))
+        self.assertFalse(os.path.exists(path + CHECKPOINT_SUFFIX))
+        with open(path, 'rb') as local_file:
+            self.assertEqual(bytes(range(200)), local_file.read())
+
+    def test_resume_after_incomplete_write(self):
+        path = os.path.join(self.directory.name, 'b.bin')
+        self.interrupted_download('b', path, requests=2)
+        with open(path + PARTIAL_SUFFIX, 'ab') as partial_file:
+            partial_file.write(b'garbage')
+        self.server.range_requests.clear()
+        download_file(self.gfs.CreateFile({'id': 'b'}), path, chunksize=100)
+        self.assertEqual([(60, 159), (160, 199)], self.server.range_requests)
+        with open(path, 'rb') as local_file:
+            self.assertEqual(bytes(range(200)), local_file.read())
+
+    def test_checkpoint_rejected_if_file_changed(self):
+        path = os.path.join(self.directory.name, 'b.bin')
+        self.interrupted_download('b', path, requests=3)
+        self.server.update_file('b', content=bytes(range(100, 200)))
+        self.server.range_requests.clear()
+        download_file(self.gfs.CreateFile({'id': 'b'}), path, chunksize=100)
+        self.assertEqual([(0, 99)], self.server.range_requests)
+        with open(path, 'rb') as local_file:
+            self.assertEqual(bytes(range(100, 200)), local_file.read())
+
+    def test_partial_file_without_checkpoint(self):
+        path = os.path.join(self.directory.name, 'b.bin')
+        with open(path + PARTIAL_SUFFIX, 'wb') as partial_file:
+            partial_file.write(bytes(150))
+        download_file(self.gfs.CreateFile({'id': 'b'}), path)
+        with open(path, 'rb') as local_file:
+            self.assertEqual(bytes(range(200)), local_file.read())
+
+    def test_corrupt_partial_file(self):
+        path = os.path.join(self.directory.name, 'b.bin')
+        with open(path + PARTIAL_SUFFIX, 'wb') as partial_file:
+            partial_file.write(bytes(150))
+        DownloadCheckpoint(path + CHECKPOINT_SUFFIX, 'b', self.server.files['b']['md5Checksum'], '1', 150).save()
+        with self.assertRaises(IOError):
+            download_file(self.gfs.CreateFile({'id': 'b'}), path)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + PARTIAL_SUFFIX))
+        self.assertFalse(os.path.exists(path + CHECKPOINT_SUFFIX))
+
+    def test_duplicate_content_copied(self):
+        self.server.add_file('a_copy', 'a copy.txt', parents=['sub'], content=b'content a')
+        result = mirror(self.gfs, 'top', self.destination, workers=2)
+        self.assertEqual([os.path.join(self.destination, 'sub', 'a copy.txt')], result.copied)
+        self.assertEqual(b'content a', self.read('sub', 'a copy.txt'))
+        self.assertEqual(2, len(self.server.range_requests))
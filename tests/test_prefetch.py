@@ -0,0 +1,98 @@
+import threading
+from unittest import TestCase
+
+from pydrivebrowser.prefetch import Prefetcher
+from pydrivebrowser.scheduler import RequestScheduler, PRIORITY_PREFETCH
+
+
+class PrefetcherTest(TestCase):
+    def setUp(self) -> None:
+        self.loaded = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def load(self, key):
+        self.release.wait()
+        self.loaded.append(key)
+        if key == 'fail':
+            raise IOError(key)
+        return key.upper()
+
+    def test_take(self):
+        prefetcher = Prefetcher(self.load)
+        prefetcher.prefetch(['a', 'b'])
+        self.assertEqual('A', prefetcher.take('a'))
+        self.assertEqual('B', prefetcher.take('b'))
+        self.assertIsNone(prefetcher.take('a'))  # taken values are removed
+        self.assertIsNone(prefetcher.take('c'))
+        self.assertEqual((2, 2), (prefetcher.hits, prefetcher.misses))
+        prefetcher.close()
+
+    def test_take_drops_outdated_value(self):
+        prefetcher = Prefetcher(self.load)
+        prefetcher.prefetch(['a', 'b'])
+        self.assertIsNone(prefetcher.take('a', lambda value: False))
+        self.assertEqual('B', prefetcher.take('b', lambda value: value == 'B'))
+        self.assertEqual((1, 1), (prefetcher.hits, prefetcher.misses))
+        prefetcher.close()
+
+    def test_take_waits_for_running_load(self):
+        self.release.clear()
+        prefetcher = Prefetcher(self.load, workers=1)
+        prefetcher.prefetch(['a'])
+        threading.Timer(0.05, self.release.set).start()
+        self.assertEqual('A', prefetcher.take('a'))
+        prefetcher.close()
+
+    def test_cancel_unwanted(self):
+        self.release.clear()
+        prefetcher = Prefetcher(self.load, workers=1)
+        prefetcher.prefetch(['a', 'b', 'c'])
+        prefetcher.prefetch(['a', 'd', 'c'])  # a is running, b is no longer wanted
+        self.assertIsNone(prefetcher.take('d'))  # pending load cancelled, the caller loads it itself
+        self.release.set()
+        prefetcher._executor.shutdown(wait=True)
+        self.assertEqual('C', prefetcher.take('c'))
+        self.assertEqual(['a', 'c'], self.loaded)
+
+    def test_bounded(self):
+        prefetcher = Prefetcher(self.load, workers=1, max_entries=2)
+        prefetcher.prefetch(['a', 'b', 'c'])
+        prefetcher._executor.shutdown(wait=True)
+        self.assertIsNone(prefetcher.take('a'))
+        self.assertEqual('B', prefetcher.take('b'))
+        self.assertEqual('C', prefetcher.take('c'))
+
+    def test_failed_load(self):
+        prefetcher = Prefetcher(self.load)
+        prefetcher.prefetch(['fail'])
+        self.assertIsNone(prefetcher.take('fail'))
+        prefetcher.close()
+
+    def test_priority(self):
+        scheduler = RequestScheduler()
+        priorities = []
+        prefetcher = Prefetcher(lambda key: priorities.append(scheduler.current_priority) or key, scheduler)
+        prefetcher.prefetch(['a'])
+        self.assertEqual('a', prefetcher.take('a'))
+        self.assertEqual([PRIORITY_PREFETCH], priorities)
+        prefetcher.close()
+
+    def test_one_load_at_a_time(self):
+        running = []
+        peak = []
+
+        def load(key):
+            running.append(key)
+            peak.append(len(running))
+            self.release.wait()
+            running.remove(key)
+            return key
+
+        self.release.clear()
+        prefetcher = Prefetcher(load)
+        prefetcher.prefetch(['a', 'b', 'c'])
+        self.release.set()
+        self.assertEqual(['a', 'b', 'c'], [prefetcher.take(key) for key in 'abc'])
+        self.assertEqual([1, 1, 1], peak)  # a single pool connection used by default
+        prefetcher.close()
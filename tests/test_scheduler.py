@@ -0,0 +1,99 @@
+import threading
+import time
+from unittest import TestCase
+
+from pydrive2.files import ApiRequestError
+
+from pydrivebrowser.scheduler import RequestScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE, is_retryable_response
+
+from fake_drive import FakeDriveServer
+
+
+class RequestSchedulerTest(TestCase):
+    def test_rate(self):
+        scheduler = RequestScheduler(rate=100, burst=1)
+        start = time.monotonic()
+        for _ in range(11):
+            scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_unlimited(self):
+        scheduler = RequestScheduler(rate=None)
+        start = time.monotonic()
+        for _ in range(1000):
+            scheduler.acquire()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_priority(self):
+        scheduler = RequestScheduler(rate=10, burst=1)
+        scheduler.acquire()  # empty the bucket
+        order = []
+
+        def request(name, priority):
+            with scheduler.priority(priority):
+                scheduler.acquire()
+            order.append(name)
+
+        threads = [threading.Thread(target=request, args=(f'bulk_{i}', PRIORITY_BULK)) for i in range(3)]
+        threads += [threading.Thread(target=request, args=(f'interactive_{i}', PRIORITY_INTERACTIVE)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.005)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['interactive_0', 'interactive_1', 'bulk_0', 'bulk_1', 'bulk_2'], order)
+
+    def test_try_acquire(self):
+        scheduler = RequestScheduler(rate=10, burst=2)
+        self.assertEqual(0, scheduler.try_acquire())
+        self.assertEqual(0, scheduler.try_acquire())
+        self.assertGreater(scheduler.try_acquire(), 0.05)  # bucket empty, no token taken
+        time.sleep(0.1)
+        self.assertEqual(0, scheduler.try_acquire())
+
+    def test_try_acquire_behind_waiting_priority(self):
+        scheduler = RequestScheduler(rate=10, burst=1)
+        scheduler._waiting.append((PRIORITY_INTERACTIVE, -1))  # as a request blocked in acquire()
+        self.assertGreater(scheduler.try_acquire(PRIORITY_BULK), 0)
+        scheduler._waiting.clear()
+        self.assertEqual(0, scheduler.try_acquire(PRIORITY_BULK))
+
+    def test_backoff(self):
+        scheduler = RequestScheduler(base_delay=1, max_delay=10)
+        for attempt in range(8):
+            self.assertLessEqual(scheduler.backoff(attempt), min(10, 2 ** attempt))
+
+    def test_is_retryable_response(self):
+        self.assertTrue(is_retryable_response(429, b''))
+        self.assertTrue(is_retryable_response(503, b''))
+        self.assertTrue(is_retryable_response(403, b'{"reason": "userRateLimitExceeded"}'))
+        self.assertFalse(is_retryable_response(403, b'{"reason": "insufficientFilePermissions"}'))
+        self.assertFalse(is_retryable_response(404, b''))
+
+
+class SchedulerRetryTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_file('file_a', content=b'0123456789' * 100)
+        self.scheduler = RequestScheduler(max_retries=3, base_delay=0.01)
+        self.gfs = self.server.file_system(scheduler=self.scheduler)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_download_retried(self):
+        with self.gfs.open('file_a') as reader:
+            self.server.inject_failures('/files/file_a', count=2, status=503)
+            self.assertEqual(self.server.contents['file_a'], reader.read())
+        self.assertEqual(2, self.scheduler.retries)
+
+    def test_rate_limited_listing_retried(self):
+        self.server.inject_failures('/files', count=1, status=403, reason='userRateLimitExceeded')
+        self.assertEqual(['file_a'], [f['id'] for f in self.gfs.listdir('root')])
+        self.assertEqual(1, self.scheduler.retries)
+
+    def test_retries_exhausted(self):
+        self.server.inject_failures('/files', count=10, status=500)
+        with self.assertRaises(ApiRequestError):
+            self.gfs.listdir('root')
+        self.assertEqual(3, self.scheduler.retries)
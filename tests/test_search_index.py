@@ -0,0 +1,109 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from pydrivebrowser.search_index import SearchIndex
+
+from fake_drive import FakeDriveServer
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_folder('root', parents=())
+        self.server.add_folder('projects', 'Projects')
+        self.server.add_folder('reports', 'Reports', parents=['projects'])
+        self.server.add_file('budget', 'budget 2024.xlsx', parents=['reports'], content=b'1234')
+        self.server.add_file('report', 'quarterly report.pdf', parents=['reports'])
+        self.server.add_file('notes', 'meeting notes.txt', parents=['projects'])
+        self.server.add_folder('archive', 'Archive')
+        self.server.add_file('old', 'old report.pdf', parents=['archive'])
+        self.gfs = self.server.file_system()
+        self.index = SearchIndex(root_id='projects')
+        self.index.update(self.gfs)
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.server.stop()
+
+    def paths(self, text, limit=20):
+        return [file['path'] for file in self.index.search(text, limit)]
+
+    def test_build(self):
+        self.assertEqual(4, len(self.index))
+        self.assertEqual({'id': 'budget', 'parentId': 'reports', 'title': 'budget 2024.xlsx',
+                          'path': 'Reports/budget 2024.xlsx', 'mimeType': 'application/octet-stream',
+                          'fileSize': '4'}, self.index.get('budget'))
+        self.assertIsNone(self.index.get('old'))  # outside the root folder
+        self.assertIsNotNone(self.index.page_token)
+
+    def test_search(self):
+        self.assertEqual(['Reports', 'Reports/quarterly report.pdf'], self.paths('report')[:2])  # shorter first
+        self.assertEqual('Reports/quarterly report.pdf', self.paths('QUATERLY')[0])  # case and typo
+        self.assertEqual(['Reports', 'Reports/budget 2024.xlsx', 'Reports/quarterly report.pdf'],
+                         self.paths('reports'))  # title matches before path matches, shorter first
+        self.assertEqual(['meeting notes.txt'], self.paths('mee'))
+        self.assertEqual(['Reports/budget 2024.xlsx'], self.paths('20'))  # shorter than a trigram
+        self.assertEqual([], self.paths(' '))
+        self.assertEqual([], self.paths('zzz'))
+        self.assertEqual(1, len(self.paths('report', limit=1)))
+
+    def test_update(self):
+        self.server.add_file('plan', 'plan.doc', parents=['reports'])
+        self.server.update_file('reports', title='Summaries')
+        self.server.delete_file('notes')
+        self.server.update_file('budget', labels={'trashed': True})
+        self.server.update_file('archive', parents=['projects'])  # moved in with its content
+        self.server.update_file('projects', title='Renamed root')
+        self.server.requests.clear()
+        self.assertEqual(6, self.index.update(self.gfs))
+        self.assertEqual('Summaries/plan.doc', self.index.get('plan')['path'])
+        self.assertEqual('Summaries/quarterly report.pdf', self.index.get('report')['path'])
+        self.assertIsNone(self.index.get('notes'))
+        self.assertIsNone(self.index.get('budget'))
+        self.assertEqual('Archive/old report.pdf', self.index.get('old')['path'])
+        self.assertIsNone(self.index.get('projects'))
+        self.assertEqual(1, len([path for path, _ in self.server.requests if path.endswith('/changes')]))
+
+        self.server.update_file('reports', parents=['root'])  # moved out of the root folder
+        self.assertEqual(1, self.index.update(self.gfs))
+        self.assertEqual(['archive', 'old'], sorted(file['id'] for file in self.index.search('r', 10)))
+        self.assertEqual(0, self.index.update(self.gfs))
+
+
+class PersistenceTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_folder('root', parents=())
+        for i in range(100):
+            self.server.add_file(f'file_{i}', f'document {i}.txt')
+        self.gfs = self.server.file_system()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'index.sqlite')
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_reopen(self):
+        with SearchIndex(self.path) as index:
+            self.assertEqual(100, index.update(self.gfs))
+        self.server.add_file('new', 'new document.txt')
+        self.server.requests.clear()
+        with SearchIndex(self.path) as index:
+            self.assertEqual(1, index.update(self.gfs))  # only the changes are fetched
+            self.assertEqual(101, len(index))
+            self.assertEqual('new document.txt', index.search('new doc')[0]['title'])
+        self.assertFalse([path for path, _ in self.server.requests if path.endswith('/files')])
+        with SearchIndex(self.path, root_id='other') as index:  # an index of another folder is discarded
+            self.assertEqual(0, len(index))
+            self.assertIsNone(index.page_token)
+
+    def test_search_time(self):
+        with SearchIndex(self.path) as index:
+            index.update(self.gfs)
+            start = time.perf_counter()
+            for i in range(100):
+                self.assertEqual(f'document {i}.txt', index.search(f'document {i}', limit=5)[0]['title'])
+            self.assertLess((time.perf_counter() - start) / 100, 0.05)
@@ -0,0 +1,92 @@
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from oauth2client.client import OAuth2Credentials
+from pydrive2.auth import GoogleAuth
+
+from pydrivebrowser.google_drive import GoogleDriveFileSystem
+
+from fake_drive import FakeDriveServer
+
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def loaded_modules(statement: str, modules) -> list:
+    """
+    :return: the given modules loaded by a fresh interpreter running the statement
+    """
+    code = f'import sys\n{statement}\nprint(",".join(m for m in {list(modules)!r} if m in sys.modules))'
+    env = {**os.environ, 'PYTHONPATH': root_dir}
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    return [module for module in output.strip().split(',') if module]
+
+
+class LazyImportTest(TestCase):
+    def test_package(self):
+        self.assertEqual([], loaded_modules('import pydrivebrowser', ['curses', 'pick', 'pydrive2']))
+
+    def test_file_system(self):
+        self.assertEqual([], loaded_modules('from pydrivebrowser.google_drive import GoogleDriveFileSystem',
+                                            ['curses', 'pick', 'pydrivebrowser.cli_browser']))
+
+    def test_lazy_attributes(self):
+        self.assertEqual(['pick'], loaded_modules('from pydrivebrowser import CliBrowser', ['pick']))
+
+
+def expired_credentials() -> OAuth2Credentials:
+    return OAuth2Credentials('expired-token', 'client-id', 'client-secret', 'refresh-token',
+                             datetime.datetime(2000, 1, 1), 'https://oauth2.googleapis.com/token', 'user-agent')
+
+
+class LazyAuthorizeTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_file('data', content=b'content')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.token_cache = os.path.join(directory.name, 'credentials.json')
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_authorize_on_first_request(self):
+        with patch.object(GoogleAuth, 'Authorize') as authorize:
+            gfs = self.server.file_system()
+            authorize.assert_not_called()
+        service = gfs.auth.service
+        gfs.auth.service = None
+
+        def build_service():
+            gfs.auth.service = service
+
+        with patch.object(GoogleAuth, 'Authorize', side_effect=build_service) as authorize:
+            self.assertEqual(['data'], [file['id'] for file in gfs.listdir('root')])
+            self.assertEqual(b'content', gfs.open('data').read())
+        authorize.assert_called_once()
+
+    def test_token_cache(self):
+        auth = GoogleAuth()
+        auth.credentials = expired_credentials()
+        auth.SaveCredentialsFile(self.token_cache)
+
+        def refresh(credentials, http):
+            credentials.access_token = 'fresh-token'
+            credentials.token_expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+            credentials.store.locked_put(credentials)
+
+        with patch.object(GoogleAuth, 'LocalWebserverAuth', side_effect=AssertionError('interactive')), \
+                patch.object(GoogleAuth, 'Authorize'), patch.object(OAuth2Credentials, 'refresh', refresh):
+            gfs = GoogleDriveFileSystem(GoogleAuth(), token_cache=self.token_cache)
+            self.assertEqual('expired-token', gfs.auth.credentials.access_token)  # not refreshed yet
+            gfs.auth.service = object()
+            gfs.CreateFile({'id': 'data'})
+        self.assertEqual('fresh-token', gfs.auth.credentials.access_token)
+        auth = GoogleAuth()
+        auth.LoadCredentialsFile(self.token_cache)
+        self.assertEqual('fresh-token', auth.credentials.access_token)
+        self.assertFalse(auth.access_token_expired)
@@ -1,13 +1,29 @@
+import datetime
+import io
+import os
+import tempfile
+import threading
+import time
 import unittest
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
 
+import httplib2
+from googleapiclient.errors import HttpError
 from googleapiclient.http import DEFAULT_CHUNK_SIZE, MediaDownloadProgress
+from oauth2client.client import OAuth2Credentials
 from oauth2client.service_account import ServiceAccountCredentials
 from pydrive2.auth import GoogleAuth
 
+from pydrivebrowser.content_cache import ContentCache
 from pydrivebrowser.google_drive import GoogleDriveFileSystem
-from pydrivebrowser.io_stream import DownloadStream, GDriveFileReader
+from pydrivebrowser.http_pool import HttpPool
+from pydrivebrowser.metadata_cache import MetadataCache
+from pydrivebrowser.io_stream import DownloadStream, GDriveFileReader, ParallelDownloadStream, SeekableDownloadStream, \
+    ReadAheadStream, ChunkSizeController, ChecksumError, GDriveFileWriter, MaterializedFile, worker_http_factory
+from pydrivebrowser.scheduler import RequestScheduler
+
+from fake_drive import FakeDriveServer
 
 
 class MockMediaIoBaseDownload:
@@ -90,9 +106,17 @@ class DownloadStreamTest(TestCase):
     def test_readinto_too_short_buffer(self):
         chunksize = 100
         ds = DownloadStream(http_request, chunksize)
-        b = bytearray(chunksize - 1)
-        with self.assertRaises(BufferError):
-            ds.readinto(b)
+        b = bytearray(chunksize - 10)
+        ret = ds.readinto(b)
+        self.assertEqual(bytes([i for i in range(0, chunksize - 10)]), b)
+        self.assertEqual(chunksize - 10, ret)
+        self.assertEqual(chunksize - 10, ds.tell())
+
+        ret = ds.readinto(b)
+        self.assertEqual(bytes([i for i in range(chunksize - 10, chunksize)]), b[:10])
+        self.assertEqual(10, ret)
+        self.assertEqual(1, ds._downloader.call_count)
+        self.assertEqual(chunksize, ds.tell())
 
     @patch('googleapiclient.http.MediaIoBaseDownload', MockMediaIoBaseDownload)
     def test_readinto_longer_buffer(self):
@@ -111,6 +135,507 @@ class DownloadStreamTest(TestCase):
         self.assertEqual(bytes([i for i in range(0, chunksize)]), b)
 
 
+class ParallelDownloadStreamTest(TestCase):
+    server = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FakeDriveServer().start()
+        cls.server.add_file('data', content=bytes(i % 251 for i in range(1000)))
+        cls.server.add_file('empty')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def test_read_all(self):
+        for chunksize in [100, 128, 999, 1000, 4096]:
+            with self.subTest(chunksize=chunksize):
+                ds = ParallelDownloadStream(self.server.media_request('data'), chunksize, workers=3)
+                self.assertEqual(self.server.contents['data'], ds.read())
+                self.assertEqual(1000, ds.tell())
+                self.assertEqual(1000, ds.status.total_size)
+                ds.close()
+
+    def test_readinto_short_buffer(self):
+        ds = ParallelDownloadStream(self.server.media_request('data'), 100, workers=2)
+        b = bytearray(30)
+        self.assertEqual(30, ds.readinto(b))
+        self.assertEqual(self.server.contents['data'][:30], b)
+        self.assertEqual(30, ds.tell())
+        ds.close()
+
+    def test_bounded_chunks_ahead(self):
+        ds = ParallelDownloadStream(self.server.media_request('data'), 10, workers=2, max_chunks_ahead=3)
+        ds.readinto(bytearray(10))
+        self.assertEqual(3, len(ds._futures))
+        self.assertEqual(4, ds._next_chunk)
+        ds.close()
+        self.assertEqual(0, len(ds._futures))
+
+    def test_empty_file(self):
+        ds = ParallelDownloadStream(self.server.media_request('empty'), 100, workers=2)
+        self.assertEqual(b'', ds.read())
+        ds.close()
+
+    def test_reader(self):
+        reader = GDriveFileReader(self.server.media_request('data'), 64, workers=4)
+        self.assertIsInstance(reader.raw, ParallelDownloadStream)
+        self.assertEqual(self.server.contents['data'][:10], reader.read(10))
+        self.assertEqual(10, reader.tell())
+        self.assertEqual(self.server.contents['data'][10:], reader.read())
+        self.assertEqual(1000, reader.progress.total_size)
+        reader.close()
+
+    def test_worker_http_authorized(self):
+        credentials = OAuth2Credentials('token', 'client-id', 'client-secret', 'refresh-token',
+                                        datetime.datetime(2100, 1, 1), 'https://oauth2.googleapis.com/token', 'agent')
+        request = self.server.media_request('data')
+        request.http = credentials.authorize(httplib2.Http())
+        ds = ParallelDownloadStream(request, 100, workers=3)
+        http = ds._http_factory()
+        self.assertIsNot(request.http, http)
+        self.assertIs(credentials, http.request.credentials)
+        self.assertEqual(self.server.contents['data'], ds.read())
+        ds.close()
+        pool = HttpPool()
+        self.assertIs(pool, worker_http_factory(pool)())  # thread-safe, shared
+        self.assertIsInstance(worker_http_factory(httplib2.Http())(), httplib2.Http)
+
+    def test_close_waits_for_workers(self):
+        ds = ParallelDownloadStream(self.server.media_request('data'), 10, workers=2)
+        ds.readinto(bytearray(10))
+        executor = ds._executor
+        ds.close()
+        self.assertTrue(all(not thread.is_alive() for thread in executor._threads))
+
+
+class SeekableDownloadStreamTest(TestCase):
+    server = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FakeDriveServer().start()
+        cls.server.add_file('data', content=bytes(i % 251 for i in range(1000)))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def test_read_all(self):
+        ds = SeekableDownloadStream(self.server.media_request('data'), 100)
+        self.assertEqual(self.server.contents['data'], ds.read())
+        self.assertEqual(1000, ds.tell())
+
+    def test_seek(self):
+        ds = SeekableDownloadStream(self.server.media_request('data'), 100)
+        self.assertEqual(992, ds.seek(-8, io.SEEK_END))
+        self.assertEqual(self.server.contents['data'][992:], ds.read())
+        self.assertEqual(150, ds.seek(150))
+        self.assertEqual(self.server.contents['data'][150:160], ds.read(10))
+        self.assertEqual(170, ds.seek(10, io.SEEK_CUR))
+        self.assertEqual(self.server.contents['data'][170:200], ds.read(100))
+        with self.assertRaises(ValueError):
+            ds.seek(-1)
+
+    def test_known_size(self):
+        ds = SeekableDownloadStream(self.server.media_request('data'), 100, size=1000)
+        ds.seek(-8, io.SEEK_END)
+        ds.read()
+        self.assertEqual(1, ds.misses)
+
+    def test_cache(self):
+        ds = SeekableDownloadStream(self.server.media_request('data'), 100, cache_size=200, size=1000)
+        ds.seek(150)
+        ds.read(10)
+        ds.seek(120)
+        ds.read(10)
+        self.assertEqual((1, 1), (ds.hits, ds.misses))
+        for offset in [250, 350, 150]:
+            ds.seek(offset)
+            ds.read(1)
+        self.assertEqual(4, ds.misses)  # block 1 was evicted
+        self.assertEqual(2, len(ds._blocks))
+
+    def test_reader(self):
+        reader = GDriveFileReader(self.server.media_request('data'), 100, seekable=True)
+        self.assertTrue(reader.seekable())
+        reader.seek(-10, io.SEEK_END)
+        self.assertEqual(990, reader.tell())
+        self.assertEqual(self.server.contents['data'][990:], reader.read())
+        reader.seek(5)
+        self.assertEqual(self.server.contents['data'][5:15], reader.read(10))
+        self.assertEqual(15, reader.tell())
+
+
+class FailingStream(io.RawIOBase):
+    status = None
+
+    def readinto(self, b):
+        raise IOError('connection lost')
+
+
+class ReadAheadStreamTest(TestCase):
+    @patch('googleapiclient.http.MediaIoBaseDownload', MockMediaIoBaseDownload)
+    def test_read(self):
+        raw = DownloadStream(http_request, 100)
+        raw._downloader._bytes_total = 250
+        ds = ReadAheadStream(raw, 2, 100)
+        b = bytearray(30)
+        self.assertEqual(30, ds.readinto(b))
+        self.assertEqual(bytes(range(30)), b)
+        self.assertEqual(bytes(range(30, 250)), ds.read())
+        self.assertEqual(250, ds.tell())
+        self.assertEqual(250, ds.status.total_size)
+        ds.close()
+
+    @patch('googleapiclient.http.MediaIoBaseDownload', MockMediaIoBaseDownload)
+    def test_bounded_queue(self):
+        raw = DownloadStream(http_request, 10)
+        raw._downloader._bytes_total = 250
+        ds = ReadAheadStream(raw, 3, 10)
+        ds.readinto(bytearray(10))
+        time.sleep(0.1)
+        self.assertEqual(3, ds._queue.qsize())
+        self.assertEqual(5, raw._downloader.call_count)  # 1 read, 3 queued, 1 waiting for space in the queue
+        thread = ds._thread
+        ds.close()
+        self.assertIsNone(ds._thread)
+        thread.join(1)
+        self.assertTrue(raw.closed)
+
+    def test_error(self):
+        ds = ReadAheadStream(FailingStream(), 2, 10)
+        with self.assertRaises(IOError):
+            ds.read(10)
+        with self.assertRaises(IOError):  # not a truncated end of file
+            ds.read(10)
+        ds.close()
+
+    def test_close_does_not_wait_for_chunk(self):
+        server = FakeDriveServer(bandwidth=1_000_000).start()
+        self.addCleanup(server.stop)
+        server.add_file('data', content=os.urandom(2_000_000))
+        raw = DownloadStream(server.media_request('data'), 1_000_000)
+        ds = ReadAheadStream(raw, 2, 1_000_000)
+        ds._thread = thread = threading.Thread(target=ds._read_ahead, daemon=True)
+        thread.start()
+        while not server.range_requests:
+            time.sleep(0.01)
+        start = time.monotonic()
+        ds.close()
+        self.assertLess(time.monotonic() - start, 0.5)  # the chunk being downloaded takes a second
+        self.assertFalse(raw.closed)
+        thread.join(5)
+        self.assertTrue(raw.closed)  # by the worker, after the chunk
+        self.assertEqual(1, len(server.range_requests))
+
+    @patch('googleapiclient.http.MediaIoBaseDownload', MockMediaIoBaseDownload)
+    def test_reader(self):
+        reader = GDriveFileReader(http_request, 100, read_ahead=2)
+        reader.raw._raw._downloader._bytes_total = 150
+        self.assertIsInstance(reader.raw, ReadAheadStream)
+        self.assertEqual(bytes(range(150)), reader.read())
+        self.assertEqual(150, reader.progress.total_size)
+        reader.close()
+
+
+class ChunkSizeControllerTest(TestCase):
+    def test_grow_fast_chunks(self):
+        controller = ChunkSizeController(minimum=100, maximum=1000, target_duration=1.0)
+        controller.update(100, 0.1)
+        self.assertEqual(200, controller.chunksize)  # at most doubled
+        controller.update(200, 0.5)
+        self.assertEqual(400, controller.chunksize)
+        controller.update(400, 0.1)
+        controller.update(800, 0.1)
+        self.assertEqual(1000, controller.chunksize)
+
+    def test_shrink_slow_chunks(self):
+        controller = ChunkSizeController(minimum=100, maximum=1000, target_duration=1.0, initial=800)
+        controller.update(800, 1.6)
+        self.assertEqual(500, controller.chunksize)
+        controller.update(500, 10)
+        controller.update(250, 10)
+        controller.update(125, 10)
+        self.assertEqual(100, controller.chunksize)
+
+    def test_last_chunk_ignored(self):
+        controller = ChunkSizeController(minimum=100, maximum=1000, target_duration=1.0, initial=400)
+        controller.update(10, 2.0)
+        self.assertEqual(400, controller.chunksize)
+        self.assertEqual(1, controller.chunk_count)
+
+    def test_measurements(self):
+        controller = ChunkSizeController(smoothing=0.5)
+        controller.update(100, 1.0)
+        controller.update(300, 1.0)
+        self.assertEqual(1.0, controller.latency)
+        self.assertEqual(200, controller.bandwidth)
+
+
+class AdaptiveDownloadTest(TestCase):
+    size = 256 * 1024
+
+    def read(self, latency, bandwidth) -> GDriveFileReader:
+        with FakeDriveServer(latency, bandwidth) as server:
+            server.add_file('data', content=os.urandom(self.size))
+            controller = ChunkSizeController(minimum=4096, maximum=64 * 1024, target_duration=0.02)
+            reader = GDriveFileReader(server.media_request('data'), chunk_controller=controller)
+            self.assertEqual(server.contents['data'], reader.read())
+            self.assertEqual(self.size, reader.tell())
+            reader.close()
+            return reader
+
+    def test_fast_network(self):
+        reader = self.read(latency=0.002, bandwidth=None)
+        self.assertEqual(64 * 1024, reader.chunk_controller.chunksize)
+
+    def test_slow_network(self):
+        reader = self.read(latency=0.0, bandwidth=100 * 1024)
+        self.assertLess(reader.chunk_controller.chunksize, 8 * 1024)
+        self.assertLess(reader.chunk_controller.bandwidth, 120 * 1024)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            GDriveFileReader(http_request, workers=2, chunk_controller=ChunkSizeController())
+
+
+class ChecksumTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_file('data', content=os.urandom(10000))
+        self.md5 = self.server.files['data']['md5Checksum']
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_valid(self):
+        for workers in (1, 3):
+            with self.subTest(workers=workers):
+                reader = GDriveFileReader(self.server.media_request('data'), 1000, workers, md5_checksum=self.md5)
+                self.assertEqual(self.server.contents['data'], reader.read())
+                self.assertEqual(b'', reader.read())
+
+    def test_mismatch(self):
+        for workers, read_ahead in ((1, 0), (3, 0), (1, 2)):
+            with self.subTest(workers=workers, read_ahead=read_ahead):
+                reader = GDriveFileReader(self.server.media_request('data'), 1000, workers, read_ahead=read_ahead,
+                                          md5_checksum='0' * 32)
+                self.assertEqual(self.server.contents['data'][:9000], reader.read(9000))
+                with self.assertRaises(ChecksumError):
+                    reader.read()
+                reader.close()
+
+    def test_file_system(self):
+        gfs = self.server.file_system()
+        with gfs.open('data', verify_checksum=True) as reader:
+            self.assertEqual(self.server.contents['data'], reader.read())
+        self.server.contents['data'] = bytes(10000)  # content no longer matches the metadata
+        with gfs.open('data', verify_checksum=True) as reader:
+            with self.assertRaises(ChecksumError):
+                reader.read()
+
+    def test_seekable_unsupported(self):
+        with self.assertRaises(ValueError):
+            GDriveFileReader(http_request, seekable=True, md5_checksum=self.md5)
+
+
+class MaterializedFileTest(TestCase):
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_file('data', content=os.urandom(100_000))
+        self.server.add_file('empty')
+        self.gfs = self.server.file_system(scheduler=RequestScheduler(max_retries=0))
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_read(self):
+        content = self.server.contents['data']
+        with self.gfs.open('data', materialize='mmap', workers=3, block_size=8192) as f:
+            self.assertIsInstance(f, MaterializedFile)
+            self.assertEqual(content[:10], f.read(10))
+            self.assertEqual(content[50_000:50_010], f[50_000:50_010])
+            self.assertEqual(content[-1], f[-1])
+            self.assertEqual(content[10:], f.read())
+            self.assertEqual(content, bytes(f.view()))
+            self.assertEqual(content, f.mmap[:])
+            self.assertTrue(f.complete)
+            with open(f.name, 'rb') as local_file:
+                self.assertEqual(content, local_file.read())
+            path = f.name
+        self.assertFalse(os.path.exists(path))
+
+    def test_early_bytes_available(self):
+        self.server.bandwidth = 1_000_000  # 0.1 s for the whole file
+        with self.gfs.open('data', materialize='mmap', block_size=10_000) as f:
+            self.assertEqual(self.server.contents['data'][:100], bytes(f.view(0, 100)))
+            self.assertFalse(f.complete)
+            self.assertFalse(f.wait(timeout=0.001))
+            self.assertTrue(f.wait())
+            self.assertEqual(self.server.contents['data'], f.mmap[:])
+
+    def test_empty_file(self):
+        with self.gfs.open('empty', materialize='mmap') as f:
+            self.assertEqual(0, len(f))
+            self.assertEqual(b'', f.read())
+            self.assertEqual(b'', bytes(f.view()))
+
+    def test_download_error(self):
+        file = self.gfs.CreateFile(dict(self.server.files['data']))
+        self.server.inject_failures('/files/data', count=100, status=500)
+        with file.materialize(block_size=10_000) as f:
+            with self.assertRaises(IOError):
+                f.read()
+
+    def test_content_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.gfs.content_cache = ContentCache(directory)
+            with self.gfs.open('data', materialize='mmap', block_size=10_000) as f:
+                self.assertEqual(self.server.contents['data'], f.mmap[:])
+            self.assertEqual(1, self.gfs.content_cache.stats()['entries'])
+            self.server.range_requests.clear()
+            with self.gfs.open('data', materialize='mmap') as f:
+                self.assertTrue(f.complete)
+                self.assertEqual(self.server.contents['data'], f.read())
+            self.assertEqual([], self.server.range_requests)
+            self.assertEqual(1, self.gfs.content_cache.stats()['entries'])
+
+    def test_content_cache_too_small(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.gfs.content_cache = ContentCache(directory, max_size=1000)
+            with self.gfs.open('data', materialize='mmap', block_size=10_000) as f:
+                self.assertTrue(f.wait(timeout=5))
+                self.assertTrue(os.path.exists(f.name))
+                self.assertEqual(self.server.contents['data'], f.read())
+            self.assertEqual(0, self.gfs.content_cache.stats()['entries'])
+            self.assertEqual(['.lock'], os.listdir(directory))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.gfs.open('data', materialize='file')
+        with self.assertRaises(ValueError):
+            self.gfs.open('data', 'wb', materialize='mmap')
+
+
+class GDriveFileWriterTest(TestCase):
+    chunksize = 256 * 1024
+
+    def setUp(self) -> None:
+        self.server = FakeDriveServer().start()
+        self.server.add_folder('folder')
+        self.server.add_file('existing', content=b'old content')
+        self.gfs = self.server.file_system(scheduler=RequestScheduler(max_retries=0))
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def write(self, content: bytes, piece_size=100_000, **kwargs) -> GDriveFileWriter:
+        with self.gfs.open('new.bin', 'wb', parent_id='folder', chunksize=self.chunksize, **kwargs) as writer:
+            for start in range(0, len(content), piece_size):
+                self.assertEqual(len(content[start:start + piece_size]), writer.write(content[start:start + piece_size]))
+            self.assertEqual(len(content), writer.tell())
+        return writer
+
+    def test_write(self):
+        content = os.urandom(700_000)
+        writer = self.write(content)
+        self.assertEqual(content, self.server.contents[writer.metadata['id']])
+        self.assertEqual('new.bin', self.server.files[writer.metadata['id']]['title'])
+        self.assertEqual([{'id': 'folder', 'isRoot': False}], self.server.files[writer.metadata['id']]['parents'])
+        self.assertEqual([(0, self.chunksize - 1), (self.chunksize, 2 * self.chunksize - 1),
+                          (2 * self.chunksize, 699_999)], self.server.upload_chunks)
+
+    def test_multiple_of_chunksize(self):
+        content = os.urandom(2 * self.chunksize)
+        writer = self.write(content, piece_size=self.chunksize)
+        self.assertEqual(content, self.server.contents[writer.metadata['id']])
+        self.assertEqual(2, len(self.server.upload_chunks))
+
+    def test_empty_file(self):
+        writer = self.write(b'')
+        self.assertEqual(b'', self.server.contents[writer.metadata['id']])
+
+    def test_large_write_bounded_memory(self):
+        content = os.urandom(5 * self.chunksize + 10)
+        with self.gfs.open('new.bin', 'wb', parent_id='folder', chunksize=self.chunksize) as writer:
+            writer.write(content)
+            self.assertLessEqual(len(writer._buffer.data), 2 * self.chunksize)
+        self.assertEqual(content, self.server.contents[writer.metadata['id']])
+
+    def test_write_behind(self):
+        content = os.urandom(1_000_000)
+        writer = self.write(content, write_behind=2)
+        self.assertEqual(content, self.server.contents[writer.metadata['id']])
+
+    def test_callback_with_metadata_cache(self):
+        gfs = self.server.file_system(metadata_cache=MetadataCache(poll_interval=60))
+        self.assertEqual([], gfs.listdir('folder'))
+        uploaded = []
+        with gfs.open('new.bin', 'wb', parent_id='folder', chunksize=self.chunksize,
+                      callback=uploaded.append) as writer:
+            writer.write(b'content')
+        self.assertEqual([writer.metadata['id']], [metadata['id'] for metadata in uploaded])
+        self.assertEqual([writer.metadata['id']], [f['id'] for f in gfs.listdir('folder')])  # listing dropped
+
+    def test_replace_content(self):
+        file = self.gfs.CreateFile({'id': 'existing'})
+        with file.open_writer(chunksize=self.chunksize) as writer:
+            writer.write(b'new content')
+        self.assertEqual(b'new content', self.server.contents['existing'])
+        self.assertEqual(self.server.files['existing']['md5Checksum'], file['md5Checksum'])
+
+    def test_retry_failed_chunk(self):
+        content = os.urandom(700_000)
+        gfs = self.server.file_system(scheduler=RequestScheduler(max_retries=2, base_delay=0.01))
+        with gfs.open('new.bin', 'wb', parent_id='folder', chunksize=self.chunksize) as writer:
+            writer.write(content[:300_000])
+            self.server.inject_failures('/upload/', count=2, status=503)
+            writer.write(content[300_000:])
+        self.assertEqual(content, self.server.contents[writer.metadata['id']])
+        self.assertEqual(2, gfs.scheduler.retries)
+
+    def test_server_error_not_retried_by_writer(self):
+        with self.assertRaises(HttpError):
+            with self.gfs.open('new.bin', 'wb', parent_id='folder', chunksize=self.chunksize) as writer:
+                self.server.inject_failures('/upload/', count=1, status=503)
+                writer.write(os.urandom(300_000))
+        self.assertEqual(0, len(self.server.upload_chunks))
+
+    def test_resume_after_transport_error(self):
+        content = os.urandom(700_000)
+        with self.gfs.open('new.bin', 'wb', parent_id='folder', chunksize=self.chunksize) as writer:
+            writer.write(content[:300_000])
+            http = writer._request.http
+            failures = [ConnectionResetError()]
+
+            class FailingHttp:
+                def request(self, *args, **kwargs):
+                    if failures:
+                        raise failures.pop()
+                    return http.request(*args, **kwargs)
+
+            writer._request.http = FailingHttp()
+            writer.write(content[300_000:])
+        self.assertEqual(content, self.server.contents[writer.metadata['id']])
+        upload_requests = [path for path, _ in self.server.requests if path.startswith('/upload/')]
+        self.assertEqual(5, len(upload_requests))  # session, 3 chunks and the query of the acknowledged offset
+
+    def test_abort(self):
+        with self.assertRaises(KeyError):
+            with self.gfs.open('new.bin', 'wb', parent_id='folder', chunksize=self.chunksize) as writer:
+                writer.write(os.urandom(300_000))
+                raise KeyError()
+        self.assertTrue(writer.closed)
+        self.assertIsNone(writer.metadata)
+        self.assertEqual(['folder', 'existing'], list(self.server.files))
+
+    def test_invalid_chunksize(self):
+        with self.assertRaises(ValueError):
+            GDriveFileWriter(lambda media: None, chunksize=1000)
+
+
 class GDriveFileReaderTest(TestCase):
     auth = None
 
@@ -239,7 +764,6 @@ class GDriveFileReaderTest(TestCase):
         self.assertEqual(1, reader.raw._downloader.call_count)
         self.assertEqual(bytes([i for i in range(0, 100)]), b)
 
-    @unittest.skip('Throws error as reader.read1 calls reader.raw.readinto with buffer shorter than chunksize')
     @patch('googleapiclient.http.MediaIoBaseDownload', MockMediaIoBaseDownload)
     def test_read1_short(self):
         buffer_size = 100